@@ -0,0 +1,100 @@
+"""
+Compare the allergen report of QualityAgent with the local engine
+(ALLERGEN_MODE=lexicon, LLM only for unknown ingredients) and with the
+LLM-only path (ALLERGEN_MODE=llm): latency per report and LLM calls.
+
+Offline, the LLM is the fake chat model of stubs.py (--llm-latency). With
+--groq, the real Groq model is used and the allergens it lists are
+compared with those of the local engine.
+
+Usage:
+    python benchmarks/bench_allergens.py --recipes 200
+    python benchmarks/bench_allergens.py --recipes 20 --groq
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from agents.quality import QualityAgent
+from allergens import default_engine
+from corpus import INGREDIENTS, synthetic_document
+from metrics import LLMMetricsHandler, registry
+from stubs import FakeChatModel
+
+# Ingrédients hors lexique, pour mesurer le repli sur le LLM
+RARE_INGREDIENTS = ["gomme xanthane", "psyllium", "farine de teff", "sirop de yacon", "spiruline"]
+
+
+def synthetic_recipes(count, rare_ratio, seed=42):
+    rng = random.Random(seed)
+    recipes = []
+    for index in range(count):
+        recipe = synthetic_document(rng, index)
+        if rng.random() < rare_ratio:
+            recipe = recipe.replace("\n\nPRÉPARATION :", f"\n- 5g de {rng.choice(RARE_INGREDIENTS)}\n\nPRÉPARATION :")
+        recipes.append(recipe)
+    return recipes
+
+
+def llm_calls():
+    return sum(value for (metric, _), value in registry.snapshot()["counters"].items() if metric == "llm_calls")
+
+
+def bench_mode(agent, recipes):
+    registry.reset()
+    latencies, reports = [], []
+    for recipe in recipes:
+        start = time.perf_counter()
+        reports.append(agent.run({"recipe_proposal": recipe})["safety_report"])
+        latencies.append(time.perf_counter() - start)
+    return latencies, reports, llm_calls()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=200)
+    parser.add_argument("--rare-ratio", type=float, default=0.1,
+                        help="Share of recipes with an ingredient missing from the lexicon")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Latency of the fake LLM (seconds)")
+    parser.add_argument("--groq", action="store_true", help="Use the real Groq model (GROQ_API_KEY)")
+    args = parser.parse_args()
+
+    if args.groq:
+        from langchain_groq import ChatGroq
+
+        llm = ChatGroq(model=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"), temperature=0,
+                       callbacks=[LLMMetricsHandler()])
+    else:
+        llm = FakeChatModel(latency=args.llm_latency, output_tokens=30, callbacks=[LLMMetricsHandler()])
+
+    recipes = synthetic_recipes(args.recipes, args.rare_ratio)
+    print(f"{len(recipes)} recipes, {len(INGREDIENTS)} base ingredients, {args.rare_ratio:.0%} with a rare one\n")
+    print(f"{'mode':<9}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}{'LLM calls':>11}")
+
+    results = {}
+    for mode in ("lexicon", "llm"):
+        latencies, reports, calls = bench_mode(QualityAgent(llm, mode=mode), recipes)
+        results[mode] = reports
+        print(
+            f"{mode:<9}{np.percentile(latencies, 50) * 1000:>10.3f}{np.percentile(latencies, 99) * 1000:>10.3f}"
+            f"{sum(latencies):>10.2f}{calls:>11.0f}"
+        )
+
+    if args.groq:
+        # Accord entre les allergènes listés par le LLM et ceux du moteur local
+        engine = default_engine()
+        agreement = np.mean([
+            set(engine.allergens_in_answer(llm_report)) == set(engine.allergens_in_answer(local_report))
+            for local_report, llm_report in zip(results["lexicon"], results["llm"])
+        ])
+        print(f"\nSame allergen set as the LLM-only path: {agreement:.0%} of the recipes")
+
+
+if __name__ == "__main__":
+    main()
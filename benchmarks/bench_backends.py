@@ -0,0 +1,107 @@
+"""
+Compare the Chroma (HNSW) and embedded NumPy (exact) vector backends across
+corpus sizes: insertion time, time to reopen a persisted index, query
+latency (p50/p99) and recall@k of Chroma against the exact search.
+
+Random unit vectors are used, so no embedding model is needed.
+
+Usage:
+    python benchmarks/bench_backends.py --sizes 1000 5000 20000 --dim 384
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backends import create_backend
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def bench_backend(name, vectors, queries, k, batch_size, workdir):
+    persist_directory = os.path.join(workdir, name)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+    backend = create_backend(name, "bench", persist_directory)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        backend.upsert(
+            ids=ids[i:i + batch_size],
+            documents=["texte"] * len(ids[i:i + batch_size]),
+            embeddings=vectors[i:i + batch_size].tolist(),
+            metadatas=[{"source": "bench"}] * len(ids[i:i + batch_size]),
+        )
+    backend.persist()
+    insert_seconds = time.perf_counter() - start
+    del backend
+
+    start = time.perf_counter()
+    backend = create_backend(name, "bench", persist_directory)
+    backend.count()
+    open_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        results = backend.query([query.tolist()], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(results["ids"][0])
+
+    return {
+        "insert_s": insert_seconds,
+        "open_s": open_seconds,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "found": found,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'backend':<8}{'chunks':>9}{'insert s':>10}{'open s':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall@k':>10}")
+
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        # Exact top-k, the reference for the recall
+        similarities = queries @ vectors.T
+        truth = [set(f"chunk_{i}" for i in np.argsort(-row)[:args.k]) for row in similarities]
+
+        workdir = tempfile.mkdtemp(prefix="bench_backends_")
+        try:
+            for name in args.backends:
+                result = bench_backend(name, vectors, queries, args.k, args.batch_size, workdir)
+                recall = np.mean([
+                    len(truth[q] & set(found)) / args.k for q, found in enumerate(result["found"])
+                ])
+                print(
+                    f"{name:<8}{size:>9}{result['insert_s']:>10.2f}{result['open_s']:>9.3f}"
+                    f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{recall:>10.3f}"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Price synthetic recipes with the local cost engine: one vectorized pass
+over the whole batch (CostEngine.price_many) against one call per recipe,
+plus the time spent parsing the ingredients lists.
+
+No LLM is called: the numbers of the financial report come only from the
+price table (PRICE_TABLE, default data/prix_ingredients.csv).
+
+Usage:
+    python benchmarks/bench_costs.py --recipes 100 1000 5000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from corpus import synthetic_document
+from costs import CostEngine, PriceTable
+from recipes import parse_recipe
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--prices", default=os.getenv("PRICE_TABLE", os.path.join(ROOT, "data", "prix_ingredients.csv")))
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    args = parser.parse_args()
+
+    engine = CostEngine(PriceTable(args.prices))
+    print(f"{len(engine.price_table)} priced ingredients, coefficient {engine.coefficient}\n")
+    print(f"{'recipes':>8}{'parse ms':>11}{'batch ms':>11}{'loop ms':>11}{'speedup':>9}{'priced':>9}")
+
+    for count in args.recipes:
+        rng = random.Random(42)
+        texts = [synthetic_document(rng, index) for index in range(count)]
+
+        parse_time, recipes = timed(lambda: [parse_recipe(text) for text in texts], args.repeat)
+        batch_time, batch = timed(lambda: engine.price_many(recipes), args.repeat)
+        loop_time, loop = timed(lambda: [engine.price(recipe) for recipe in recipes], args.repeat)
+        assert [r["cost"] for r in batch] == [r["cost"] for r in loop]
+
+        priced = np.mean([len(r["priced"]) / max(1, len(r["priced"]) + len(r["unpriced"])) for r in batch])
+        print(
+            f"{count:>8}{parse_time * 1000:>11.1f}{batch_time * 1000:>11.1f}{loop_time * 1000:>11.1f}"
+            f"{loop_time / batch_time:>8.1f}x{priced:>9.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare embedding throughput with 1, 2, 4 and N worker processes on a
+synthetic corpus, to size the re-indexing machines.
+
+Usage:
+    python benchmarks/bench_embedding_pool.py --chunks 5000
+    python benchmarks/bench_embedding_pool.py --chunks 5000 --workers 1 2 4 8 --ingest
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from embedding_pool import EmbeddingPool
+from corpus import synthetic_corpus
+
+
+def bench_in_process(model_name: str, texts, batch_size: int) -> float:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.encode(["warmup"])
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def bench_pool(model_name: str, texts, workers: int, batch_size: int) -> float:
+    with EmbeddingPool(model_name, workers=workers, batch_size=batch_size) as pool:
+        # Model loading is not part of the measured throughput
+        pool.warmup()
+        start = time.perf_counter()
+        pool.encode(texts)
+        return time.perf_counter() - start
+
+
+def bench_ingest(texts, workers: int, batch_size: int) -> float:
+    """
+    Full pipeline (chunking, embedding, upserts) into an in-memory collection.
+    """
+    from langchain_core.documents import Document
+    from vectordb import VectorDB
+
+    db = VectorDB(collection_name=f"bench_{workers}", embedding_workers=workers)
+    db.embed_batch_size = batch_size
+    documents = (
+        Document(page_content=text, metadata={"source": f"synthetic_{i}.txt"})
+        for i, text in enumerate(texts)
+    )
+    try:
+        stats = db.add_documents(documents)
+    finally:
+        db.close()
+    return stats["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000, help="Size of the synthetic corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Worker counts to compare (default: 1 2 4 and the number of cores)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--ingest", action="store_true",
+                        help="Measure the whole add_documents pipeline instead of encode only")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, 2, 4, cores})
+    texts = synthetic_corpus(args.chunks)
+
+    print(f"Corpus: {len(texts)} synthetic chunks, {cores} cores, model {args.model}")
+    results = []
+
+    if not args.ingest:
+        seconds = bench_in_process(args.model, texts, args.batch_size)
+        results.append(("in-process", seconds))
+
+    for workers in worker_counts:
+        if args.ingest:
+            seconds = bench_ingest(texts, workers, args.batch_size)
+        else:
+            seconds = bench_pool(args.model, texts, workers, args.batch_size)
+        results.append((f"{workers} workers", seconds))
+
+    baseline = results[0][1]
+    print(f"\n{'mode':<14}{'seconds':>10}{'chunks/sec':>14}{'speedup':>10}")
+    for label, seconds in results:
+        print(f"{label:<14}{seconds:>10.2f}{len(texts) / seconds:>14.1f}{baseline / seconds:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
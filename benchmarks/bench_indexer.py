@@ -0,0 +1,150 @@
+"""
+Live indexing (indexer.py) under search load, offline: reader threads
+search the knowledge base without pause while supplier catalogues are
+dropped into the watched folder, rewritten shorter, then deleted.
+
+Measured:
+    - search latency (p50/p99) before and during the indexing
+    - indexing lag, from the write of a file to its chunks being searchable
+    - torn reads: a search returning chunks of two versions of a catalogue,
+      or only part of one version (must stay at 0)
+
+The embedder sleeps `--embed-latency` seconds per chunk to stand in for a
+real model: that time is spent outside the index lock.
+
+Usage:
+    python benchmarks/bench_indexer.py --files 50 --readers 4
+"""
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from bench_pipeline import bench_questions, open_db, percentile_ms
+from indexer import DirectoryIndexer
+from metrics import registry
+from stubs import HashEmbedder
+
+# Catalogue -> nombre de paragraphes (un chunk chacun) par version
+VERSIONS = {1: 5, 2: 3}
+PARAGRAPH = ("Catalogue fournisseur {name} version{version}, lot {part} : farine de blé T55, beurre AOP, "
+             "sucre semoule, oeufs frais, levure boulangère. ") * 6
+
+
+class SlowEmbedder(HashEmbedder):
+    def __init__(self, dim, latency):
+        super().__init__(dim)
+        self.latency = latency
+
+    def encode(self, sentences, *args, **kwargs):
+        if not isinstance(sentences, str) and len(sentences) > 1:
+            # Lot d'ingestion : seules les requêtes gardent la latence du hash
+            time.sleep(self.latency * len(sentences))
+        return super().encode(sentences, *args, **kwargs)
+
+
+def write_catalogue(path, name, version):
+    paragraphs = [PARAGRAPH.format(name=name, version=version, part=part) for part in range(VERSIONS[version])]
+    # Écriture en deux temps, comme une copie en cours : le debounce attend la fin
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs[:1]))
+        f.flush()
+        time.sleep(0.05)
+        f.write("\n\n" + "\n\n".join(paragraphs[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--corpus", type=int, default=10000)
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Seconds per embedded chunk")
+    parser.add_argument("--debounce", type=float, default=0.5)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    options = {"backend": "numpy", "quantization": "none", "embedder": "hash", "dim": 384}
+    workdir = tempfile.mkdtemp(prefix="bench_indexer_")
+    try:
+        db, _ = open_db(args.corpus, options, workdir)
+        db._embedding_model = SlowEmbedder(options["dim"], args.embed_latency)
+        documents_path = os.path.join(workdir, "data")
+        os.makedirs(documents_path)
+        names = [f"catalogue{i}" for i in range(args.files)]
+        paths = {name: os.path.join(documents_path, f"{name}.txt") for name in names}
+
+        registry.reset()
+        indexer = DirectoryIndexer(db, documents_path, poll_interval=args.poll_interval,
+                                   debounce=args.debounce).start()
+
+        phase = {"name": "idle"}
+        latencies = {"idle": [], "indexing": []}
+        torn = []
+        stop = threading.Event()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            questions = bench_questions(200, seed=seed)
+            while not stop.is_set():
+                name = rng.choice(names)
+                start = time.perf_counter()
+                db.search(rng.choice(questions), n_results=5)
+                results = db.search(name, n_results=10, mode="lexical")
+                latencies[phase["name"]].append(time.perf_counter() - start)
+
+                versions = [int(re.search(r"version(\d)", document).group(1)) for document in results["documents"]]
+                if versions and (len(set(versions)) > 1 or len(versions) != VERSIONS[versions[0]]):
+                    torn.append((name, versions))
+
+        readers = [threading.Thread(target=reader, args=(seed,)) for seed in range(args.readers)]
+        for thread in readers:
+            thread.start()
+        time.sleep(2)
+
+        phase["name"] = "indexing"
+        start = time.perf_counter()
+
+        def wait_for(change, count):
+            while indexer.stats[change] < count:
+                time.sleep(0.02)
+
+        for version, change in zip(VERSIONS, ("added", "changed")):
+            for name in names:
+                write_catalogue(paths[name], name, version)
+            wait_for(change, len(names))
+        for name in names[::2]:
+            os.remove(paths[name])
+        wait_for("removed", len(names[::2]))
+        seconds = time.perf_counter() - start
+
+        stop.set()
+        for thread in readers:
+            thread.join()
+        indexer.stop()
+
+        lag = {dict(labels).get("node"): value
+               for (metric, labels), value in registry.snapshot()["summaries"].items()
+               if metric == "indexing_lag_seconds"}.get("indexer", [0, 0.0])
+        print(f"{args.files} catalogues written twice then half deleted in {seconds:.2f}s, "
+              f"{args.readers} readers, corpus {args.corpus} chunks\n")
+        print(f"{'phase':<10}{'searches':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, values in latencies.items():
+            print(f"{name:<10}{len(values):>10}{percentile_ms(values, 50):>10.2f}{percentile_ms(values, 99):>10.2f}")
+        print(f"\nfiles indexed: {dict((k, v) for k, v in indexer.stats.items() if v)}")
+        print(f"indexing lag:  mean {lag[1] / max(lag[0], 1):.2f}s over {lag[0]:.0f} files "
+              f"(debounce {args.debounce}s)")
+        print(f"torn reads:    {len(torn)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
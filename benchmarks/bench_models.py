@@ -0,0 +1,140 @@
+"""
+Per-node model routing (llm_router.py) through the compiled graph, offline:
+the Groq models are replaced by the fake chat model of stubs.py, with one
+latency for the main model and one for the fast model.
+
+Scenarios:
+    single    every node on the main model (the previous single ChatGroq)
+    routed    manager tool selection and quality on the fast model
+    degraded  routed, with a main model slower than the Chef's latency
+              budget: the Chef falls back to the fast model
+
+Usage:
+    python benchmarks/bench_models.py --questions 30 --main-latency 1.2 --fast-latency 0.3
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from bench_pipeline import bench_questions, open_db, percentile_ms
+from llm_router import ModelRouter
+from metrics import LLMMetricsHandler, registry
+from stubs import FakeChatModel, FakeSearchTool
+
+# Un avertissement par repli : le total est dans le tableau
+logging.getLogger("llm_router").setLevel(logging.ERROR)
+
+
+class ModelCounter(BaseCallbackHandler):
+    """
+    Answers of each model, whatever the node.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.answers = Counter()
+
+    def on_llm_end(self, response, **kwargs):
+        for batch in response.generations:
+            for generation in batch:
+                self.answers[generation.message.response_metadata.get("model_name", "?")] += 1
+
+
+def stub_factory(latencies, counter):
+    """
+    Model factory of the router: fake chat models, by model name.
+    """
+    def create(model, temperature, timeout):
+        return FakeChatModel(model_name=model, latency=latencies[model], output_tokens=120,
+                             callbacks=[LLMMetricsHandler(), counter])
+    return create
+
+
+def run_scenario(name, env, latencies, db, questions, concurrency, search_latency):
+    from app import build_graph
+    from agents.chef import ChefAgent
+    from agents.quality import QualityAgent
+    from agents.inventorymanager import InventoryManager
+
+    os.environ.update(env)
+    registry.reset()
+    counter = ModelCounter()
+    models = ModelRouter(stub_factory(latencies, counter))
+    tools = [FakeSearchTool(latency=search_latency)]
+    graph = build_graph(
+        ChefAgent(models.for_node("chef"), db),
+        InventoryManager(models.for_node("manager"), tools,
+                         model_with_tools=models.for_node("manager_tools", tools)),
+        QualityAgent(models.for_node("quality"), mode="llm"),
+    )
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def ask(question):
+            async with semaphore:
+                start = time.perf_counter()
+                await graph.ainvoke({"question": question})
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(ask(question) for question in questions))
+        return latencies
+
+    question_latencies = asyncio.run(run_all())
+    models.close()
+    fallbacks = sum(value for (metric, _), value in registry.snapshot()["counters"].items()
+                    if metric == "llm_fallbacks")
+    answers = ", ".join(f"{model} {count}" for model, count in sorted(counter.answers.items()))
+    print(
+        f"{name:<10}{percentile_ms(question_latencies, 50):>10.0f}{percentile_ms(question_latencies, 99):>10.0f}"
+        f"{fallbacks:>11.0f}  {answers}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--corpus", type=int, default=1000)
+    parser.add_argument("--main-latency", type=float, default=1.2, help="Latency of the main model (seconds)")
+    parser.add_argument("--fast-latency", type=float, default=0.3, help="Latency of the fast model (seconds)")
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    options = {"backend": "numpy", "quantization": "none", "embedder": "hash", "dim": 384}
+    workdir = tempfile.mkdtemp(prefix="bench_models_")
+    try:
+        db, _ = open_db(args.corpus, options, workdir)
+        questions = bench_questions(args.questions)
+        latencies = {"main": args.main_latency, "fast": args.fast_latency}
+
+        print(f"{args.questions} questions, concurrency {args.concurrency}, "
+              f"main model {args.main_latency}s, fast model {args.fast_latency}s\n")
+        print(f"{'scenario':<10}{'p50 ms':>10}{'p99 ms':>10}{'fallbacks':>11}  answers by model")
+        scenarios = [
+            ("single", {"GROQ_MODEL": "main", "GROQ_FAST_MODEL": "main"}),
+            ("routed", {"GROQ_MODEL": "main", "GROQ_FAST_MODEL": "fast"}),
+            ("degraded", {"GROQ_MODEL": "main", "GROQ_FAST_MODEL": "fast",
+                          "LLM_TIMEOUT_CHEF": str(args.main_latency / 2)}),
+        ]
+        for name, env in scenarios:
+            run_scenario(name, env, latencies, db, questions, args.concurrency, args.search_latency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Re-pricing benchmark of the node cache (graph_cache.py), offline: a batch
+of questions runs once cold, then again after the Manager's outputs are
+forgotten (like `batch.py --refresh manager` after a price change). Only
+the Manager should run the second time.
+
+Usage:
+    python benchmarks/bench_node_cache.py --questions 100
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from bench_pipeline import bench_questions, open_db
+from graph_cache import NodeCache
+from metrics import LLMMetricsHandler, registry
+from stubs import FakeChatModel, FakeSearchTool
+
+
+def llm_calls():
+    calls = {}
+    for (metric, labels), value in registry.snapshot()["counters"].items():
+        if metric == "llm_calls":
+            node = dict(labels)["node"]
+            calls[node] = calls.get(node, 0) + value
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from app import build_graph
+    from batch import run_batch
+    from agents.chef import ChefAgent
+    from agents.quality import QualityAgent
+    from agents.inventorymanager import InventoryManager
+
+    options = {"backend": "numpy", "quantization": "none", "embedder": "hash", "dim": 384}
+    workdir = tempfile.mkdtemp(prefix="bench_node_cache_")
+    try:
+        db, _ = open_db(1000, options, workdir)
+        llm = FakeChatModel(latency=args.llm_latency, output_tokens=120, callbacks=[LLMMetricsHandler()])
+        cache = NodeCache(os.path.join(workdir, "node_cache.sqlite"))
+        graph = build_graph(
+            ChefAgent(llm, db), InventoryManager(llm, [FakeSearchTool(latency=args.search_latency)]),
+            QualityAgent(llm), node_cache=cache,
+        )
+        questions = [{"id": f"q{i}", "question": question}
+                     for i, question in enumerate(bench_questions(args.questions))]
+
+        print(f"{args.questions} questions, concurrency {args.concurrency}\n")
+        print(f"{'run':<12}{'seconds':>9}  LLM calls by node")
+        for name in ("cold", "re-pricing", "warm"):
+            if name == "re-pricing":
+                cache.clear_nodes(["manager"])
+            registry.reset()
+            start = time.perf_counter()
+            asyncio.run(run_batch(graph, questions, os.path.join(workdir, name), args.concurrency))
+            calls = ", ".join(f"{node} {count:.0f}" for node, count in sorted(llm_calls().items())) or "none"
+            print(f"{name:<12}{time.perf_counter() - start:>9.2f}  {calls}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Offline benchmark of the whole pipeline, with the deterministic stand-ins
+of stubs.py instead of Groq, Tavily and the embedding model:
+
+    - ingestion throughput (chunks/sec) of VectorDB.add_documents
+    - VectorDB.search latency (p50/p99) against the corpus size
+    - end-to-end graph throughput (questions/sec) and latency
+    - peak RSS of each measurement
+
+Each measurement runs in its own process, so the peak RSS is the one of
+that corpus size. The results are saved as JSON to compare runs.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/bench_pipeline.py --sizes 1000000 --backend numpy --graph-questions 0
+    python benchmarks/bench_pipeline.py --embedder model --sizes 1000 10000
+    python benchmarks/bench_pipeline.py --baseline benchmarks/results/pipeline_20260101_120000.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from corpus import INGREDIENTS, PRODUCTS, synthetic_chunks
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def bench_questions(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(PRODUCTS)} avec {rng.choice(INGREDIENTS)} et {rng.choice(INGREDIENTS)}"
+        for _ in range(count)
+    ]
+
+
+def open_db(size, options, workdir):
+    """
+    VectorDB filled with `size` synthetic chunks (one chunk per document).
+    """
+    from langchain_core.documents import Document
+    from vectordb import VectorDB
+    from stubs import HashEmbedder
+
+    db = VectorDB(
+        collection_name=f"bench_{size}",
+        persist_directory=workdir,
+        backend=options["backend"],
+        quantization=options["quantization"],
+    )
+    if options["embedder"] == "hash":
+        db._embedding_model = HashEmbedder(options["dim"])
+    # Every neighbour is kept: the search always returns k chunks
+    db.max_distance = 2.0
+
+    documents = (
+        Document(page_content=text, metadata={"source": f"synthetic_{i}.txt"})
+        for i, text in enumerate(synthetic_chunks(size))
+    )
+    stats = db.add_documents(documents)
+    db.close()
+    return db, stats
+
+
+def bench_corpus(size, options):
+    """
+    Ingestion and search latency for one corpus size (run in a child process).
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        db, stats = open_db(size, options, workdir)
+        # Every query is embedded: the measured latency includes the encoder
+        db.query_cache_size = 0
+
+        queries = bench_questions(options["queries"], seed=size)
+        db.search(queries[0], n_results=options["k"])
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            db.search(query, n_results=options["k"])
+            latencies.append(time.perf_counter() - start)
+
+        return {
+            "chunks": stats["chunks"],
+            "ingest_seconds": round(stats["seconds"], 3),
+            "chunks_per_sec": round(stats["chunks_per_sec"], 1),
+            "search_p50_ms": round(percentile_ms(latencies, 50), 3),
+            "search_p99_ms": round(percentile_ms(latencies, 99), 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_graph(options):
+    """
+    Questions through the compiled graph, `concurrency` at a time, with the
+    fake chat model and search tool (run in a child process).
+    """
+    from app import build_graph
+    from agents.chef import ChefAgent
+    from agents.quality import QualityAgent
+    from agents.inventorymanager import InventoryManager
+    from stubs import FakeChatModel, FakeSearchTool
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        db, _ = open_db(options["graph_corpus"], options, workdir)
+        llm = FakeChatModel(
+            latency=options["llm_latency"],
+            tokens_per_second=options["llm_tokens_per_second"],
+            output_tokens=options["llm_output_tokens"],
+        )
+        tools = [FakeSearchTool(latency=options["search_latency"])]
+        graph = build_graph(ChefAgent(llm, db), InventoryManager(llm, tools), QualityAgent(llm))
+        questions = bench_questions(options["graph_questions"])
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(options["concurrency"])
+            latencies = []
+
+            async def ask(question):
+                async with semaphore:
+                    start = time.perf_counter()
+                    await graph.ainvoke({"question": question})
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(ask(question) for question in questions))
+            return time.perf_counter() - start, latencies
+
+        seconds, latencies = asyncio.run(run_all())
+        return {
+            "questions": len(questions),
+            "concurrency": options["concurrency"],
+            "seconds": round(seconds, 3),
+            "questions_per_sec": round(len(questions) / seconds, 3),
+            "latency_p50_ms": round(percentile_ms(latencies, 50), 1),
+            "latency_p99_ms": round(percentile_ms(latencies, 99), 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_isolated(func, *args):
+    # "spawn": a fresh interpreter, so the peak RSS is not inherited
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(func, *args).result()
+
+
+def compare(results, baseline):
+    """
+    Print the change of each metric against a previous run.
+    """
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nAgainst {baseline['timestamp']}:")
+    previous = {run["chunks"]: run for run in baseline.get("corpus", [])}
+    for run in results["corpus"]:
+        old = previous.get(run["chunks"])
+        if old is None:
+            continue
+        print(
+            f"  {run['chunks']:>9} chunks: chunks/sec {change(run['chunks_per_sec'], old['chunks_per_sec'])}, "
+            f"search p99 {change(run['search_p99_ms'], old['search_p99_ms'])}, "
+            f"peak RSS {change(run['peak_rss_mb'], old['peak_rss_mb'])}"
+        )
+    if results.get("graph") and baseline.get("graph"):
+        print(
+            f"  graph: questions/sec {change(results['graph']['questions_per_sec'], baseline['graph']['questions_per_sec'])}, "
+            f"p99 {change(results['graph']['latency_p99_ms'], baseline['graph']['latency_p99_ms'])}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Corpus sizes, in chunks (up to 1000000)")
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy"])
+    parser.add_argument("--quantization", default="none", choices=["none", "int8", "binary"])
+    parser.add_argument("--embedder", default="hash", choices=["hash", "model"],
+                        help="hash: feature hashing (pipeline and index only), model: EMBEDDING_MODEL")
+    parser.add_argument("--dim", type=int, default=384, help="Size of the hash embeddings")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3, help="Chunks per search (the Chef uses 3)")
+    parser.add_argument("--graph-questions", type=int, default=50, help="0 = no graph benchmark")
+    parser.add_argument("--graph-corpus", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=200)
+    parser.add_argument("--search-latency", type=float, default=0.8)
+    parser.add_argument("--output", help="JSON results (default: benchmarks/results/pipeline_<date>.json)")
+    parser.add_argument("--baseline", help="Previous JSON results to compare with")
+    args = parser.parse_args()
+
+    options = vars(args).copy()
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "corpus": [],
+        "graph": None,
+    }
+
+    print(f"{'chunks':>9}{'ingest s':>10}{'chunks/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+    for size in args.sizes:
+        run = run_isolated(bench_corpus, size, options)
+        results["corpus"].append(run)
+        print(
+            f"{run['chunks']:>9}{run['ingest_seconds']:>10.2f}{run['chunks_per_sec']:>10.0f}"
+            f"{run['search_p50_ms']:>9.2f}{run['search_p99_ms']:>9.2f}{run['peak_rss_mb']:>9.0f}"
+        )
+
+    if args.graph_questions > 0:
+        graph = run_isolated(bench_graph, options)
+        results["graph"] = graph
+        print(
+            f"\ngraph: {graph['questions']} questions, concurrency {graph['concurrency']}: "
+            f"{graph['questions_per_sec']:.2f} questions/s, p50 {graph['latency_p50_ms']:.0f}ms, "
+            f"p99 {graph['latency_p99_ms']:.0f}ms, peak RSS {graph['peak_rss_mb']:.0f}MB"
+        )
+
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, "results", f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Memory and accuracy of the quantized storage modes of the NumPy backend:
+for each mode (none, int8, binary) and re-rank factor, report the memory
+held by the index, the recall@k against the unquantized (exact float32)
+search and the query latency.
+
+By default the vectors are clustered random vectors; with --model, the
+synthetic recipe corpus is embedded with a real model instead (slower,
+closer to production).
+
+Usage:
+    python benchmarks/bench_quantization.py --chunks 50000
+    python benchmarks/bench_quantization.py --chunks 5000 --model sentence-transformers/all-MiniLM-L6-v2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backends import NumpyBackend
+from corpus import synthetic_corpus
+
+
+def clustered_vectors(rng, n: int, dim: int, clusters: int = 200, noise: float = 0.5) -> np.ndarray:
+    """
+    Unit vectors around a few hundred topics, closer to text embeddings
+    than uniform random vectors.
+    """
+    centers = np.random.default_rng(0).standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + noise * rng.standard_normal((n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def embedded_vectors(model_name: str, n_chunks: int, n_queries: int):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    texts = synthetic_corpus(n_chunks + n_queries)
+    vectors = model.encode(texts, batch_size=64, convert_to_numpy=True).astype(np.float32)
+    return vectors[:n_chunks], vectors[n_chunks:]
+
+
+def build_index(vectors: np.ndarray, quantization: str, rerank_factor: int, directory: str) -> NumpyBackend:
+    backend = NumpyBackend("bench", directory, quantization=quantization, rerank_factor=rerank_factor)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    for start in range(0, len(vectors), 4096):
+        end = start + 4096
+        backend.upsert(ids[start:end], [""] * len(ids[start:end]), vectors[start:end],
+                       [{"source": "bench"}] * len(ids[start:end]))
+    # Persisting memory-maps the float32 vectors, as in production
+    backend.persist()
+    return backend
+
+
+def query_latencies(backend: NumpyBackend, queries: np.ndarray, k: int) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        backend.query([query], k)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size of the random vectors")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[4, 10, 30])
+    parser.add_argument("--model", help="Embed the synthetic corpus with this model instead of random vectors")
+    args = parser.parse_args()
+
+    if args.model:
+        vectors, queries = embedded_vectors(args.model, args.chunks, args.queries)
+    else:
+        rng = np.random.default_rng(42)
+        vectors = clustered_vectors(rng, args.chunks, args.dim)
+        queries = clustered_vectors(rng, args.queries, args.dim)
+
+    float_bytes = vectors.nbytes
+    print(f"{args.chunks} vectors of {vectors.shape[1]} dimensions, float32 = {float_bytes / 1e6:.1f} MB\n")
+    print(f"{'mode':<8}{'rerank':>8}{'memory MB':>11}{'ratio':>8}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_quantization_")
+    try:
+        for quantization in ("none", "int8", "binary"):
+            factors = [1] if quantization == "none" else args.rerank_factors
+            for factor in factors:
+                backend = build_index(vectors, quantization, factor, os.path.join(workdir, f"{quantization}_{factor}"))
+                # Without quantization every query scans the whole float32 matrix
+                memory = float_bytes if quantization == "none" else sum(backend.memory_usage().values())
+                recall = backend.recall_at_k(queries, args.k)
+                latencies = query_latencies(backend, queries, args.k)
+                print(
+                    f"{quantization:<8}{factor if quantization != 'none' else '-':>8}"
+                    f"{memory / 1e6:>11.1f}{float_bytes / memory:>7.1f}x{recall:>10.3f}"
+                    f"{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 99) * 1000:>9.2f}"
+                )
+                del backend
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
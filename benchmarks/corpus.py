@@ -0,0 +1,57 @@
+import random
+from typing import Iterator, List
+
+# Vocabulaire de pâtisserie utilisé pour générer des fiches recettes factices
+PRODUCTS = [
+    "Brownies", "Flan pâtissier", "Gâteau à la vanille", "Tarte aux pommes", "Éclair au café",
+    "Financier", "Madeleine", "Cookie", "Paris-Brest", "Mille-feuille", "Cannelé", "Quatre-quarts",
+]
+INGREDIENTS = [
+    "farine de blé", "beurre doux", "sucre en poudre", "œufs", "lait entier", "crème liquide",
+    "chocolat noir", "poudre d'amande", "levure chimique", "vanille", "sel", "noisettes",
+    "cacao en poudre", "miel", "pâte brisée", "fécule de maïs", "sucre glace", "pommes",
+]
+UNITS = ["g", "kg", "ml", "cl", "litre", "pincée", "sachet"]
+STEPS = [
+    "Préchauffer le four à {t}°C.", "Faire fondre le {i} au bain-marie.",
+    "Mélanger le {i} et le {j} jusqu'à blanchiment.", "Incorporer délicatement le {i}.",
+    "Cuire {m} minutes puis laisser refroidir.", "Réserver au frais pendant {m} minutes.",
+    "Tamiser le {i} avant de l'ajouter à l'appareil.", "Contrôler la température à cœur : {t}°C.",
+]
+
+
+def synthetic_document(rng: random.Random, index: int) -> str:
+    """
+    One fake recipe sheet with the same layout as the files in data/.
+    """
+    lines = [
+        f"NOM : {rng.choice(PRODUCTS)} n°{index}",
+        "DESCRIPTION : Fiche recette générée pour les benchmarks.",
+        "",
+        "INGRÉDIENTS :",
+    ]
+    for ingredient in rng.sample(INGREDIENTS, rng.randint(4, 9)):
+        lines.append(f"- {rng.randint(1, 500)}{rng.choice(UNITS)} de {ingredient}")
+    lines += ["", "PRÉPARATION :"]
+    for step in range(rng.randint(4, 10)):
+        text = rng.choice(STEPS).format(
+            t=rng.choice([150, 160, 170, 180, 200]),
+            i=rng.choice(INGREDIENTS),
+            j=rng.choice(INGREDIENTS),
+            m=rng.randint(5, 60),
+        )
+        lines.append(f"{step + 1}. {text}")
+    return "\n".join(lines)
+
+
+def synthetic_chunks(n_chunks: int, seed: int = 42) -> Iterator[str]:
+    """
+    Generate `n_chunks` chunk-sized texts lazily (no corpus held in memory).
+    """
+    rng = random.Random(seed)
+    for index in range(n_chunks):
+        yield synthetic_document(rng, index)
+
+
+def synthetic_corpus(n_chunks: int, seed: int = 42) -> List[str]:
+    return list(synthetic_chunks(n_chunks, seed))
@@ -0,0 +1,171 @@
+"""
+Deterministic local stand-ins for the external services, so the whole
+pipeline can be benchmarked offline, without Groq/Tavily keys or model
+downloads:
+
+    FakeChatModel   chat model with a configurable latency and output size,
+                    supporting bind_tools / tool_calls like ChatGroq
+    FakeSearchTool  search tool with the name and input of TavilySearch
+    HashEmbedder    SentenceTransformer-like encoder (feature hashing)
+
+The same inputs always give the same outputs.
+"""
+import time
+import zlib
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool
+
+from corpus import INGREDIENTS, PRODUCTS, STEPS
+
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering after `latency` seconds (+ the generation time at
+    `tokens_per_second`) with `output_tokens` words of pastry vocabulary.
+
+    Once tools are bound, it asks for `tool_calls_per_answer` searches
+    (one per ingredient), like the manager's first call to Groq.
+    """
+
+    model_name: str = "fake-bakery-chat"
+    latency: float = 0.5
+    tokens_per_second: float = 0.0  # 0 = no generation time
+    output_tokens: int = 200
+    tool_calls_per_answer: int = 3
+    tool_names: List[str] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-bakery-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # Part of the LLM cache key, like the model name of ChatGroq
+        return {"model_name": self.model_name, "output_tokens": self.output_tokens}
+
+    def bind_tools(self, tools, **kwargs: Any) -> "FakeChatModel":
+        return self.model_copy(update={"tool_names": [tool.name for tool in tools]})
+
+    def _delay(self) -> float:
+        if self.tokens_per_second > 0:
+            return self.latency + self.output_tokens / self.tokens_per_second
+        return self.latency
+
+    def _answer(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(_seed(prompt))
+        prompt_tokens = len(prompt.split())
+
+        if self.tool_names:
+            tool_calls = [
+                {"name": self.tool_names[0], "args": {"query": f"prix {ingredient} au kilo"}, "id": f"call_{i}"}
+                for i, ingredient in enumerate(rng.sample(INGREDIENTS, self.tool_calls_per_answer))
+            ]
+            usage = {"input_tokens": prompt_tokens, "output_tokens": 20 * len(tool_calls),
+                     "total_tokens": prompt_tokens + 20 * len(tool_calls)}
+            return AIMessage(content="", tool_calls=tool_calls, usage_metadata=usage,
+                             response_metadata={"model_name": self.model_name})
+
+        words = [f"{rng.choice(PRODUCTS)} :"]
+        while len(words) < self.output_tokens:
+            words.extend(rng.choice(STEPS).format(
+                t=rng.choice([160, 180]), i=rng.choice(INGREDIENTS), j=rng.choice(INGREDIENTS), m=rng.randint(5, 60)
+            ).split())
+        content = " ".join(words[:self.output_tokens])
+        usage = {"input_tokens": prompt_tokens, "output_tokens": self.output_tokens,
+                 "total_tokens": prompt_tokens + self.output_tokens}
+        return AIMessage(content=content, usage_metadata=usage, response_metadata={"model_name": self.model_name})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages))])
+
+
+class SearchInput(BaseModel):
+    query: str = Field(description="Search query")
+
+
+class FakeSearchTool(BaseTool):
+    """
+    Web search answering after `latency` seconds with made-up but stable
+    market prices.
+    """
+
+    name: str = "tavily_search"
+    description: str = "Search the web for current market prices."
+    args_schema: type = SearchInput
+    latency: float = 0.8
+
+    def _results(self, query: str) -> Dict[str, Any]:
+        rng = random.Random(_seed(query))
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"{query} - fournisseur {i + 1}",
+                    "url": f"https://example.com/prix/{_seed(query)}/{i}",
+                    "content": f"{query} : {rng.uniform(0.5, 30):.2f}€ le kilo chez le grossiste.",
+                }
+                for i in range(3)
+            ],
+        }
+
+    def _run(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def _arun(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+
+class HashEmbedder:
+    """
+    Bag-of-words feature hashing into `dim` dimensions, with the encode()
+    interface of SentenceTransformer. Texts sharing words get close vectors,
+    so searches return meaningful neighbours, at a fraction of the cost of
+    a real model: ingestion benchmarks then measure the pipeline and the
+    index, not the model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._buckets = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _bucket(self, token: str) -> int:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            bucket = self._buckets[token] = zlib.crc32(token.encode("utf-8")) % self.dim
+        return bucket
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs: Any) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        vectors = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for token in text.lower().split():
+                vectors[row, self._bucket(token)] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
@@ -1,6 +1,13 @@
 # agents/chef.py
+import asyncio
+import logging
 from langchain_core.messages import HumanMessage
 
+from context import ContextAssembler
+from router import CANNED_ANSWERS, RECIPE, classify_question, classify_retrieval, is_refusal
+
+logger = logging.getLogger(__name__)
+
 class ChefAgent:
     def __init__(self, llm, vector_db):
         """
@@ -8,15 +15,11 @@ class ChefAgent:
         """
         self.llm = llm
         self.vector_db = vector_db
+        # Chunks fusionnés et dédoublonnés, dans le budget de tokens du Chef
+        self.context = ContextAssembler("chef")
 
-    def run(self, state):
-        print("--- AGENT CHEF : RECHERCHE DE RECETTES ---")
-        query = state['question']
-
-        search_results = self.vector_db.search(query, n_results=3)
-        context_text = "\n\n".join(search_results["documents"])
-
-        prompt = f"""
+    def _build_prompt(self, query, context_text):
+        return f"""
         Tu es le chef pâtissier Amadou DIALLO. Utilise le CONTEXTE ci-dessous pour répondre à la question.
 
         Contraintes :
@@ -35,11 +38,64 @@ class ChefAgent:
         Réponds de manière professionnelle et technique.
         """
 
-        # Appel au modèle
-        response = self.llm.invoke([HumanMessage(content=prompt)])
+    def _short_circuit(self, route):
+        # Réponse toute prête : ni appel au LLM, ni Gestionnaire, ni Qualité
+        logger.info("Question non transmise aux agents (%s)", route)
+        return {"context": "", "recipe_proposal": CANNED_ANSWERS[route], "route": route}
 
-        # On met à jour l'état avec le contexte trouvé et la proposition du chef
+    def _answer(self, context_text, content):
+        # Le Chef peut lui-même refuser : pas de recette à chiffrer ni à contrôler
         return {
             "context": context_text,
-            "recipe_proposal": response.content
+            "recipe_proposal": content,
+            "route": "refused" if is_refusal(content) else RECIPE,
         }
+
+    def run(self, state):
+        logger.info("--- AGENT CHEF : RECHERCHE DE RECETTES ---")
+        query = state['question']
+
+        # Questions SQL, sur le prompt ou vides : refusées avant même la recherche
+        route = classify_question(query)
+        if route:
+            return self._short_circuit(route)
+
+        search_results = self.vector_db.search(query, n_results=3)
+        route = classify_retrieval(search_results)
+        if route != RECIPE:
+            return self._short_circuit(route)
+
+        context_text, _ = self.context.assemble_chunks(search_results)
+
+        prompt = self._build_prompt(query, context_text)
+
+        # Appel au modèle
+        response = self.llm.invoke([HumanMessage(content=prompt)])
+
+        # On met à jour l'état avec le contexte trouvé et la proposition du chef
+        return self._answer(context_text, response.content)
+
+    async def arun(self, state):
+        """
+        Version asynchrone de run (utilisée par app.astream / ainvoke).
+        """
+        logger.info("--- AGENT CHEF : RECHERCHE DE RECETTES ---")
+        query = state['question']
+
+        route = classify_question(query)
+        if route:
+            return self._short_circuit(route)
+
+        # La recherche vectorielle est synchrone (calcul CPU) : on la sort de la boucle d'événements
+        search_results = await asyncio.to_thread(self.vector_db.search, query, 3)
+        route = classify_retrieval(search_results)
+        if route != RECIPE:
+            return self._short_circuit(route)
+
+        context_text, _ = self.context.assemble_chunks(search_results)
+
+        prompt = self._build_prompt(query, context_text)
+
+        response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+
+        return self._answer(context_text, response.content)
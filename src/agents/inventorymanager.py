@@ -1,34 +1,162 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from langchain_core.messages import HumanMessage
 
+from context import ContextAssembler
+from costs import cost_engine_from_env
+from metrics import record
+from recipes import parse_recipe
+
+logger = logging.getLogger(__name__)
+
+NO_WEB_DATA = "Pas de données web trouvées, utilise tes connaissances générales."
+
 class InventoryManager:
-    def __init__(self, llm, tools):
-        # On garde une version du modèle avec outils et une version normale pour la synthèse
-        self.model_with_tools = llm.bind_tools(tools)
-        self.model_raw = llm 
+    def __init__(self, llm, tools, rate_limiter=None, market_cache=None,
+                 max_tool_workers=None, tool_timeout=None, cost_engine=None, model_with_tools=None):
+        # On garde une version du modèle avec outils et une version normale pour la synthèse.
+        # Le choix des recherches peut passer par un modèle plus rapide (voir llm_router.py)
+        self.model_with_tools = model_with_tools if model_with_tools is not None else llm.bind_tools(tools)
+        self.model_raw = llm
         self.tools_map = {tool.name: tool for tool in tools}
+        # Limiteur de débit optionnel pour respecter le quota de l'API de recherche
+        self.rate_limiter = rate_limiter
+        # Cache local des recherches de prix (voir market_cache.py)
+        self.market_cache = market_cache
+        # Les appels d'outils d'une même réponse partent en parallèle, chacun avec un timeout
+        self.max_tool_workers = max_tool_workers or int(os.getenv("TOOL_MAX_WORKERS", "4"))
+        self.tool_timeout = tool_timeout or float(os.getenv("TOOL_TIMEOUT", "20"))
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=self.max_tool_workers, thread_name_prefix="manager-tools"
+        )
+        # Budgets de tokens de la recette et des résultats de recherche dans les prompts
+        self.recipe_context = ContextAssembler("manager_recipe")
+        self.search_context = ContextAssembler("manager_search")
+        # Moteur de coûts local (voir costs.py) : les montants ne sont plus demandés au LLM
+        self.cost_engine = cost_engine if cost_engine is not None else cost_engine_from_env()
+        # Part maximale d'ingrédients sans prix pour garder le calcul local
+        self.max_unpriced = float(os.getenv("COST_MAX_UNPRICED", "0.25"))
 
-    def run(self, state):
-        print("--- AGENT GESTIONNAIRE : RECHERCHE ET SYNTHÈSE FINANCIÈRE ---")
-        recipe = state.get('recipe_proposal', "")
-        
-        # 1. Appel pour déclencher la recherche
-        search_prompt = f"Cherche les prix actuels du marché pour les ingrédients de cette recette : {recipe}"
-        response = self.model_with_tools.invoke([HumanMessage(content=search_prompt)])
-        
-        search_context = ""
-        
-        # 2. Exécution réelle des outils si nécessaire
-        if response.tool_calls:
-            for tool_call in response.tool_calls:
-                tool = self.tools_map[tool_call["name"]]
-                # On récupère le texte brut des résultats de recherche
-                search_context += str(tool.invoke(tool_call["args"]))
-        else:
-            search_context = "Pas de données web trouvées, utilise tes connaissances générales."
+    def _invoke_tool(self, tool, args):
+        """
+        Exécute un appel d'outil en passant par le cache des prix du marché :
+        les ingrédients déjà cherchés récemment ne déclenchent aucun appel réseau.
+        """
+        def call(tool_args):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            # Seuls les vrais appels réseau sont mesurés (pas les hits du cache)
+            start = time.perf_counter()
+            try:
+                return tool.invoke(tool_args)
+            finally:
+                record("tavily_calls")
+                record("tavily_seconds", time.perf_counter() - start)
 
-        # 3. DEUXIÈME APPEL : La synthèse propre
-        # On utilise model_raw (sans outils) pour forcer la rédaction du rapport
-        final_prompt = f"""Tu es Safiatou DIALLO, gestionnaire financière.
+        if self.market_cache is None or "query" not in args:
+            return call(args)
+
+        return self.market_cache.search(args["query"], lambda query: call({**args, "query": query}),
+                                        namespace=tool.name)
+
+    async def _ainvoke_tool(self, tool, args):
+        if self.market_cache is not None:
+            # Le cache est synchrone (SQLite) : il tourne dans un thread
+            return await asyncio.to_thread(self._invoke_tool, tool, args)
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire()
+        start = time.perf_counter()
+        try:
+            return await tool.ainvoke(args)
+        finally:
+            record("tavily_calls")
+            record("tavily_seconds", time.perf_counter() - start)
+
+    def _failed_call(self, tool_call, error):
+        # Une recherche en échec dégrade le rapport au lieu de le bloquer
+        logger.warning("Recherche '%s' en échec : %s", tool_call["name"], error)
+        query = tool_call["args"].get("query", tool_call["name"])
+        return f"[Recherche '{query}' indisponible]"
+
+    def _merge_results(self, results, failures):
+        if failures == len(results):
+            return NO_WEB_DATA
+        # Seuls le titre et le contenu des résultats vont dans le prompt (pas d'URL, de score...)
+        search_context, _ = self.search_context.compact_tool_results(results)
+        return search_context
+
+    def _run_tool_calls(self, tool_calls):
+        """
+        Exécute les appels d'outils en parallèle (pool de threads borné).
+        Les appels qui échouent ou dépassent tool_timeout sont ignorés.
+        """
+        futures = []
+        for tool_call in tool_calls:
+            tool = self.tools_map.get(tool_call["name"])
+            if tool is None:
+                futures.append(None)
+            else:
+                # Le contexte suit l'appel dans le thread (nœud et question en cours, pour les métriques)
+                context = contextvars.copy_context()
+                futures.append(self._tool_executor.submit(context.run, self._invoke_tool, tool, tool_call["args"]))
+
+        deadline = time.monotonic() + self.tool_timeout
+        results = []
+        failures = 0
+        for tool_call, future in zip(tool_calls, futures):
+            try:
+                if future is None:
+                    raise KeyError(f"outil inconnu {tool_call['name']}")
+                results.append(future.result(timeout=max(0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                failures += 1
+                results.append(self._failed_call(tool_call, f"timeout après {self.tool_timeout}s"))
+            except Exception as e:
+                failures += 1
+                results.append(self._failed_call(tool_call, e))
+
+        return self._merge_results(results, failures)
+
+    async def _arun_tool_calls(self, tool_calls):
+        """
+        Version asynchrone de _run_tool_calls.
+        """
+        semaphore = asyncio.Semaphore(self.max_tool_workers)
+
+        async def call(tool_call):
+            tool = self.tools_map.get(tool_call["name"])
+            if tool is None:
+                raise KeyError(f"outil inconnu {tool_call['name']}")
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self._ainvoke_tool(tool, tool_call["args"]), timeout=self.tool_timeout
+                )
+
+        outcomes = await asyncio.gather(*(call(tc) for tc in tool_calls), return_exceptions=True)
+
+        results = []
+        failures = 0
+        for tool_call, outcome in zip(tool_calls, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                failures += 1
+                results.append(self._failed_call(tool_call, f"timeout après {self.tool_timeout}s"))
+            elif isinstance(outcome, Exception):
+                failures += 1
+                results.append(self._failed_call(tool_call, outcome))
+            else:
+                results.append(outcome)
+
+        return self._merge_results(results, failures)
+
+    def _search_prompt(self, recipe):
+        return f"Cherche les prix actuels du marché pour les ingrédients de cette recette : {recipe}"
+
+    def _final_prompt(self, search_context, recipe):
+        return f"""Tu es Safiatou DIALLO, gestionnaire financière.
         Basé sur ces données de recherche : {search_context}
         
         Analyse la recette suivante : {recipe}
@@ -42,6 +170,114 @@ class InventoryManager:
 
         Sois directe et ne donne aucune explication technique."""
 
+    def _local_costs(self, recipe):
+        """
+        Coût de la recette calculé localement, ou None si le moteur est
+        désactivé ou que trop d'ingrédients n'ont pas de prix (plus de
+        max_unpriced) : le total ne serait qu'une petite partie du coût réel.
+        """
+        if self.cost_engine is None:
+            return None
+        rows = parse_recipe(recipe)
+        if not rows:
+            return None
+        costs = self.cost_engine.price(rows)
+        if not costs["priced"] or len(costs["unpriced"]) / len(rows) > self.max_unpriced:
+            if costs["unpriced"]:
+                logger.info("Coût local incomplet (non chiffrés : %s), recherche des prix",
+                            ", ".join(costs["unpriced"]))
+            return None
+        record("local_costs")
+        return costs
+
+    def _prose_prompt(self, recipe):
+        return f"""Tu es Safiatou DIALLO, gestionnaire financière.
+        Analyse la recette suivante : {recipe}
+
+        Rédige strictement les deux lignes suivantes :
+        - CLIENTS CIBLES : [Description]
+        - LIEUX DE VENTE : [Description]
+
+        Sois directe et ne donne aucune explication technique."""
+
+    def _cost_report(self, costs, prose):
+        # Total sans les ingrédients non chiffrés : signalé comme partiel
+        partial = " (partiel)" if costs["unpriced"] else ""
+        lines = [
+            f"- PRIX DES DEPENSES TOTAL : {costs['cost']:.2f}€{partial}",
+            f"- PRIX DE VENTE CONSEILLÉ : {costs['suggested_price']:.2f}€",
+            f"- BÉNÉFICE ESTIMÉ : {costs['margin']:.2f}€",
+        ]
+        if costs["unpriced"]:
+            lines.append(f"  (Non chiffrés : {', '.join(costs['unpriced'])})")
+        if prose:
+            lines.append(prose.strip())
+        return "\n".join(lines)
+
+    def _prose_failed(self, error):
+        # Les montants sont déjà calculés : on les rend même sans la partie rédigée
+        logger.warning("Rédaction clients / lieux de vente en échec : %s", error)
+        return None
+
+    def run(self, state):
+        logger.info("--- AGENT GESTIONNAIRE : RECHERCHE ET SYNTHÈSE FINANCIÈRE ---")
+        proposal = state.get('recipe_proposal', "")
+        recipe, _ = self.recipe_context.fit(proposal)
+
+        costs = self._local_costs(proposal)
+        if costs is not None:
+            # Montants calculés localement : un seul appel LLM, pour la partie rédigée
+            try:
+                prose = self.model_raw.invoke([HumanMessage(content=self._prose_prompt(recipe))]).content
+            except Exception as e:
+                prose = self._prose_failed(e)
+            return {"financials": self._cost_report(costs, prose)}
+
+        # 1. Appel pour déclencher la recherche
+        search_prompt = self._search_prompt(recipe)
+        response = self.model_with_tools.invoke([HumanMessage(content=search_prompt)])
+        
+        # 2. Exécution réelle des outils si nécessaire (en parallèle)
+        if response.tool_calls:
+            search_context = self._run_tool_calls(response.tool_calls)
+        else:
+            search_context = NO_WEB_DATA
+
+        # 3. DEUXIÈME APPEL : La synthèse propre
+        # On utilise model_raw (sans outils) pour forcer la rédaction du rapport
+        final_prompt = self._final_prompt(search_context, recipe)
+
         final_response = self.model_raw.invoke([HumanMessage(content=final_prompt)])
         
-        return {"financials": final_response.content}
\ No newline at end of file
+        return {"financials": final_response.content}
+
+    async def arun(self, state):
+        """
+        Version asynchrone de run : mêmes étapes, avec ainvoke.
+        """
+        logger.info("--- AGENT GESTIONNAIRE : RECHERCHE ET SYNTHÈSE FINANCIÈRE ---")
+        proposal = state.get('recipe_proposal', "")
+        recipe, _ = self.recipe_context.fit(proposal)
+
+        costs = self._local_costs(proposal)
+        if costs is not None:
+            try:
+                response = await self.model_raw.ainvoke([HumanMessage(content=self._prose_prompt(recipe))])
+                prose = response.content
+            except Exception as e:
+                prose = self._prose_failed(e)
+            return {"financials": self._cost_report(costs, prose)}
+
+        search_prompt = self._search_prompt(recipe)
+        response = await self.model_with_tools.ainvoke([HumanMessage(content=search_prompt)])
+
+        if response.tool_calls:
+            search_context = await self._arun_tool_calls(response.tool_calls)
+        else:
+            search_context = NO_WEB_DATA
+
+        final_prompt = self._final_prompt(search_context, recipe)
+
+        final_response = await self.model_raw.ainvoke([HumanMessage(content=final_prompt)])
+
+        return {"financials": final_response.content}
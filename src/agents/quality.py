@@ -1,17 +1,24 @@
 # agents/quality.py
+import os
+import logging
 from langchain_core.messages import HumanMessage
 
+from allergens import default_engine, normalize
+from router import is_refusal
+
+logger = logging.getLogger(__name__)
+
 class QualityAgent:
-    def __init__(self, llm):
+    def __init__(self, llm, allergen_engine=None, mode=None):
         self.llm = llm
+        # Détection locale des 14 allergènes réglementaires (voir allergens.py)
+        self.allergens = allergen_engine or default_engine()
+        # lexicon : moteur local, LLM seulement pour les ingrédients inconnus
+        # llm : toute l'analyse par le LLM (ancien comportement)
+        self.mode = mode or os.getenv("ALLERGEN_MODE", "lexicon")
 
-    def run(self, state):
-        proposal = state.get('recipe_proposal', "Aucune recette fournie.")
-        
-        if not proposal or proposal == "I'm sorry, that information is not in this document.":
-            return {"safety_report": "Analyse impossible : aucune recette valide à examiner."}
-
-        prompt = f"""
+    def _build_prompt(self, proposal):
+        return f"""
         Tu es un expert en sécurité alimentaire. 
         Analyse la proposition du Chef ci-dessous et identifie TOUS les allergènes potentiels.
         
@@ -21,13 +28,95 @@ class QualityAgent:
         CONSIGNE : Liste les allergènes en **GRAS ET MAJUSCULES**. 
         Si aucun allergène n'est présent, dis 'RAS'.
         """
+
+    def _unknown_prompt(self, ingredients):
+        lines = "\n".join(f"- {ingredient}" for ingredient in ingredients)
+        return f"""
+        Tu es un expert en sécurité alimentaire.
+        Pour chaque ingrédient ci-dessous, indique lesquels des 14 allergènes réglementaires il contient :
+        gluten, crustacés, œufs, poissons, arachides, soja, lait, fruits à coque, céleri, moutarde,
+        sésame, sulfites, lupin, mollusques.
+
+        INGRÉDIENTS :
+        {lines}
+
+        CONSIGNE : Une ligne par ingrédient, au format "ingrédient : allergènes", ou "ingrédient : RAS".
+        """
+
+    def _local_report(self, proposal):
+        """
+        Rapport du moteur local, ou None s'il faut tout confier au LLM
+        (mode llm, ou pas de liste d'ingrédients dans la proposition).
+        """
+        if self.mode == "llm":
+            return None
+        return self.allergens.analyze(proposal)
+
+    def _merge_answer(self, report, answer):
+        """
+        Ajoute au rapport les allergènes donnés par le LLM pour les ingrédients inconnus.
+        """
+        unknown = {tuple(normalize(ingredient)): ingredient for ingredient in report.unknown}
+        for line in answer.splitlines():
+            name, _, allergens = line.strip(" -*").rpartition(":")
+            ingredient = unknown.get(tuple(normalize(name)), name.strip(" *_") or "?")
+            for allergen in self.allergens.allergens_in_answer(allergens):
+                report.add(allergen, ingredient)
+        report.unknown = []
+
+    def _has_valid_proposal(self, proposal):
+        # Les refus imposés par les prompts (en français) ne sont pas des recettes
+        return not is_refusal(proposal)
+
+    def run(self, state):
+        proposal = state.get('recipe_proposal', "Aucune recette fournie.")
         
+        if not self._has_valid_proposal(proposal):
+            return {"safety_report": "Analyse impossible : aucune recette valide à examiner."}
+
+        report = self._local_report(proposal)
+
         try:
-            # Utilisation d'une liste de messages pour plus de compatibilité
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            
-            # On s'assure de retourner le contenu texte
-            return {"safety_report": response.content}
+            if report is None:
+                # Utilisation d'une liste de messages pour plus de compatibilité
+                response = self.llm.invoke([HumanMessage(content=self._build_prompt(proposal))])
+                # On s'assure de retourner le contenu texte
+                return {"safety_report": response.content}
+
+            # Le LLM n'est appelé que pour les ingrédients absents du lexique
+            if report.unknown:
+                response = self.llm.invoke([HumanMessage(content=self._unknown_prompt(report.unknown))])
+                self._merge_answer(report, response.content)
         except Exception as e:
-            print(f"Erreur dans QualityAgent : {e}")
-            return {"safety_report": f"Erreur lors de l'analyse : {str(e)}"}
\ No newline at end of file
+            logger.error("Erreur dans QualityAgent : %s", e)
+            if report is None:
+                return {"safety_report": f"Erreur lors de l'analyse : {str(e)}"}
+
+        # En cas d'erreur, les ingrédients inconnus restent signalés "à vérifier"
+        return {"safety_report": report.render()}
+
+    async def arun(self, state):
+        """
+        Version asynchrone de run, exécutée en parallèle du gestionnaire.
+        """
+        proposal = state.get('recipe_proposal', "Aucune recette fournie.")
+
+        if not self._has_valid_proposal(proposal):
+            return {"safety_report": "Analyse impossible : aucune recette valide à examiner."}
+
+        report = self._local_report(proposal)
+
+        try:
+            if report is None:
+                response = await self.llm.ainvoke([HumanMessage(content=self._build_prompt(proposal))])
+                return {"safety_report": response.content}
+
+            if report.unknown:
+                response = await self.llm.ainvoke([HumanMessage(content=self._unknown_prompt(report.unknown))])
+                self._merge_answer(report, response.content)
+        except Exception as e:
+            logger.error("Erreur dans QualityAgent : %s", e)
+            if report is None:
+                return {"safety_report": f"Erreur lors de l'analyse : {str(e)}"}
+
+        return {"safety_report": report.render()}
@@ -0,0 +1,354 @@
+"""
+Deterministic detection of the 14 EU regulatory allergens (règlement INCO
+n° 1169/2011) in a recipe, without any LLM call.
+
+A curated French lexicon (ingredient -> allergens, plus ingredients known
+to be allergen-free) is normalized (case, accents, œ/æ, apostrophes,
+plurals) and compiled into a single Aho-Corasick automaton over words.
+One pass over the recipe finds every term; overlapping matches keep the
+longest one ("beurre de cacahuète" is not milk, "noix de coco" is not a
+tree nut) and "sans X" is not a match.
+
+The ingredient lines that no term classifies are returned as unknown, so
+the caller can ask the LLM about those only.
+
+Usage:
+    engine = AllergenEngine()
+    report = engine.analyze(recipe)
+    report.render()  ->  "**GLUTEN** : farine de blé\\n**LAIT** : beurre doux"
+"""
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from recipes import ingredient_indices, ingredient_name
+
+# Les 14 allergènes à déclaration obligatoire, tels qu'affichés dans le rapport
+GLUTEN = "GLUTEN"
+CRUSTACEANS = "CRUSTACÉS"
+EGGS = "ŒUFS"
+FISH = "POISSONS"
+PEANUTS = "ARACHIDES"
+SOY = "SOJA"
+MILK = "LAIT"
+NUTS = "FRUITS À COQUE"
+CELERY = "CÉLERI"
+MUSTARD = "MOUTARDE"
+SESAME = "SÉSAME"
+SULPHITES = "SULFITES"
+LUPIN = "LUPIN"
+MOLLUSCS = "MOLLUSQUES"
+
+ALLERGENS = (GLUTEN, CRUSTACEANS, EGGS, FISH, PEANUTS, SOY, MILK, NUTS,
+             CELERY, MUSTARD, SESAME, SULPHITES, LUPIN, MOLLUSCS)
+
+# Ingrédient -> allergènes. Les termes plus longs l'emportent sur les plus
+# courts qu'ils contiennent ("farine de riz" sur "farine").
+LEXICON: Dict[str, Tuple[str, ...]] = {}
+
+
+def _add(allergens: Tuple[str, ...], terms: Iterable[str]) -> None:
+    for term in terms:
+        LEXICON[term] = allergens
+
+
+_add((GLUTEN,), [
+    "gluten", "blé", "farine", "farine de blé", "farine T45", "farine T55", "farine T65", "froment",
+    "seigle", "orge", "avoine", "flocons d'avoine", "lait d'avoine", "épeautre", "petit épeautre", "kamut", "triticale",
+    "semoule", "semoule de blé", "boulgour", "malt", "extrait de malt", "chapelure", "pain", "pain de mie",
+    "pain d'épices", "levain", "amidon de blé", "biscuit", "biscuits", "spéculoos", "crêpe dentelle",
+])
+_add((CRUSTACEANS,), ["crustacé", "crevette", "crabe", "homard", "langoustine", "écrevisse", "langouste"])
+_add((EGGS,), [
+    "œuf", "œuf entier", "jaune d'œuf", "blanc d'œuf", "blancs en neige", "meringue", "dorure",
+    "poudre d'œuf", "ovoproduit", "mayonnaise",
+])
+_add((FISH,), ["poisson", "anchois", "saumon", "thon", "cabillaud", "sardine", "colle de poisson"])
+_add((PEANUTS,), ["arachide", "cacahuète", "beurre de cacahuète", "huile d'arachide"])
+_add((SOY,), ["soja", "lécithine de soja", "lait de soja", "tofu", "sauce soja", "farine de soja"])
+_add((MILK,), [
+    "lait", "lait entier", "lait demi-écrémé", "lait écrémé", "lait en poudre", "lait concentré",
+    "lait concentré sucré", "beurre", "beurre doux", "beurre demi-sel", "beurre clarifié", "beurre noisette",
+    "crème", "crème liquide", "crème fraîche", "crème épaisse", "crème fleurette", "crème entière",
+    "crème chantilly", "chantilly", "fromage", "fromage blanc",
+    "mascarpone", "ricotta", "cream cheese", "philadelphia", "yaourt", "lactose", "babeurre", "lactosérum",
+    "petit-lait", "caséine", "chocolat au lait", "chocolat blanc", "caramel au beurre salé", "ghee",
+    # Contiennent presque toujours du lait (beurre de cacao seul : rare)
+    "pépites de chocolat",
+])
+_add((NUTS,), [
+    "fruits à coque", "amande", "amandes effilées", "poudre d'amande", "farine d'amande", "lait d'amande",
+    "pâte d'amande", "massepain", "noisette", "poudre de noisette", "noix", "cerneaux de noix",
+    "noix de cajou", "noix de pécan", "pécan", "noix de macadamia", "macadamia", "noix du Brésil",
+    "pistache", "pâte de pistache", "praliné", "pralin", "nougat", "nougatine", "gianduja", "marron glacé",
+])
+_add((CELERY,), ["céleri", "céleri-rave", "sel de céleri"])
+_add((MUSTARD,), ["moutarde", "graines de moutarde"])
+_add((SESAME,), ["sésame", "graines de sésame", "tahini", "tahin", "huile de sésame"])
+_add((SULPHITES,), [
+    "sulfite", "anhydride sulfureux", "vin", "vin blanc", "vin rouge", "porto", "cidre", "vinaigre de vin",
+    "raisins secs", "abricots secs", "fruits confits",
+])
+_add((LUPIN,), ["lupin", "farine de lupin"])
+_add((MOLLUSCS,), ["mollusque", "moule", "huître", "calamar", "seiche", "poulpe", "escargot", "coquille Saint-Jacques"])
+
+# Préparations et pâtisseries : aussi des noms de recettes ("la recette du flan")
+PREPARATIONS = set()
+
+
+def _add_preparations(allergens: Tuple[str, ...], terms: Iterable[str]) -> None:
+    _add(allergens, terms)
+    PREPARATIONS.update(terms)
+
+
+_add_preparations((GLUTEN, MILK), ["pâte brisée", "pâte feuilletée", "croissant", "beurre manié"])
+_add_preparations((GLUTEN, MILK, EGGS), [
+    "pâte sablée", "pâte sucrée", "brioche", "génoise", "pâte à choux", "biscuit cuillère", "madeleine",
+])
+_add_preparations((NUTS, EGGS, MILK), ["frangipane", "crème d'amande"])
+_add_preparations((MILK, EGGS), ["crème pâtissière", "crème anglaise", "crème brûlée", "crème au beurre", "flan"])
+_add_preparations((MILK, NUTS), ["pâte à tartiner"])
+PREPARATIONS.update([
+    "pain", "pain de mie", "pain d'épices", "biscuit", "biscuits", "spéculoos", "crêpe dentelle",
+    "meringue", "nougat", "nougatine", "massepain",
+])
+
+# Ingrédients sans allergène réglementaire : classés, donc jamais envoyés au LLM
+_add((), [
+    "sucre", "sucre en poudre", "sucre semoule", "sucre cristal", "sucre de canne", "sucre glace",
+    "sucre roux", "sucre vanillé", "cassonade", "vergeoise",
+    "sel", "fleur de sel", "eau", "miel", "sirop d'érable", "glucose", "sirop de glucose", "sirop",
+    "levure chimique", "levure de boulanger", "levure", "bicarbonate", "poudre à lever", "gélatine",
+    "agar-agar", "pectine", "vanille", "gousse de vanille", "extrait de vanille", "arôme vanille",
+    "cannelle", "muscade", "noix de muscade", "gingembre", "cardamome", "anis", "badiane", "zeste",
+    "cacao", "cacao en poudre", "chocolat", "chocolat noir", "café", "thé", "rhum",
+    "fécule", "fécule de maïs", "maïzena", "amidon de maïs", "fécule de pomme de terre",
+    "farine de riz", "farine de maïs", "farine de sarrasin", "farine de châtaigne", "farine de coco",
+    "farine de pois chiche", "farine sans gluten", "sarrasin", "riz", "quinoa", "maïs", "polenta",
+    "huile", "huile de tournesol", "huile d'olive", "huile de colza", "huile neutre",
+    "lait de coco", "crème de coco", "noix de coco", "coco râpée",
+    "pomme", "poire", "citron", "orange", "fraise", "framboise", "myrtille", "cerise", "abricot", "pêche",
+    "banane", "mangue", "ananas", "rhubarbe", "fruit de la passion", "fruits rouges", "compote", "confiture",
+    "colorant", "menthe", "basilic", "carotte", "courgette", "potiron", "patate douce",
+])
+
+# "caramel" n'est volontairement pas classé : à sec il est sans allergène,
+# à la crème ou au beurre il contient du lait, le LLM tranche sur l'ingrédient
+
+# Termes qui ne comptent que dans la liste des ingrédients : les ustensiles
+# ("beurrer le moule") et les noms de préparations, qui hors de la liste
+# désignent la recette elle-même ("voici la recette du flan") et dont les
+# composants sont de toute façon listés
+INGREDIENT_ONLY_TERMS = {"moule"} | PREPARATIONS
+
+# Mots qui annulent le terme qui les suit : "sans gluten", "sans lactose"
+_NEGATIONS = {"san", "hor", "exempt"}
+
+_WORDS = re.compile(r"[a-z0-9]+")
+
+
+def _accents_table() -> Dict[int, str]:
+    # Lettres latines accentuées -> lettre de base, calculé une fois (NFKD)
+    table = {ord("œ"): "oe", ord("æ"): "ae"}
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if base and base != char:
+            table[code] = base.lower()
+    return table
+
+
+_ACCENTS = _accents_table()
+
+
+def normalize(text: str) -> List[str]:
+    """
+    Words of a text, lowercased, without accents, with the plural marks
+    (final s / x) removed: "Œufs" and "oeuf" give the same word.
+    """
+    words = _WORDS.findall(text.lower().translate(_ACCENTS))
+    return [w[:-1] if len(w) > 3 and w[-1] in "sx" else w for w in words]
+
+
+class TokenAutomaton:
+    """
+    Aho-Corasick automaton over words: finds every pattern (word sequence)
+    in one pass over the text, whatever the number of patterns.
+    """
+
+    def __init__(self, patterns: Dict[Tuple[str, ...], object]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> [(pattern length, value)] of the patterns ending there
+        self._out: List[List[Tuple[int, object]]] = [[]]
+
+        for words, value in patterns.items():
+            node = 0
+            for word in words:
+                if word not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][word] = len(self._goto) - 1
+                node = self._goto[node][word]
+            self._out[node].append((len(words), value))
+
+        # Liens d'échec, en largeur d'abord
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, words: List[str]) -> Iterator[Tuple[int, int, object]]:
+        """
+        Yields (start, end, value) for every pattern occurrence.
+        """
+        node = 0
+        for i, word in enumerate(words):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, value in self._out[node]:
+                yield i - length + 1, i + 1, value
+
+    def longest_matches(self, words: List[str]) -> List[Tuple[int, int, object]]:
+        """
+        Non-overlapping matches, the longest one winning (leftmost first).
+        """
+        matches = sorted(self.finditer(words), key=lambda m: (m[0], -(m[1] - m[0])))
+        selected, end = [], 0
+        for start, stop, value in matches:
+            if start >= end:
+                selected.append((start, stop, value))
+                end = stop
+        return selected
+
+
+class AllergenReport:
+    """
+    Allergens found in a recipe, with the ingredients that contain them.
+    """
+
+    def __init__(self):
+        self.allergens: Dict[str, List[str]] = {}
+        # Lignes d'ingrédients qu'aucun terme du lexique ne classe
+        self.unknown: List[str] = []
+
+    def add(self, allergen: str, ingredient: str) -> None:
+        ingredients = self.allergens.setdefault(allergen, [])
+        if ingredient not in ingredients:
+            ingredients.append(ingredient)
+
+    def render(self) -> str:
+        """
+        Allergens in **BOLD UPPERCASE** (regulatory order), or 'RAS'.
+        """
+        lines = [
+            f"**{allergen}** : {', '.join(self.allergens[allergen])}"
+            for allergen in ALLERGENS if allergen in self.allergens
+        ]
+        if self.unknown:
+            lines.append(f"Ingrédients non classés, à vérifier : {', '.join(self.unknown)}")
+        return "\n".join(lines) if lines else "RAS"
+
+
+class AllergenEngine:
+    """
+    Local allergen detection, compiled once from the lexicon.
+    """
+
+    def __init__(self, lexicon: Dict[str, Tuple[str, ...]] = None):
+        lexicon = lexicon or LEXICON
+        patterns = {}
+        for term, allergens in lexicon.items():
+            patterns[tuple(normalize(term))] = (term, allergens)
+        self.automaton = TokenAutomaton(patterns)
+        # Reconnaissance des noms d'allergènes dans une réponse du LLM
+        self.allergen_names = TokenAutomaton({
+            tuple(normalize(alias)): allergen
+            for allergen, aliases in {
+                GLUTEN: ["gluten", "blé"], CRUSTACEANS: ["crustacés"], EGGS: ["œufs"],
+                FISH: ["poissons"], PEANUTS: ["arachides", "cacahuètes"], SOY: ["soja"],
+                MILK: ["lait", "lactose"], NUTS: ["fruits à coque"], CELERY: ["céleri"],
+                MUSTARD: ["moutarde"], SESAME: ["sésame"], SULPHITES: ["sulfites", "anhydride sulfureux"],
+                LUPIN: ["lupin"], MOLLUSCS: ["mollusques"],
+            }.items()
+            for alias in aliases
+        })
+
+    def _match_words(self, words: List[str]) -> List[Tuple[str, Tuple[str, ...]]]:
+        return [
+            value for start, _, value in self.automaton.longest_matches(words)
+            if not (start > 0 and words[start - 1] in _NEGATIONS)
+        ]
+
+    def match(self, text: str) -> List[Tuple[str, Tuple[str, ...]]]:
+        """
+        (lexicon term, allergens) of every ingredient found in the text.
+        """
+        return self._match_words(normalize(text))
+
+    @staticmethod
+    def ingredient_lines(recipe: str) -> List[str]:
+        """
+        Ingredients (without quantities) of the ingredients section, or of
+        every bullet line with a quantity when the recipe has no such section.
+        """
+        lines = recipe.splitlines()
+        return [ingredient_name(lines[i]) for i in ingredient_indices(lines)]
+
+    def analyze(self, recipe: str) -> Optional[AllergenReport]:
+        """
+        Allergens of a recipe. Every line is scanned (an allergen only named
+        in the steps still counts), except for the kitchen utensils and the
+        names of preparations and dishes (INGREDIENT_ONLY_TERMS), only
+        matched on the ingredient lines. The ingredient lines without any known term go to
+        report.unknown.
+
+        Returns:
+            The report, or None when no ingredient list can be found (free
+            text answer): the caller should fall back to the LLM
+        """
+        lines = recipe.splitlines()
+        ingredients = set(ingredient_indices(lines))
+        if not ingredients:
+            return None
+
+        report = AllergenReport()
+        for i, line in enumerate(lines):
+            matches = self._match_words(normalize(line))
+            if i not in ingredients:
+                matches = [match for match in matches if match[0] not in INGREDIENT_ONLY_TERMS]
+            for term, allergens in matches:
+                for allergen in allergens:
+                    report.add(allergen, term)
+            if not matches and i in ingredients:
+                report.unknown.append(ingredient_name(line))
+        return report
+
+    def allergens_in_answer(self, answer: str) -> List[str]:
+        """
+        Allergen names mentioned in a free text (e.g. an LLM answer).
+        """
+        words = normalize(answer)
+        found = []
+        for start, _, allergen in self.allergen_names.longest_matches(words):
+            if not (start > 0 and words[start - 1] in _NEGATIONS) and allergen not in found:
+                found.append(allergen)
+        return found
+
+
+@lru_cache(maxsize=1)
+def default_engine() -> AllergenEngine:
+    """
+    Engine built from the default lexicon, compiled once per process.
+    """
+    return AllergenEngine()
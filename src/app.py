@@ -1,18 +1,29 @@
 import os
-from typing import List
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from typing import List, Iterable, Iterator, Tuple
 from dotenv import load_dotenv
 
-import gradio as gr
-from langchain_core import tools
-from langchain_groq import ChatGroq
-from langchain_tavily import TavilySearch
+# Les dépendances lourdes (torch, sentence_transformers, chromadb, clients
+# Groq/Tavily) sont importées à la première utilisation
 from langchain_core.output_parsers import StrOutputParser
-from langchain_groq import ChatGroq
-from langsmith import traceable
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.document_loaders import TextLoader
+from langchain_core.runnables import RunnableLambda
 
 from vectordb import VectorDB
+from context import ContextAssembler
+from router import CANNED_ANSWERS, RECIPE, classify_question, classify_retrieval, route_after_chef
+from llm_cache import cache_from_env
+from llm_router import GroqModels, ModelRouter
+from graph_cache import cache_policy, node_cache_from_env, node_updates
+from indexer import indexer_from_env
+from market_cache import market_cache_from_env
+from metrics import setup_logging, timed_node, track_question
 from agents.chef import ChefAgent
 from agents.quality import QualityAgent
 from agents.inventorymanager import InventoryManager
@@ -29,33 +40,42 @@ load_dotenv()
 
 warnings.filterwarnings("ignore", category=UserWarning, module="langchain_tavily")
 
-# @traceable
-def load_documents(documents_path="data") -> List[str]:
+logger = logging.getLogger(__name__)
+
+def iter_documents(documents_path="data") -> Iterator:
     """
-    Load documents for demonstration.
+    Lazily load the documents of a folder, one file at a time, so they can
+    be streamed into the ingestion pipeline without holding the whole corpus.
 
-    Returns:
-        List[str]: raw text content of each document
+    Yields:
+        Document: LangChain document of each .txt file
     """
-    documents = []
+    from langchain_community.document_loaders import TextLoader
 
     # Load each .txt file in the folder
     try:
-        for filename in os.listdir(documents_path):
+        for filename in sorted(os.listdir(documents_path)):
             if filename.endswith(".txt"):
                 file_path = os.path.join(documents_path, filename)
 
                 loader = TextLoader(file_path)
-                loaded_docs = loader.load()  # returns List[Document]
+                yield from loader.load()  # returns List[Document]
 
-                documents.extend(loaded_docs)
-
-                print(f"Successfully loaded: {filename}")
+                logger.info("Successfully loaded: %s", filename)
 
     except Exception as e:
-        print(f"Error loading documents: {e}")
+        logger.error("Error loading documents: %s", e)
+
 
-    return documents
+# @traceable
+def load_documents(documents_path="data") -> List[str]:
+    """
+    Load documents for demonstration.
+
+    Returns:
+        List[str]: raw text content of each document
+    """
+    return list(iter_documents(documents_path))
 
 
 class RAGAssistant:
@@ -64,14 +84,24 @@ class RAGAssistant:
     Supports OpenAI, Groq, and Google Gemini APIs.
     """
 
-    def __init__(self):
-        """Initialize the RAG assistant."""
-        # Initialize LLM - check for available API keys in order of preference
-        self.llm = self._initialize_llm()
-        if not self.llm:
-            raise ValueError(
-                "No valid Groq API key found. Please set it in your .env file"
-            )
+    def __init__(self, rate_limiter=None, models=None):
+        """
+        Initialize the RAG assistant.
+
+        Args:
+            rate_limiter: Optional LangChain rate limiter applied to every LLM call
+            models: Optional ModelRouter (default: Groq models, see llm_router.py),
+                e.g. with a local stand-in model to run offline
+        """
+        # Optional response cache in front of the LLM (LLM_CACHE=exact|semantic).
+        # The semantic mode reuses the embedding model of the vector database.
+        self.llm_cache = cache_from_env(
+            embed=lambda texts: self.vector_db.embedding_model.encode(texts)
+        )
+
+        # Models of the graph nodes, sharing one HTTP connection pool
+        self.models = models or self._initialize_models(rate_limiter)
+        self.llm = self.models.for_node("rag")
 
         # Initialize vector database
         self.vector_db = VectorDB()
@@ -105,39 +135,51 @@ class RAGAssistant:
 
         self.prompt_template = ChatPromptTemplate.from_template(template)
 
+        # Context of the RAG prompt, within its token budget
+        self.context = ContextAssembler("rag")
+
         # Create the chain
         self.chain = self.prompt_template | self.llm | StrOutputParser()
 
-        print("RAG Assistant initialized successfully")
+        logger.info("RAG Assistant initialized successfully")
 
-    def _initialize_llm(self):
+    def _initialize_models(self, rate_limiter=None):
         """
-        Initialize the LLM by checking for available API keys.
-        Tries OpenAI, Groq, and Google Gemini in that order.
+        Initialize the Groq models of the nodes (main and fast model, see
+        llm_router.py), after checking for the API key.
         """
 
         # Check for Groq API key
         if os.getenv("GROQ_API_KEY"): 
-            model_name = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
-            print(f"Using Groq model: {model_name}")
-            return ChatGroq(
-                api_key=os.getenv("GROQ_API_KEY"), model=model_name, temperature=0.7
-            )
+            return ModelRouter(GroqModels(rate_limiter=rate_limiter, cache=self.llm_cache), cache=self.llm_cache)
 
         else:
             raise ValueError(
                 "No valid API key found. Please set the GROQ_API_KEY in your .env file"
             )
 
-    def add_documents(self, documents: List) -> None:
+    def add_documents(self, documents: Iterable) -> dict:
 
         """
         Add documents to the knowledge base.
 
         Args:
-            documents: List of documents
+            documents: List or generator of documents (see iter_documents)
+
+        Returns:
+            Ingestion statistics, including chunks/sec
+        """
+        return self.vector_db.add_documents(documents)
+
+    def sync_documents(self, documents_path: str = "data") -> dict:
+        """
+        Incrementally index a documents folder (only new or modified files
+        are embedded, deleted files are removed from the knowledge base).
+
+        Args:
+            documents_path: Folder containing the documents
         """
-        self.vector_db.add_documents(documents)
+        return self.vector_db.sync_directory(documents_path)
 
     def invoke(self, query: str, n_results: int = 3) -> str:
         """
@@ -153,26 +195,24 @@ class RAGAssistant:
         Returns:
             LLM answer as a string
         """
-        print("\n--- RAG Pipeline Invocation ---\n")
+        logger.debug("--- RAG Pipeline Invocation ---")
+        # SQL, prompt probing or empty question: canned answer, no retrieval
+        route = classify_question(query)
+        if route:
+            return CANNED_ANSWERS[route]
+
         # Retrieve vector results
         results = self.vector_db.search(query, n_results=n_results)
-
-        # Extract only the text of documents
-        docs = results["documents"]
+        # Nothing relevant in the knowledge base: no need to ask the LLM
+        if classify_retrieval(results) != RECIPE:
+            return CANNED_ANSWERS["no_context"]
 
         # Debug display
-        print("-" * 100)
-        print("Relevant documents:\n")
-        for doc in docs:
-            print(doc)
-            print("-" * 100)
+        logger.debug("Relevant documents: %s", results["documents"])
+        logger.debug("User question: %s", query)
 
-        print("\nUser question:")
-        print(input)
-        print("-" * 100)
-
-        # Build final context for the LLM
-        context_text = "\n\n".join(docs)
+        # Build final context for the LLM (overlapping chunks merged, within budget)
+        context_text, _ = self.context.assemble_chunks(results)
 
         # Prepare inputs for the chain
         chain_input = {
@@ -185,49 +225,184 @@ class RAGAssistant:
 
         return llm_answer
 
-# @traceable
+def build_graph(chef_agent, manager_agent, quality_agent, node_cache=None, checkpointer=None):
+    """
+    Build and compile the bakery workflow.
+
+    Args:
+        node_cache: Optional cache of the node outputs (see graph_cache.py):
+            a node whose input slice did not change is not run again
+        checkpointer: Optional LangGraph checkpointer, to resume interrupted
+            runs (the runs then need a thread_id)
+
+    Le Qualité ne lit que la recette du Chef : après le Chef, le Gestionnaire
+    et la Qualité tournent en parallèle, puis se rejoignent avant END.
+    Les questions refusées ou sans contexte s'arrêtent après le Chef.
+    Chaque nœud a une version synchrone (run) et asynchrone (arun), utilisée
+    par app.ainvoke / app.astream.
+    """
+    workflow = StateGraph(BakeryState)
+
+    # timed_node : temps de chaque nœud et attribution des métriques (LLM, Tavily, recherche)
+    for name, agent in (("chef", chef_agent), ("manager", manager_agent), ("quality", quality_agent)):
+        workflow.add_node(
+            name, RunnableLambda(timed_node(name, agent.run), afunc=timed_node(name, agent.arun)),
+            cache_policy=(cache_policy(name, getattr(agent, "vector_db", None))
+                          if node_cache is not None else None),
+        )
+
+    workflow.set_entry_point("chef")              # On commence par le Chef
+    # Le Chef envoie au Manager et en même temps à la Qualité, seulement s'il a
+    # proposé une vraie recette (sinon réponse toute prête, voir router.py)
+    workflow.add_conditional_edges(
+        "chef", route_after_chef, {"manager": "manager", "quality": "quality", "end": END}
+    )
+    workflow.add_edge(["manager", "quality"], END)  # On attend les deux branches avant de finir
+
+    return workflow.compile(cache=node_cache, checkpointer=checkpointer)
+
+
+def create_bakery_app(llm_rate_limiter=None, search_rate_limiter=None, checkpointer=None):
+    """
+    Initialize the assistant, sync the knowledge base and compile the graph.
+
+    Args:
+        llm_rate_limiter: Optional rate limiter for the Groq calls
+        search_rate_limiter: Optional rate limiter for the Tavily searches
+        checkpointer: Optional LangGraph checkpointer (see graph_cache.checkpointer_from_env)
+
+    Returns:
+        (assistant, compiled graph)
+    """
+    # Initialisation de l'assistant
+    logger.info("Initializing RAG Assistant...")
+    assistant = RAGAssistant(rate_limiter=llm_rate_limiter)
+
+    # Synchronisation des documents : seuls les fichiers nouveaux ou modifiés
+    # sont ré-indexés (index persistant si CHROMA_PERSIST_DIR est défini)
+    logger.info("Syncing documents...")
+    assistant.sync_documents()
+    # Plus d'ingestion ensuite : on libère les workers d'embedding éventuels
+    assistant.vector_db.close()
+
+    # Récupération des composants pour les agents
+    # On extrait les modèles et la db créés dans l'assistant pour les donner aux agents :
+    # chaque nœud a son modèle et son budget de latence (voir llm_router.py)
+    models = assistant.models
+    db = assistant.vector_db
+
+    # Préparer les outils
+    from langchain_tavily import TavilySearch
+
+    tavily_tool = TavilySearch(max_results=3, topic="general", include_raw_content=False,
+                                 search_depth="basic", country=None, include_answer=False, include_usage=False)
+    tools = [tavily_tool]
+
+    # Initialisation des Agents
+    chef_agent = ChefAgent(models.for_node("chef"), db)
+    quality_agent = QualityAgent(models.for_node("quality"))
+    manager_agent = InventoryManager(
+        models.for_node("manager"), tools, rate_limiter=search_rate_limiter, market_cache=market_cache_from_env(),
+        model_with_tools=models.for_node("manager_tools", tools),
+    )
+
+    # Construction du Graphe
+    # Mémoïsation des nœuds si NODE_CACHE=on (voir graph_cache.py)
+    app = build_graph(chef_agent, manager_agent, quality_agent, node_cache=node_cache_from_env(),
+                      checkpointer=checkpointer)
+
+    return assistant, app
+
+
+def import_times(module: str = "app") -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Import time of a module and of the top-level packages it pulls in,
+    measured in a fresh interpreter with `python -X importtime`.
+
+    Returns:
+        (total seconds, [(package, seconds), ...] slowest first)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+
+    packages = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package", nested imports are indented
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        if depth == 0 and name.strip() == module:
+            total = seconds
+        elif depth == 1:
+            # Direct imports of the module, grouped by top-level package
+            packages[name.strip().split(".")[0]] += seconds
+
+    return total, sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile_startup(top: int = 15) -> None:
+    """
+    Print where the startup time goes: module imports, initialization of
+    the assistant and the graph (time to first prompt), then the deferred
+    loading of the index and of the embedding model.
+    """
+    import_total, packages = import_times()
+
+    start = time.perf_counter()
+    assistant, _ = create_bakery_app()
+    init_seconds = time.perf_counter() - start
+    vector_db = assistant.vector_db
+
+    start = time.perf_counter()
+    vector_db.embedding_model
+    model_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_db.search("temps de cuisson", n_results=3)
+    search_seconds = time.perf_counter() - start
+
+    print("\n--- Profil du démarrage ---")
+    print(f"Imports (import app)          {import_total:8.3f}s")
+    for name, seconds in packages[:top]:
+        print(f"    {name:<26}{seconds:8.3f}s")
+    print(f"create_bakery_app             {init_seconds:8.3f}s")
+    for name, seconds in vector_db.load_times.items():
+        if name != "embedding_model":
+            print(f"    {name:<26}{seconds:8.3f}s")
+    ttfp = import_total + init_seconds
+    print(f"Time to first prompt          {ttfp:8.3f}s (objectif 1s {'atteint' if ttfp < 1 else 'dépassé'})")
+    print(f"Chargement modèle embedding   {model_seconds:8.3f}s (différé, à la première recherche)")
+    print(f"Première recherche            {search_seconds:8.3f}s")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Bakery Intelligence System")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the import and model loading times, then exit")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if args.profile_startup:
+        profile_startup()
+        return
+
     try:
-        # Initialisation de l'assistant
-        print("Initializing RAG Assistant...")
-        assistant = RAGAssistant()
-
-        # Chargement et ajout des documents
-        print("\nLoading documents...")
-        sample_docs = load_documents()
-        assistant.add_documents(sample_docs)
-        print(f"Loaded {len(sample_docs)} sample documents")
-
-        # Récupération des composants pour les agents
-        # On extrait le llm et la db créés dans l'assistant pour les donner aux agents
-        llm = assistant.llm
-        db = assistant.vector_db
-
-        # Préparer les outils
-        tavily_tool = TavilySearch(max_results=3, topic="general", include_raw_content=False,
-                                     search_depth="basic", country=None, include_answer=False, include_usage=False)
-        tools = [tavily_tool]
-
-        # Initialisation des Agents
-        chef_agent = ChefAgent(llm, db)
-        quality_agent = QualityAgent(llm)
-        manager_agent = InventoryManager(llm, tools)
-
-        # Construction du Graphe
-        workflow = StateGraph(BakeryState)
-        
-        workflow.add_node("chef", chef_agent.run)
-        workflow.add_node("manager", manager_agent.run)
-        workflow.add_node("quality", quality_agent.run)
-
-        # On définit le chemin étape par étape
-        workflow.set_entry_point("chef")      # On commence par le Chef
-        workflow.add_edge("chef", "manager")   # Le Chef envoie au Manager
-        workflow.add_edge("manager", "quality") # Le Manager envoie à la Qualité
-        workflow.add_edge("quality", END)      # La Qualité ferme la marche
-        
-        app = workflow.compile()
-        
+        assistant, app = create_bakery_app()
+
+        # Le modèle d'embedding se charge pendant que l'utilisateur tape sa question
+        threading.Thread(target=lambda: assistant.vector_db.embedding_model, daemon=True).start()
+        # Nouveaux fichiers de data/ indexés pendant la session
+        indexer = indexer_from_env(assistant.vector_db)
+        if indexer:
+            indexer.start()
+
         while True:
             question = input("\nEnter a question or 'quit' to exit: ")
             
@@ -241,31 +416,25 @@ def main():
             # On crée un dictionnaire vide pour accumuler les résultats
             full_state = {} 
 
-            for output in app.stream(initial_state):
-                for node_name, node_values in output.items():
-                    # On remplit notre dictionnaire au fur et à mesure
-                    full_state.update(node_values)
-                    # print(full_state)
-                    print(f"\n[Agent {node_name} terminé]")
+            with track_question(question):
+                for output in app.stream(initial_state):
+                    for node_name, node_values, cached in node_updates(output):
+                        # On remplit notre dictionnaire au fur et à mesure
+                        full_state.update(node_values)
+                        # print(full_state)
+                        print(f"\n[Agent {node_name} terminé{' (cache)' if cached else ''}]")
 
             print("\n--- Rapport final de la commande ---")
 
             print(f"La recette est:\n {full_state['recipe_proposal']}")
-            print(f"\nEvaluation des coûts:\n {full_state['financials']}")
-            print(f"\nContrôle qualité:\n {full_state['safety_report']}")
+            # Questions refusées ou sans contexte : ni chiffrage ni contrôle qualité
+            if "financials" in full_state:
+                print(f"\nEvaluation des coûts:\n {full_state['financials']}")
+            if "safety_report" in full_state:
+                print(f"\nContrôle qualité:\n {full_state['safety_report']}")
 
     except Exception as e:
         print(f"Error running Bakery AI: {e}")
 
-# demo = gr.Interface(
-#     fn=main,
-#     inputs=["text", "slider"],
-#     outputs=["text"],
-#     api_name="predict"
-# )
-
-# demo.launch()
-
-
 if __name__ == "__main__":
     main()
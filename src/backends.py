@@ -0,0 +1,488 @@
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Rows converted to float32 at once by the int8 first pass (kept small enough
+# to stay in the CPU cache, which is much faster than one large temporary)
+QUANTIZED_BLOCK_ROWS = 2048
+
+# Set bits of every byte, for Hamming distances on NumPy < 2.0
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compact codes of L2-normalized vectors.
+
+    "int8": one signed byte per dimension with a float32 scale per vector (4x smaller)
+    "binary": the sign of each dimension, packed 8 per byte (32x smaller)
+
+    Returns:
+        (codes, scales); scales is None for binary codes
+    """
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if quantization == "binary":
+        return np.packbits(vectors > 0, axis=1), None
+    raise ValueError(f"Unknown quantization: {quantization} (expected one of {', '.join(QUANTIZATIONS)})")
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT[values]
+
+
+class VectorBackend:
+    """
+    Storage of the chunk embeddings used by VectorDB.
+
+    The interface is the subset of the ChromaDB collection API used by
+    VectorDB, so results keep the Chroma shape (one list per query).
+    """
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], documents: List[str], embeddings: List[List[float]],
+               metadatas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict[str, list]:
+        """
+        Returns:
+            {"ids": [...], "documents": [...], "metadatas": [...]}
+        """
+        raise NotImplementedError
+
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> Dict[str, list]:
+        """
+        Returns:
+            {"ids", "documents", "distances", "metadatas"}, each a list per query
+        """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """
+        Delete everything stored in the backend.
+        """
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        """
+        Flush pending changes to disk (no-op for backends that persist by themselves).
+        """
+
+
+class ChromaBackend(VectorBackend):
+    """
+    ChromaDB collection (HNSW index), in memory or persistent.
+    """
+
+    def __init__(self, collection_name: str, persist_directory: Optional[str] = None):
+        # chromadb is only imported when this backend is used
+        import chromadb
+
+        self.collection_name = collection_name
+        if persist_directory:
+            self.client = chromadb.PersistentClient(path=persist_directory)
+        else:
+            self.client = chromadb.Client()
+        self._open()
+
+    def _open(self) -> None:
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            # embedding_function=None,
+            metadata={"description": "RAG document collection"},
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids, documents, embeddings, metadatas) -> None:
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def get(self, ids=None, limit=None, offset=None) -> Dict[str, list]:
+        return self.collection.get(
+            ids=ids, limit=limit, offset=offset, include=["documents", "metadatas"]
+        )
+
+    def query(self, query_embeddings, n_results) -> Dict[str, list]:
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents", "distances", "metadatas"],
+        )
+
+    def reset(self) -> None:
+        self.client.delete_collection(self.collection_name)
+        self._open()
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact (brute-force) index for small corpora, a few thousand chunks per shop.
+
+    L2-normalized float32 embeddings are stored in a memory-mapped .npy file,
+    with a JSON sidecar for the ids, documents and metadata. A query is one
+    matrix product plus argpartition. Distances are squared L2 distances
+    between unit vectors (2 - 2 * cosine), the same scale as Chroma's default
+    "l2" space, so the SEARCH_MAX_DISTANCE cutoff keeps its meaning.
+
+    With quantization, int8 or binary codes are kept in memory for a first
+    pass over the whole index, and only the best `n_results * rerank_factor`
+    candidates are re-ranked with their float32 vectors. Once persisted, the
+    float32 matrix stays on disk (memory-mapped) and only the rows of the
+    candidates are read.
+    """
+
+    def __init__(self, collection_name: str, persist_directory: Optional[str] = None,
+                 quantization: str = "none", rerank_factor: int = 10):
+        """
+        Args:
+            collection_name: Name of the index files
+            persist_directory: Folder of the index files (None = in-memory)
+            quantization: "none", "int8" or "binary"
+            rerank_factor: Candidates of the quantized pass re-ranked per result
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization} (expected one of {', '.join(QUANTIZATIONS)})")
+
+        self.collection_name = collection_name
+        self.quantization = quantization
+        self.rerank_factor = max(1, rerank_factor)
+        self.vectors_path = None
+        self.sidecar_path = None
+        self.codes_path = None
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self.vectors_path = os.path.join(persist_directory, f"{collection_name}_vectors.npy")
+            self.sidecar_path = os.path.join(persist_directory, f"{collection_name}_vectors.json")
+            self.codes_path = os.path.join(persist_directory, f"{collection_name}_vectors_{quantization}.npz")
+
+        self._lock = threading.RLock()
+        self._clear()
+        self._load()
+
+    def _clear(self) -> None:
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        # Rows appended since the last consolidation (avoids copying the matrix on every batch)
+        self._pending: List[np.ndarray] = []
+        # Quantized codes (and int8 scales) of the same rows, when quantization is on
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._pending_codes: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+
+    @property
+    def quantized(self) -> bool:
+        return self.quantization != "none"
+
+    def _load(self) -> None:
+        if not self.vectors_path or not os.path.exists(self.vectors_path):
+            return
+        if not os.path.exists(self.sidecar_path):
+            return
+
+        with open(self.sidecar_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        # Memory-mapped: opening the index does not read the vectors
+        self._matrix = np.load(self.vectors_path, mmap_mode="r")
+        self.ids = sidecar["ids"]
+        self.documents = sidecar["documents"]
+        self.metadatas = sidecar["metadatas"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+        if self.quantized:
+            self._load_codes()
+
+    def _load_codes(self) -> None:
+        if self.codes_path and os.path.exists(self.codes_path):
+            with np.load(self.codes_path) as saved:
+                if len(saved["codes"]) == len(self.ids):
+                    self._codes = saved["codes"]
+                    self._scales = saved["scales"] if "scales" in saved else None
+                    return
+
+        # Missing or outdated codes: quantize the stored vectors block by block
+        codes, scales = [], []
+        block_rows = 64 * QUANTIZED_BLOCK_ROWS
+        for start in range(0, len(self.ids), block_rows):
+            block_codes, block_scales = quantize(
+                np.asarray(self._matrix[start:start + block_rows]), self.quantization
+            )
+            codes.append(block_codes)
+            scales.append(block_scales)
+        if codes:
+            self._codes = np.concatenate(codes)
+            self._scales = np.concatenate(scales) if self.quantization == "int8" else None
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _consolidated(self) -> Optional[np.ndarray]:
+        if self._pending:
+            blocks = ([self._matrix] if self._matrix is not None else []) + self._pending
+            self._matrix = np.vstack(blocks)
+            self._pending = []
+        if self._pending_codes:
+            codes = [codes for codes, _ in self._pending_codes]
+            self._codes = np.concatenate(([self._codes] if self._codes is not None else []) + codes)
+            if self.quantization == "int8":
+                scales = [scales for _, scales in self._pending_codes]
+                self._scales = np.concatenate(([self._scales] if self._scales is not None else []) + scales)
+            self._pending_codes = []
+        return self._matrix
+
+    def _writable(self) -> np.ndarray:
+        matrix = self._consolidated()
+        if isinstance(matrix, np.memmap) or not matrix.flags.writeable:
+            self._matrix = np.array(matrix)
+        return self._matrix
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self.ids)
+
+    def upsert(self, ids, documents, embeddings, metadatas) -> None:
+        vectors = self._normalize(embeddings)
+        codes, scales = quantize(vectors, self.quantization) if self.quantized else (None, None)
+        with self._lock:
+            new_rows = []
+            for i, doc_id in enumerate(ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    self._rows[doc_id] = len(self.ids)
+                    self.ids.append(doc_id)
+                    self.documents.append(documents[i])
+                    self.metadatas.append(metadatas[i])
+                    new_rows.append(i)
+                else:
+                    self._writable()[row] = vectors[i]
+                    self.documents[row] = documents[i]
+                    self.metadatas[row] = metadatas[i]
+                    if codes is not None:
+                        self._codes[row] = codes[i]
+                        if scales is not None:
+                            self._scales[row] = scales[i]
+            if new_rows:
+                self._pending.append(vectors[new_rows])
+                if codes is not None:
+                    self._pending_codes.append(
+                        (codes[new_rows], scales[new_rows] if scales is not None else None)
+                    )
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            removed = {self._rows[doc_id] for doc_id in ids if doc_id in self._rows}
+            if not removed:
+                return
+
+            keep = [row for row in range(len(self.ids)) if row not in removed]
+            matrix = self._consolidated()
+            self._matrix = matrix[keep] if keep else None
+            if self._codes is not None:
+                self._codes = self._codes[keep] if keep else None
+                if self._scales is not None:
+                    self._scales = self._scales[keep] if keep else None
+            self.ids = [self.ids[row] for row in keep]
+            self.documents = [self.documents[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def get(self, ids=None, limit=None, offset=None) -> Dict[str, list]:
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            else:
+                start = offset or 0
+                end = start + limit if limit is not None else len(self.ids)
+                rows = range(start, min(end, len(self.ids)))
+            return {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [self.documents[row] for row in rows],
+                "metadatas": [self.metadatas[row] for row in rows],
+            }
+
+    def _candidate_rows(self, queries: np.ndarray, count: int) -> np.ndarray:
+        """
+        First pass over the quantized codes: the `count` most promising rows
+        of each query (one row of indices per query).
+        """
+        if self.quantization == "int8":
+            # Every block is converted once for all the queries of the batch
+            scores = np.empty((len(queries), len(self._codes)), dtype=np.float32)
+            for start in range(0, len(self._codes), QUANTIZED_BLOCK_ROWS):
+                end = start + QUANTIZED_BLOCK_ROWS
+                block = self._codes[start:end].astype(np.float32)
+                scores[:, start:end] = (queries @ block.T) * self._scales[start:end]
+        else:
+            query_bits = np.packbits(queries > 0, axis=1)
+            scores = np.stack([
+                -_popcount(np.bitwise_xor(self._codes, bits)).sum(axis=1, dtype=np.int32)
+                for bits in query_bits
+            ])
+
+        if count >= scores.shape[1]:
+            return np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        return np.argpartition(-scores, count - 1, axis=1)[:, :count]
+
+    def _search(self, queries: np.ndarray, k: int, exact: bool = False) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-k rows of each query and their cosine similarities, best first.
+        Must be called with the lock held and the matrix consolidated.
+        """
+        hits = []
+        if exact or not self.quantized:
+            similarities = queries @ self._matrix.T
+            # Top-k without sorting the whole row, then sort only those k
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            for q in range(len(queries)):
+                rows = top[q][np.argsort(-similarities[q, top[q]])]
+                hits.append((rows, similarities[q, rows]))
+            return hits
+
+        candidates = self._candidate_rows(queries, k * self.rerank_factor)
+        for query, rows in zip(queries, candidates):
+            # Sorted rows: the memory-mapped matrix is read in file order
+            rows = np.sort(rows)
+            similarities = np.asarray(self._matrix[rows]) @ query
+            order = np.argsort(-similarities)[:k]
+            hits.append((rows[order], similarities[order]))
+        return hits
+
+    def query(self, query_embeddings, n_results) -> Dict[str, list]:
+        queries = self._normalize(query_embeddings)
+        results = {"ids": [], "documents": [], "distances": [], "metadatas": []}
+
+        with self._lock:
+            matrix = self._consolidated()
+            if matrix is None or not len(self.ids):
+                for values in results.values():
+                    values.extend([] for _ in range(len(queries)))
+                return results
+
+            for rows, similarities in self._search(queries, min(n_results, len(self.ids))):
+                results["ids"].append([self.ids[row] for row in rows])
+                results["documents"].append([self.documents[row] for row in rows])
+                results["metadatas"].append([self.metadatas[row] for row in rows])
+                results["distances"].append((2.0 - 2.0 * similarities).tolist())
+
+        return results
+
+    def recall_at_k(self, query_embeddings, k: int = 10) -> float:
+        """
+        Share of the exact top-k (full float32 scan) found by the quantized
+        search, averaged over the queries. 1.0 without quantization.
+        """
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            if self._consolidated() is None or not len(self.ids):
+                return 1.0
+            k = min(k, len(self.ids))
+            exact = self._search(queries, k, exact=True)
+            approximate = self._search(queries, k)
+
+        found = [len(set(a.tolist()) & set(e.tolist())) / k for (a, _), (e, _) in zip(approximate, exact)]
+        return float(np.mean(found))
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Bytes held in memory by the float32 vectors (0 once memory-mapped)
+        and by the quantized codes.
+        """
+        with self._lock:
+            matrix = self._consolidated()
+            vectors = 0 if matrix is None or isinstance(matrix, np.memmap) else matrix.nbytes
+            codes = 0
+            if self._codes is not None:
+                codes = self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+            return {"vectors": vectors, "codes": codes}
+
+    def _remove_files(self) -> None:
+        for path in (self.vectors_path, self.sidecar_path, self.codes_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._clear()
+            self._remove_files()
+
+    def persist(self) -> None:
+        if not self.vectors_path:
+            return
+
+        with self._lock:
+            matrix = self._consolidated()
+            if matrix is None:
+                # Empty index: nothing to memory-map at the next start
+                self._remove_files()
+                return
+
+            # Temporary files then rename: readers never see a half-written index
+            tmp_vectors = f"{self.vectors_path}.tmp.npy"
+            np.save(tmp_vectors, np.ascontiguousarray(matrix, dtype=np.float32))
+            tmp_sidecar = f"{self.sidecar_path}.tmp"
+            with open(tmp_sidecar, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas},
+                    f, ensure_ascii=False,
+                )
+            if self.quantized:
+                tmp_codes = f"{self.codes_path}.tmp"
+                with open(tmp_codes, "wb") as f:
+                    if self._scales is not None:
+                        np.savez(f, codes=self._codes, scales=self._scales)
+                    else:
+                        np.savez(f, codes=self._codes)
+                os.replace(tmp_codes, self.codes_path)
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_sidecar, self.sidecar_path)
+
+            if self.quantized:
+                # Only the codes stay in memory, the re-rank reads the file
+                self._matrix = np.load(self.vectors_path, mmap_mode="r")
+
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend,
+}
+
+
+def create_backend(name: str, collection_name: str,
+                   persist_directory: Optional[str] = None, **options) -> VectorBackend:
+    """
+    Instantiate a backend by name ("chroma" or "numpy"); options are passed
+    to its constructor (e.g. quantization for "numpy").
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name](collection_name, persist_directory, **options)
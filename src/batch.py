@@ -0,0 +1,237 @@
+"""
+Batch mode: run many questions through the bakery graph concurrently and
+write one JSON report per question.
+
+Usage:
+    python src/batch.py --input questions.jsonl --output reports --concurrency 8
+    cat questions.jsonl | python src/batch.py --output reports --groq-rpm 30 --tavily-rpm 60
+    python src/batch.py --input questions.jsonl --checkpoints .cache/checkpoints.sqlite --resume
+    NODE_CACHE=on python src/batch.py --input questions.jsonl --refresh manager
+
+Each input line is either a JSON object {"id": "...", "question": "..."}
+or the question text (a JSON string, or any other line as is). Objects
+without a question are skipped.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from graph_cache import NODE_INPUTS, checkpointer_from_env, node_updates
+from metrics import setup_logging, track_question
+
+
+def read_questions(stream) -> List[Dict[str, str]]:
+    """
+    Read the questions of a JSONL stream.
+
+    Any line that is not a JSON object (plain text, JSON string, number,
+    list...) is the question text itself. Objects without a question are
+    skipped, with their line number on stderr.
+
+    Returns:
+        List of {"id": str, "question": str}
+    """
+    questions = []
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+
+        if not isinstance(item, dict):
+            item = {"question": item if isinstance(item, str) else line}
+
+        question = item.get("question")
+        if question is None or not str(question).strip():
+            print(f"Ligne {line_number} ignorée : pas de champ \"question\"", file=sys.stderr)
+            continue
+
+        question_id = str(item.get("id") or f"question_{line_number:05d}")
+        questions.append({"id": question_id, "question": str(question)})
+
+    return questions
+
+
+def rate_limiter_from_rpm(requests_per_minute: Optional[float]) -> Optional[InMemoryRateLimiter]:
+    """
+    Client-side rate limiter for an API quota expressed in requests per minute.
+    """
+    if not requests_per_minute:
+        return None
+    return InMemoryRateLimiter(
+        requests_per_second=requests_per_minute / 60,
+        check_every_n_seconds=0.05,
+        max_bucket_size=1,
+    )
+
+
+def report_path(output_dir: str, question_id: str) -> str:
+    safe_id = re.sub(r"[^\w.-]+", "_", question_id)
+    return os.path.join(output_dir, f"{safe_id}.json")
+
+
+def thread_id(item: Dict[str, str]) -> str:
+    # Une question modifiée sous le même id repart de zéro
+    return f"{item['id']}:{hashlib.sha256(item['question'].encode('utf-8')).hexdigest()[:16]}"
+
+
+async def run_question(app, item: Dict[str, str], semaphore: asyncio.Semaphore,
+                       output_dir: str, resume: bool = False) -> Dict:
+    """
+    Run one question through the graph and write its JSON report.
+
+    The timings give, for each agent, the number of seconds between the
+    start of the question and the end of that agent; the metrics give, per
+    agent, its own wall time, LLM calls and tokens, searches... (see metrics.py).
+
+    With a checkpointer, each question is a thread of the graph; with
+    resume, an answered question is not run again and an interrupted one
+    only runs the agents that did not finish.
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        full_state = {"question": item["question"]}
+        graph_input = {"question": item["question"]}
+        config = {"configurable": {"thread_id": thread_id(item)}} if app.checkpointer else None
+        timings = {}
+        cached_nodes = []
+        resumed = None
+        error = None
+
+        if config and resume:
+            snapshot = await app.aget_state(config)
+            if snapshot.values:
+                full_state.update(snapshot.values)
+                # Run interrompu : on repart du dernier checkpoint (graph_input None)
+                resumed = "interrupted" if snapshot.next else "done"
+                graph_input = None
+
+        with track_question(item["question"], item["id"]) as run:
+            try:
+                if resumed != "done":
+                    async for output in app.astream(graph_input, config):
+                        for node_name, node_values, cached in node_updates(output):
+                            full_state.update(node_values)
+                            timings[node_name] = round(time.perf_counter() - start, 3)
+                            if cached:
+                                cached_nodes.append(node_name)
+            except Exception as e:
+                print(f"Error on {item['id']}: {e}")
+                error = str(e)
+
+        timings["total"] = round(time.perf_counter() - start, 3)
+
+    report = {
+        "id": item["id"],
+        "question": item["question"],
+        "recipe": full_state.get("recipe_proposal"),
+        "financials": full_state.get("financials"),
+        "safety_report": full_state.get("safety_report"),
+        "route": full_state.get("route"),
+        "timings": timings,
+        "metrics": run.to_dict()["nodes"],
+        "cached_nodes": cached_nodes,
+        "resumed": resumed,
+        "error": error,
+    }
+
+    with open(report_path(output_dir, item["id"]), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"[{item['id']}] terminé en {timings['total']:.1f}s")
+    return report
+
+
+async def run_batch(app, questions: List[Dict[str, str]], output_dir: str,
+                    concurrency: int = 4, resume: bool = False) -> List[Dict]:
+    """
+    Run all the questions with at most `concurrency` of them in flight.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    return await asyncio.gather(
+        *(run_question(app, item, semaphore, output_dir, resume) for item in questions)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="-", help="JSONL file of questions ('-' = stdin)")
+    parser.add_argument("--output", default="reports", help="Folder of the JSON reports")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions processed at the same time")
+    parser.add_argument("--groq-rpm", type=float, default=float(os.getenv("GROQ_RPM", "30")),
+                        help="Groq quota in requests per minute (0 = unlimited)")
+    parser.add_argument("--tavily-rpm", type=float, default=float(os.getenv("TAVILY_RPM", "60")),
+                        help="Tavily quota in requests per minute (0 = unlimited)")
+    parser.add_argument("--checkpoints", default=os.getenv("GRAPH_CHECKPOINTS"),
+                        help="SQLite file of the graph checkpoints (needed by --resume)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip the questions already answered, finish the interrupted ones")
+    parser.add_argument("--refresh", nargs="+", default=[], choices=sorted(NODE_INPUTS),
+                        help="Agents recomputed even if the node cache has their output (NODE_CACHE=on)")
+    args = parser.parse_args()
+    if args.resume and not args.checkpoints:
+        parser.error("--resume needs --checkpoints or GRAPH_CHECKPOINTS")
+
+    setup_logging()
+
+    if args.input == "-":
+        questions = read_questions(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            questions = read_questions(f)
+
+    # Imported here so that --help does not load the models
+    from app import create_bakery_app
+
+    async def run_all():
+        # Le checkpointer SQLite asynchrone vit dans la boucle d'événements du batch
+        async with checkpointer_from_env(args.checkpoints) as checkpointer:
+            assistant, app = create_bakery_app(
+                llm_rate_limiter=rate_limiter_from_rpm(args.groq_rpm),
+                search_rate_limiter=rate_limiter_from_rpm(args.tavily_rpm),
+                checkpointer=checkpointer,
+            )
+            if args.refresh:
+                if app.cache is None:
+                    print("--refresh ignoré : cache des nœuds désactivé (NODE_CACHE=on pour l'activer)")
+                else:
+                    removed = app.cache.clear_nodes(args.refresh)
+                    print(f"Cache des nœuds : {removed} sorties de {', '.join(args.refresh)} oubliées")
+
+            print(f"\n--- Batch de {len(questions)} questions (concurrence : {args.concurrency}) ---")
+            start = time.perf_counter()
+            reports = await run_batch(app, questions, args.output, args.concurrency, args.resume)
+            return assistant, app, reports, time.perf_counter() - start
+
+    assistant, app, reports, elapsed = asyncio.run(run_all())
+
+    errors = sum(1 for report in reports if report["error"])
+    print(
+        f"\n{len(reports)} rapports écrits dans {args.output} en {elapsed:.1f}s "
+        f"({len(reports) / elapsed * 60:.1f} questions/min, {errors} erreurs)"
+    )
+    if assistant.llm_cache:
+        print(f"Cache LLM : {assistant.llm_cache.stats} (taux de hit {assistant.llm_cache.hit_rate():.0%})")
+    if app.cache is not None:
+        print(f"Cache des nœuds : {app.cache.stats} (taux de hit {app.cache.hit_rate():.0%})")
+    resumed = sum(1 for report in reports if report["resumed"])
+    if resumed:
+        print(f"Reprise : {resumed} questions déjà commencées")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Assembly of the context pasted into the LLM prompts, under a token budget.
+
+The prompt length drives the latency and the cost of every LLM call, so
+before building a prompt:
+    - retrieved chunks of the same source that overlap (chunk_text keeps a
+      200-character overlap) or follow each other are merged,
+    - near-duplicate passages are dropped,
+    - tool results (Tavily payloads) are reduced to their title and content,
+    - the result is cut to the agent's budget, at a line or sentence boundary.
+
+Budgets are read from CONTEXT_BUDGET_<AGENT> (tokens), e.g.
+CONTEXT_BUDGET_CHEF=600. The tokens saved by each call are logged at debug
+level and recorded in the metrics (see metrics.py).
+"""
+import os
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import record
+
+logger = logging.getLogger(__name__)
+
+# Default budgets (tokens) of each context, overridable by CONTEXT_BUDGET_<NAME>
+DEFAULT_BUDGETS = {
+    "chef": 800,
+    "rag": 800,
+    "manager_recipe": 600,
+    "manager_search": 500,
+}
+
+# Chunk IDs are "<source>#chunk_<index>" (see manifest.chunk_id)
+_CHUNK_ID = re.compile(r"^(?P<source>.*)#chunk_(?P<index>\d+)$")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate token count (~4 characters per token for Llama-style
+    tokenizers on French text), without loading a tokenizer.
+    """
+    return (len(text) + 3) // 4
+
+
+def context_budget(name: str) -> int:
+    """
+    Token budget of a context, from CONTEXT_BUDGET_<NAME> or DEFAULT_BUDGETS.
+    """
+    return int(os.getenv(f"CONTEXT_BUDGET_{name.upper()}", DEFAULT_BUDGETS[name]))
+
+
+def merge_overlap(first: str, second: str, min_overlap: int = 20) -> Optional[str]:
+    """
+    Merge two texts when the end of `first` is repeated at the start of
+    `second` (chunk overlap). Returns None when they do not overlap.
+    """
+    if second in first:
+        return first
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """
+    Cut a text to `budget` tokens, at the last line or sentence boundary
+    when there is one in the second half of the allowed text.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    # Room for the " […]" marker
+    cut = text[:max(0, budget * 4 - 8)]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " […]"
+
+
+class ContextAssembler:
+    """
+    Builds the context of one agent within its token budget.
+    """
+
+    def __init__(self, name: str, budget: int = None, duplicate_threshold: float = None):
+        """
+        Args:
+            name: Context name, used for the budget and the metrics
+                ("chef", "rag", "manager_recipe", "manager_search")
+            budget: Token budget (default: CONTEXT_BUDGET_<NAME>)
+            duplicate_threshold: Share of its word trigrams (relative to the
+                shorter passage) above which a passage is dropped as a
+                near-duplicate of a kept one (default: CONTEXT_DUPLICATE_THRESHOLD, 0.8)
+        """
+        self.name = name
+        self.budget = budget or context_budget(name)
+        self.duplicate_threshold = duplicate_threshold or float(
+            os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8")
+        )
+
+    def _report(self, raw_tokens: int, text: str) -> Dict[str, int]:
+        tokens = count_tokens(text)
+        stats = {"raw_tokens": raw_tokens, "tokens": tokens, "saved_tokens": max(0, raw_tokens - tokens)}
+        record("context_tokens", tokens, context=self.name)
+        record("context_tokens_saved", stats["saved_tokens"], context=self.name)
+        logger.debug("Context %s: %d tokens (%d saved)", self.name, tokens, stats["saved_tokens"])
+        return stats
+
+    def _merge_passages(self, results: Dict[str, Any]) -> List[str]:
+        """
+        Passages in rank order, chunks of the same source merged when they
+        overlap or are consecutive.
+        """
+        groups = []   # one [(index, text)] list per source, in rank order
+        by_source = {}
+        for rank, (doc_id, document) in enumerate(zip(results.get("ids", []), results.get("documents", []))):
+            if not document:
+                continue
+            match = _CHUNK_ID.match(doc_id or "")
+            source, index = (match["source"], int(match["index"])) if match else (doc_id, rank)
+            if source not in by_source:
+                by_source[source] = []
+                groups.append(by_source[source])
+            by_source[source].append((index, document))
+
+        passages = []
+        for chunks in groups:
+            chunks.sort()
+            current_index, current = chunks[0]
+            for index, text in chunks[1:]:
+                merged = merge_overlap(current, text)
+                if merged is None and index == current_index + 1:
+                    merged = current + "\n" + text
+                if merged is None:
+                    passages.append(current)
+                    current = text
+                else:
+                    current = merged
+                current_index = index
+            passages.append(current)
+        return passages
+
+    def _deduplicate(self, passages: List[str]) -> List[str]:
+        kept, kept_shingles = [], []
+        for passage in passages:
+            shingles = _shingles(passage)
+            if any(
+                len(shingles & other) / max(1, min(len(shingles), len(other))) >= self.duplicate_threshold
+                for other in kept_shingles
+            ):
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _fill(self, passages: List[str], separator: str = "\n\n") -> str:
+        """
+        Passages in order until the budget is spent; the last one is cut
+        if enough budget is left for it to be useful.
+        """
+        parts, used = [], 0
+        for passage in passages:
+            remaining = self.budget - used
+            tokens = count_tokens(passage)
+            if tokens > remaining:
+                if remaining >= 50:
+                    parts.append(truncate_to_budget(passage, remaining))
+                break
+            parts.append(passage)
+            used += tokens + count_tokens(separator)
+        return separator.join(parts)
+
+    def assemble_chunks(self, results: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """
+        Context from the results of VectorDB.search.
+
+        Args:
+            results: Search results (ids, documents, metadatas...), best first
+
+        Returns:
+            (context text, {"raw_tokens", "tokens", "saved_tokens"}), where
+            raw_tokens is the size of the plain join of the documents
+        """
+        documents = [document for document in results.get("documents", []) if document]
+        raw_tokens = count_tokens("\n\n".join(documents))
+        text = self._fill(self._deduplicate(self._merge_passages(results)))
+        return text, self._report(raw_tokens, text)
+
+    @staticmethod
+    def _compact_result(result: Any, max_chars: int) -> List[str]:
+        """
+        Title and content lines of a search result (Tavily payload dict,
+        list of payloads, JSON string or plain text).
+        """
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except ValueError:
+                return [result.strip()] if result.strip() else []
+        if isinstance(result, list):
+            return [line for item in result for line in ContextAssembler._compact_result(item, max_chars)]
+        if not isinstance(result, dict):
+            return [str(result)]
+        if "results" not in result:
+            content = result.get("content") or result.get("answer")
+            if content is None:
+                return [json.dumps(result, ensure_ascii=False)]
+            title = result.get("title")
+            content = " ".join(str(content).split())[:max_chars]
+            return [f"- {title} : {content}" if title else f"- {content}"]
+
+        lines = []
+        if result.get("answer"):
+            lines.append(f"- {' '.join(str(result['answer']).split())[:max_chars]}")
+        for item in result["results"]:
+            lines.extend(ContextAssembler._compact_result(item, max_chars))
+        return lines
+
+    def compact_tool_results(self, results: List[Any], max_chars: int = 300) -> Tuple[str, Dict[str, int]]:
+        """
+        Search context from raw tool results: only the title and the content
+        of each hit, duplicates removed, within the budget.
+
+        Args:
+            results: Tool outputs (one per tool call)
+            max_chars: Maximum characters kept from each hit's content
+
+        Returns:
+            (context text, stats), raw_tokens being the size of str() of the results
+        """
+        raw_tokens = count_tokens("".join(str(result) for result in results))
+        lines, seen = [], set()
+        for result in results:
+            for line in self._compact_result(result, max_chars):
+                if line not in seen:
+                    seen.add(line)
+                    lines.append(line)
+        text = self._fill(lines, separator="\n")
+        return text, self._report(raw_tokens, text)
+
+    def fit(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Cut a free text (e.g. the Chef's recipe) to the budget.
+        """
+        fitted = truncate_to_budget(text, self.budget)
+        return fitted, self._report(count_tokens(text), fitted)
@@ -0,0 +1,209 @@
+"""
+Local cost engine: prices the (ingredient, quantity, unit) rows of recipes
+(see recipes.py) against a price table, with vectorized NumPy, so the
+cost, suggested price and margin of hundreds of recipes come out of one
+pass, identical from one run to the next.
+
+The price table (PRICE_TABLE, default data/prix_ingredients.csv) gives for
+each ingredient a price per kg, per litre or per piece, and optionally its
+density (g/ml) and the weight of a piece (g), used to convert between
+units ("2 c. à soupe de sucre", "1 sachet de levure").
+
+Usage:
+    python src/costs.py --documents data
+"""
+import os
+import csv
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from allergens import TokenAutomaton, normalize
+from recipes import UNIT_FACTORS, IngredientRow, load_recipe_files, parse_recipe, recipe_name
+
+logger = logging.getLogger(__name__)
+
+MASS, VOLUME, PIECE = 0, 1, 2
+_DIMENSIONS = {"mass": MASS, "volume": VOLUME, "piece": PIECE}
+# Unité du tableau des prix -> (dimension, quantité de base : g, ml ou pièce)
+_PRICE_UNITS = {"kg": (MASS, 1000.0), "g": (MASS, 1.0), "l": (VOLUME, 1000.0), "ml": (VOLUME, 1.0),
+                "piece": (PIECE, 1.0)}
+
+
+class PriceTable:
+    """
+    Ingredient prices, as arrays indexed by ingredient.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: CSV with the columns ingredient, prix, unite (kg, l, piece),
+                densite_g_ml, poids_piece_g
+        """
+        self.path = path
+        self.names: List[str] = []
+        prices, dimensions, densities, piece_weights = [], [], [], []
+        with open(path, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                dimension, base = _PRICE_UNITS[row["unite"].strip()]
+                self.names.append(row["ingredient"].strip())
+                # Prix par g, par ml ou par pièce
+                prices.append(float(row["prix"]) / base)
+                dimensions.append(dimension)
+                densities.append(float(row["densite_g_ml"]) if row.get("densite_g_ml") else np.nan)
+                piece_weights.append(float(row["poids_piece_g"]) if row.get("poids_piece_g") else np.nan)
+
+        self.prices = np.array(prices, dtype=np.float64)
+        self.dimensions = np.array(dimensions, dtype=np.int8)
+        self.densities = np.array(densities, dtype=np.float64)
+        self.piece_weights = np.array(piece_weights, dtype=np.float64)
+        self._automaton = TokenAutomaton({tuple(normalize(name)): i for i, name in enumerate(self.names)})
+        self._lookups: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> int:
+        """
+        Index of the longest table entry found in an ingredient name
+        ("sucre semoule" -> "sucre semoule", "œufs entiers" -> "œuf"), -1 if none.
+        """
+        index = self._lookups.get(name)
+        if index is None:
+            matches = self._automaton.longest_matches(normalize(name))
+            index = max(matches, key=lambda m: m[1] - m[0])[2] if matches else -1
+            self._lookups[name] = index
+        return index
+
+
+class CostEngine:
+    """
+    Cost, suggested price and margin of recipes.
+    """
+
+    def __init__(self, price_table: PriceTable, coefficient: float = None):
+        """
+        Args:
+            price_table: Ingredient prices
+            coefficient: Multiplier from the ingredients cost to the selling
+                price (default: PRICE_COEFFICIENT, 3.5)
+        """
+        self.price_table = price_table
+        self.coefficient = coefficient or float(os.getenv("PRICE_COEFFICIENT", "3.5"))
+
+    def _row_costs(self, rows: List[IngredientRow]) -> np.ndarray:
+        """
+        Cost of each row (NaN when the ingredient, its quantity or a needed
+        conversion is unknown).
+        """
+        table = self.price_table
+        ingredients = np.array([table.lookup(row.name) for row in rows], dtype=np.int64)
+        quantities = np.array([np.nan if row.quantity is None else row.quantity for row in rows], dtype=np.float64)
+        units = [UNIT_FACTORS[row.unit] for row in rows]
+        unit_dimensions = np.array([_DIMENSIONS[dimension] for dimension, _ in units], dtype=np.int8)
+        base_quantities = quantities * np.array([factor for _, factor in units], dtype=np.float64)
+
+        known = ingredients >= 0
+        index = np.where(known, ingredients, 0)
+        prices = table.prices[index]
+        price_dimensions = table.dimensions[index]
+        densities = table.densities[index]
+        piece_weights = table.piece_weights[index]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Même dimension : conversion directe ; sinon passage par les grammes
+            grams = np.select(
+                [unit_dimensions == MASS, unit_dimensions == VOLUME],
+                [base_quantities, base_quantities * densities],
+                base_quantities * piece_weights,
+            )
+            converted = np.select(
+                [price_dimensions == MASS, price_dimensions == VOLUME],
+                [grams, grams / densities],
+                grams / piece_weights,
+            )
+            costs = np.where(unit_dimensions == price_dimensions, base_quantities, converted) * prices
+        costs[~known] = np.nan
+        return costs
+
+    def price_many(self, recipes: List[List[IngredientRow]]) -> List[Dict[str, Any]]:
+        """
+        Price a batch of recipes in one vectorized pass.
+
+        Args:
+            recipes: Ingredient rows of each recipe (see recipes.parse_recipe)
+
+        Returns:
+            For each recipe: cost, suggested_price, margin (euros, rounded to
+            the cent), priced / unpriced ingredient names and the cost per row
+        """
+        rows = [row for recipe in recipes for row in recipe]
+        recipe_index = np.repeat(np.arange(len(recipes)), [len(recipe) for recipe in recipes])
+        costs = self._row_costs(rows) if rows else np.zeros(0)
+
+        priced = ~np.isnan(costs)
+        totals = np.bincount(recipe_index, weights=np.where(priced, costs, 0.0), minlength=len(recipes))
+        selling = totals * self.coefficient
+
+        results = []
+        start = 0
+        for r, recipe in enumerate(recipes):
+            stop = start + len(recipe)
+            results.append({
+                "cost": round(float(totals[r]), 2),
+                "suggested_price": round(float(selling[r]), 2),
+                "margin": round(float(selling[r] - totals[r]), 2),
+                "priced": [row.name for row, ok in zip(recipe, priced[start:stop]) if ok],
+                "unpriced": [row.name for row, ok in zip(recipe, priced[start:stop]) if not ok],
+                "rows": [
+                    {"ingredient": row.name, "quantity": row.quantity, "unit": row.unit,
+                     "cost": round(float(cost), 3) if ok else None}
+                    for row, cost, ok in zip(recipe, costs[start:stop], priced[start:stop])
+                ],
+            })
+            start = stop
+        return results
+
+    def price(self, rows: List[IngredientRow]) -> Dict[str, Any]:
+        return self.price_many([rows])[0]
+
+
+def cost_engine_from_env() -> Optional[CostEngine]:
+    """
+    Cost engine from the environment (PRICE_TABLE, PRICE_COEFFICIENT), or
+    None when COST_ENGINE=llm or the price table cannot be read.
+    """
+    if os.getenv("COST_ENGINE", "local").lower() == "llm":
+        return None
+    path = os.getenv("PRICE_TABLE", os.path.join("data", "prix_ingredients.csv"))
+    try:
+        return CostEngine(PriceTable(path))
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning("Price table %s unavailable, costs left to the LLM: %s", path, e)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="data", help="Folder of the recipe files (.txt)")
+    parser.add_argument("--prices", default=os.getenv("PRICE_TABLE", os.path.join("data", "prix_ingredients.csv")))
+    parser.add_argument("--coefficient", type=float, default=None)
+    args = parser.parse_args()
+
+    engine = CostEngine(PriceTable(args.prices), args.coefficient)
+    texts = load_recipe_files(args.documents)
+    results = engine.price_many([parse_recipe(text) for text in texts.values()])
+
+    print(f"{'recette':<45}{'coût €':>9}{'prix €':>9}{'marge €':>9}  non chiffrés")
+    for (filename, text), result in zip(texts.items(), results):
+        print(
+            f"{recipe_name(text, filename)[:44]:<45}{result['cost']:>9.2f}{result['suggested_price']:>9.2f}"
+            f"{result['margin']:>9.2f}  {', '.join(result['unpriced'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
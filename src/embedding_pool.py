@@ -0,0 +1,96 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Model loaded once in each worker process (see _init_worker)
+_worker_model = None
+
+
+def _init_worker(model_name: str, device: str, threads: int) -> None:
+    """
+    Runs once in every worker: each process holds its own copy of the model.
+    """
+    global _worker_model
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Split the cores between the workers instead of letting each one
+    # start as many threads as there are cores
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device=device)
+
+
+def _encode(texts: List[str], batch_size: int):
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+
+class EmbeddingPool:
+    """
+    A pool of worker processes that embed chunks in parallel for large
+    re-indexing jobs on CPU-only machines.
+    """
+
+    def __init__(self, model_name: str, workers: Optional[int] = None,
+                 device: str = "cpu", batch_size: int = 64):
+        """
+        Start the worker processes.
+
+        Args:
+            model_name: SentenceTransformer model loaded by each worker
+            workers: Number of worker processes (default: number of cores)
+            device: Device used by the workers
+            batch_size: Batch size passed to encode inside each worker
+        """
+        self.model_name = model_name
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # "spawn" : torch ne supporte pas bien le fork d'un processus déjà initialisé
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, device, threads),
+        )
+
+        logger.info("Embedding pool started with %d workers (%d threads each)", self.workers, threads)
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Embed one batch of texts in a worker.
+
+        Returns:
+            Future resolving to the embeddings array of the batch
+        """
+        return self._executor.submit(_encode, texts, self.batch_size)
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts across all workers, results in input order.
+        """
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        embeddings = []
+        for batch_embeddings in self._executor.map(_encode, batches, [self.batch_size] * len(batches)):
+            embeddings.extend(batch_embeddings.tolist())
+        return embeddings
+
+    def warmup(self) -> None:
+        """
+        Wait until every worker has loaded its model (useful for benchmarks).
+        """
+        list(self._executor.map(_encode, [["warmup"]] * self.workers, [1] * self.workers))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,270 @@
+"""
+Memoization of the graph nodes and checkpoints of the graph runs.
+
+Node cache: each node's output is stored in SQLite under a hash of the
+slice of BakeryState it reads (NODE_INPUTS) and of what else decides its
+answer (model, knowledge base and search settings, price table, allergen
+mode...). Re-running a question then
+only recomputes the nodes whose inputs changed or whose entry expired:
+re-pricing yesterday's recipes reuses the Chef's answers and the quality
+reports, and only runs the Manager again.
+
+Checkpoints: with GRAPH_CHECKPOINTS, every step of a run is saved by the
+SQLite checkpointer of LangGraph (langgraph-checkpoint-sqlite), so an
+interrupted batch resumes on the nodes that did not finish (batch.py --resume).
+
+Environment:
+    NODE_CACHE=on                   enable the node cache (default off)
+    NODE_CACHE_PATH                 SQLite file (default .cache/node_cache.sqlite)
+    NODE_CACHE_TTL_<NODE>           lifetime of the entries of a node, in
+                                    seconds (0 = no expiry)
+    GRAPH_CHECKPOINTS               SQLite file of the checkpoints (unset = none)
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterator, Mapping, Optional, Sequence, Tuple
+
+from langgraph.cache.base import BaseCache
+from langgraph.types import CachePolicy
+
+from context import context_budget
+from llm_router import node_model
+from metrics import record
+
+logger = logging.getLogger(__name__)
+
+# Nœud -> champs de BakeryState qu'il lit
+NODE_INPUTS = {
+    "chef": ("question",),
+    "manager": ("recipe_proposal", "route"),
+    "quality": ("recipe_proposal", "route"),
+}
+
+# Durée de vie par défaut (secondes, None = pas d'expiration) : les prix du
+# marché bougent chaque jour, la base de connaissances plus rarement
+DEFAULT_TTLS = {
+    "chef": 7 * 86400,
+    "manager": 86400,
+    "quality": None,
+}
+
+
+def _price_table_version() -> str:
+    path = os.getenv("PRICE_TABLE", os.path.join("data", "prix_ingredients.csv"))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def node_version(node: str, vector_db=None) -> Dict[str, Any]:
+    """
+    What decides the answer of a node besides its input: a change (new
+    model, new document in the knowledge base, new price table...)
+    invalidates its cached outputs.
+
+    Args:
+        node: Graph node
+        vector_db: Knowledge base searched by the node (chef)
+    """
+    if node == "chef":
+        return {
+            "model": node_model("chef"),
+            # Un fichier ajouté ou modifié dans data/ (même à chaud, voir indexer.py) change la réponse
+            "index": vector_db.index_version() if vector_db is not None else None,
+            "search_mode": vector_db.search_mode if vector_db is not None else os.getenv("SEARCH_MODE", "vector"),
+            "max_distance": (vector_db.max_distance if vector_db is not None
+                             else float(os.getenv("SEARCH_MAX_DISTANCE", "0.4"))),
+            "context_budget": context_budget("chef"),
+        }
+    if node == "manager":
+        return {
+            "model": node_model("manager"),
+            "tools_model": node_model("manager_tools"),
+            "cost_engine": os.getenv("COST_ENGINE", "local"),
+            "prices": _price_table_version(),
+        }
+    if node == "quality":
+        return {"model": node_model("quality"), "mode": os.getenv("ALLERGEN_MODE", "lexicon")}
+    return {}
+
+
+def input_key(node: str, state: Mapping[str, Any], vector_db=None) -> str:
+    """
+    Hash of the input slice of a node and of its version.
+    """
+    payload = {
+        "input": {field: state.get(field) for field in NODE_INPUTS[node]},
+        "version": node_version(node, vector_db),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def node_updates(output: Mapping[str, Any]) -> Iterator[Tuple[str, Dict[str, Any], bool]]:
+    """
+    (node, update, cached) of an "updates" chunk of graph.stream / astream:
+    the updates served by the node cache carry an extra __metadata__ entry.
+    """
+    cached = bool((output.get("__metadata__") or {}).get("cached"))
+    for node_name, node_values in output.items():
+        if node_name != "__metadata__":
+            yield node_name, node_values or {}, cached
+
+
+def node_ttl(node: str) -> Optional[int]:
+    ttl = os.getenv(f"NODE_CACHE_TTL_{node.upper()}")
+    if ttl is None:
+        return DEFAULT_TTLS[node]
+    return int(float(ttl)) or None
+
+
+def cache_policy(node: str, vector_db=None) -> CachePolicy:
+    """
+    Cache policy of a graph node (see StateGraph.add_node).
+
+    Args:
+        node: Graph node
+        vector_db: Knowledge base searched by the node, part of its version
+    """
+    # La version est calculée à chaque appel : un nouveau tableau de prix ou
+    # un document ré-indexé comptent tout de suite
+    return CachePolicy(key_func=lambda state: input_key(node, state, vector_db), ttl=node_ttl(node))
+
+
+class NodeCache(BaseCache):
+    """
+    SQLite store of the node outputs, for LangGraph's node caching.
+    """
+
+    def __init__(self, path: str = ":memory:", **kwargs: Any):
+        """
+        Args:
+            path: SQLite file of the cache (":memory:" = not persisted)
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0}
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Les branches parallèles du graphe et le mode batch lisent le cache en même temps
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS node_cache (
+                ns TEXT NOT NULL,
+                node TEXT NOT NULL,
+                key TEXT NOT NULL,
+                encoding TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (ns, key)
+            )"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _ns(namespace: Tuple[str, ...]) -> str:
+        return json.dumps(list(namespace))
+
+    def get(self, keys: Sequence[Tuple[Tuple[str, ...], str]]) -> Dict[Tuple[Tuple[str, ...], str], Any]:
+        now = time.time()
+        values = {}
+        with self._lock:
+            for namespace, key in keys:
+                row = self._conn.execute(
+                    "SELECT encoding, value, expires_at FROM node_cache WHERE ns = ? AND key = ?",
+                    (self._ns(namespace), key),
+                ).fetchone()
+                # Le dernier élément de l'espace de noms de LangGraph est le nom du nœud
+                node = namespace[-1] if namespace else "none"
+                if row is not None and (row[2] is None or row[2] > now):
+                    values[(namespace, key)] = self.serde.loads_typed((row[0], row[1]))
+                    self.stats["hits"] += 1
+                    record("node_cache_hits", node=node)
+                else:
+                    self.stats["misses"] += 1
+        return values
+
+    async def aget(self, keys):
+        return await asyncio.to_thread(self.get, keys)
+
+    def set(self, pairs: Mapping[Tuple[Tuple[str, ...], str], Tuple[Any, Optional[int]]]) -> None:
+        now = time.time()
+        with self._lock:
+            for (namespace, key), (value, ttl) in pairs.items():
+                encoding, data = self.serde.dumps_typed(value)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO node_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._ns(namespace), namespace[-1] if namespace else "", key, encoding, data,
+                     now + ttl if ttl else None),
+                )
+            self._conn.commit()
+
+    async def aset(self, pairs):
+        await asyncio.to_thread(self.set, pairs)
+
+    def clear(self, namespaces: Optional[Sequence[Tuple[str, ...]]] = None) -> None:
+        with self._lock:
+            if namespaces is None:
+                self._conn.execute("DELETE FROM node_cache")
+            else:
+                self._conn.executemany("DELETE FROM node_cache WHERE ns = ?",
+                                       [(self._ns(namespace),) for namespace in namespaces])
+            self._conn.commit()
+
+    async def aclear(self, namespaces=None):
+        await asyncio.to_thread(self.clear, namespaces)
+
+    def clear_nodes(self, nodes: Sequence[str]) -> int:
+        """
+        Forget the outputs of some nodes (e.g. ["manager"] to re-price every
+        recipe). Returns the number of entries removed.
+        """
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM node_cache WHERE node = ?", [(node,) for node in nodes])
+            self._conn.commit()
+            return cursor.rowcount
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+def node_cache_from_env() -> Optional[NodeCache]:
+    if os.getenv("NODE_CACHE", "off").lower() in ("", "off", "none", "0", "false"):
+        return None
+    return NodeCache(os.getenv("NODE_CACHE_PATH", os.path.join(".cache", "node_cache.sqlite")))
+
+
+@asynccontextmanager
+async def checkpointer_from_env(path: Optional[str] = None):
+    """
+    SQLite checkpointer of the graph runs (GRAPH_CHECKPOINTS), or None.
+
+    Usage:
+        async with checkpointer_from_env() as checkpointer:
+            app = build_graph(..., checkpointer=checkpointer)
+    """
+    path = path or os.getenv("GRAPH_CHECKPOINTS")
+    if not path:
+        yield None
+        return
+
+    # Dépendance optionnelle, seulement pour la reprise des batchs
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(path) as checkpointer:
+        logger.info("Graph checkpoints in %s", path)
+        yield checkpointer
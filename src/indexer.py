@@ -0,0 +1,240 @@
+"""
+Live indexing of the documents folder while the assistant serves questions:
+new recipe sheets and supplier catalogues dropped into data/ during the day
+become searchable without a restart.
+
+A watcher thread scans the folder every INDEX_POLL_INTERVAL seconds and
+compares the stat (mtime, size) of the .txt files with the previous scan.
+A changed file is queued once its stat has not moved for INDEX_DEBOUNCE
+seconds (a file still being copied keeps changing), a deleted file right
+away. A worker thread takes the queued files in batches and re-indexes
+only them with VectorDB.index_files (a file that fails is retried later,
+with an exponential backoff): chunking and embedding happen outside
+the index lock, and each file is published in one step, so the searches
+keep running and never see a half-indexed document.
+
+Metrics (see metrics.py):
+    indexed_files           files re-indexed, by change (added, changed, removed, error)
+    indexing_lag_seconds    from the change of a file to its chunks being searchable
+    indexing_queue_depth    changed files waiting (debounce + queue + retries)
+
+Environment:
+    INDEX_WATCH=off             disable the watcher (default on)
+    INDEX_POLL_INTERVAL         seconds between two scans (default 1)
+    INDEX_DEBOUNCE              seconds a file must stay unchanged (default 2)
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from metrics import record
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryIndexer:
+    """
+    Background re-indexing of the files of a folder that change.
+    """
+
+    def __init__(self, vector_db, documents_path: str = "data", poll_interval: float = None,
+                 debounce: float = None, batch_size: int = 32):
+        """
+        Args:
+            vector_db: VectorDB kept in line with the folder
+            documents_path: Folder of the documents (same path as sync_directory)
+            poll_interval: Seconds between two scans (default: INDEX_POLL_INTERVAL, 1)
+            debounce: Seconds a changed file must stay untouched before it is
+                indexed (default: INDEX_DEBOUNCE, 2)
+            batch_size: Files indexed per batch (the indexes are saved once per batch)
+        """
+        self.vector_db = vector_db
+        self.documents_path = os.path.normpath(documents_path)
+        self.poll_interval = poll_interval if poll_interval is not None else float(
+            os.getenv("INDEX_POLL_INTERVAL", "1"))
+        self.debounce = debounce if debounce is not None else float(os.getenv("INDEX_DEBOUNCE", "2"))
+        self.batch_size = batch_size
+        # Attente avant de réessayer un fichier en échec : debounce, doublée à chaque échec
+        self.max_retry_delay = 300.0
+        self.stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "error": 0}
+
+        # Fichier -> (mtime, taille) au dernier scan
+        self._known: Dict[str, Tuple[float, int]] = {}
+        # Fichier -> (instant du dernier changement vu, heure du changement) en attente de stabilité
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        # (fichier, heure du changement) prêts à indexer
+        self._queue: "queue.Queue[Tuple[str, float]]" = queue.Queue()
+        # Fichier en échec -> (instant du prochain essai, heure du changement, nombre d'échecs)
+        self._retries: Dict[str, Tuple[float, float, int]] = {}
+        self._retries_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started_at = None
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        files = {}
+        with os.scandir(self.documents_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    file_stat = entry.stat()
+                    files[os.path.join(self.documents_path, entry.name)] = (file_stat.st_mtime, file_stat.st_size)
+        return files
+
+    def poll(self) -> None:
+        """
+        One scan of the folder: queue the files whose change has settled.
+        """
+        now = time.monotonic()
+        current = self._scan()
+        for file_path in set(current) | set(self._known):
+            signature = current.get(file_path)
+            if signature == self._known.get(file_path):
+                continue
+            if signature is None:
+                # Supprimé : rien à attendre
+                del self._known[file_path]
+                self._pending.pop(file_path, None)
+                self._queue.put((file_path, time.time()))
+                continue
+            self._known[file_path] = signature
+            # (Re)démarre l'attente : le fichier est peut-être encore en cours d'écriture
+            self._pending[file_path] = (now, max(signature[0], self._started_at or 0.0))
+            # Nouvelle version : les échecs de la précédente ne comptent plus
+            with self._retries_lock:
+                self._retries.pop(file_path, None)
+
+        for file_path, (changed_at, changed_time) in list(self._pending.items()):
+            if now - changed_at >= self.debounce:
+                del self._pending[file_path]
+                self._queue.put((file_path, changed_time))
+
+        with self._retries_lock:
+            for file_path, (retry_at, changed_time, _) in self._retries.items():
+                if retry_at <= now and file_path not in self._pending:
+                    self._queue.put((file_path, changed_time))
+                    # Replanifié par le worker s'il échoue encore
+                    self._retries[file_path] = (float("inf"),) + self._retries[file_path][1:]
+        self._record_depth()
+
+    def _record_depth(self) -> None:
+        with self._retries_lock:
+            retries = len(self._retries)
+        record("indexing_queue_depth", len(self._pending) + self._queue.qsize() + retries, node="indexer")
+
+    def _schedule_retry(self, file_path: str, changed_time: float) -> None:
+        with self._retries_lock:
+            failures = self._retries.get(file_path, (0.0, changed_time, 0))[2] + 1
+            delay = min(self.debounce * 2 ** failures, self.max_retry_delay)
+            self._retries[file_path] = (time.monotonic() + delay, changed_time, failures)
+        logger.warning("Indexing of %s failed (%d), retry in %gs", file_path, failures, round(delay, 1))
+
+    def process(self, timeout: float = None) -> Dict[str, str]:
+        """
+        Index one batch of queued files (waits up to `timeout` seconds for
+        the first one). Returns file -> change, see VectorDB.index_files.
+        """
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return {}
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # Le même fichier peut être en file deux fois : on garde le premier changement
+        changed_times = {}
+        for file_path, changed_time in batch:
+            changed_times.setdefault(file_path, changed_time)
+
+        try:
+            changes = self.vector_db.index_files(list(changed_times))
+        except Exception as e:
+            # Lot entier en échec (ex : sauvegarde des index) : chaque fichier sera réessayé
+            logger.error("Error indexing %d files: %s", len(changed_times), e)
+            changes = {file_path: "error" for file_path in changed_times}
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+        now = time.time()
+        for file_path, change in changes.items():
+            self.stats[change] += 1
+            if change == "error":
+                self._schedule_retry(file_path, changed_times[file_path])
+            else:
+                with self._retries_lock:
+                    self._retries.pop(file_path, None)
+            if change == "unchanged":
+                continue
+            record("indexed_files", node="indexer", change=change)
+            if change != "error":
+                record("indexing_lag_seconds", max(0.0, now - changed_times[file_path]), node="indexer")
+                logger.info("Indexed %s (%s)", file_path, change)
+        self._record_depth()
+        return changes
+
+    def idle(self) -> bool:
+        """
+        True when no change is waiting or being indexed (failed files
+        waiting for a retry are not counted).
+        """
+        return not self._pending and not self._queue.unfinished_tasks
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except OSError as e:
+                logger.warning("Could not scan %s: %s", self.documents_path, e)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.process(timeout=0.5)
+            except Exception as e:
+                logger.error("Indexing worker error: %s", e)
+
+    def start(self) -> "DirectoryIndexer":
+        """
+        Start the watcher and the worker threads.
+        """
+        self._started_at = time.time()
+        # État de départ : ce que le manifeste a indexé, pour rattraper les
+        # changements faits pendant que le service était arrêté
+        root = os.path.abspath(self.documents_path)
+        for source in self.vector_db.manifest.sources():
+            if os.path.dirname(os.path.abspath(source)) == root:
+                entry = self.vector_db.manifest.get(source)
+                # Même forme de chemin que les scans (la source a pu être indexée en "./data/...")
+                file_path = os.path.join(self.documents_path, os.path.basename(source))
+                self._known[file_path] = (entry.get("mtime"), entry.get("size"))
+
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._watch, name="index-watcher", daemon=True),
+            threading.Thread(target=self._work, name="index-worker", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info("Watching %s (every %gs, debounce %gs)", self.documents_path, self.poll_interval, self.debounce)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the threads; the file being indexed is finished first.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def indexer_from_env(vector_db, documents_path: str = "data") -> Optional[DirectoryIndexer]:
+    if os.getenv("INDEX_WATCH", "on").lower() in ("", "off", "none", "0", "false"):
+        return None
+    return DirectoryIndexer(vector_db, documents_path)
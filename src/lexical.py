@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mots vides français (et quelques mots anglais) ignorés par l'index lexical
+STOPWORDS = {
+    "a", "ai", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "est", "et", "il",
+    "je", "l", "la", "le", "les", "leur", "lui", "ma", "mais", "me", "mes", "mon", "ne", "nos", "notre",
+    "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses", "son", "sur", "ta",
+    "te", "tes", "ton", "tu", "un", "une", "vos", "votre", "vous", "d", "s", "n", "c", "j", "y",
+    "comment", "quel", "quelle", "quels", "quelles", "combien",
+    "the", "of", "and", "to", "in", "is", "for", "what", "how",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower case, accent-free, stopword-free terms with a naive singular
+    ("Œufs entiers" -> ["oeuf", "entier"]).
+    """
+    text = text.lower().replace("œ", "oe").replace("æ", "ae")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", text):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the same chunks as the Chroma collection.
+
+    Exact-term lookups (an allergen, "temps de cuisson", a supplier
+    reference) are answered without any model inference.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            path: JSON file where the index is saved (None = in-memory only)
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        # doc_id -> {term: frequency}; the postings are derived from it
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+        # Ingestion (or the directory watcher) writes while queries read
+        self._lock = threading.RLock()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int]) -> None:
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings[term][doc_id] = frequency
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def add(self, ids: List[str], documents: List[str]) -> None:
+        """
+        Index (or re-index) chunks.
+        """
+        with self._lock:
+            for doc_id, document in zip(ids, documents):
+                self._remove(doc_id)
+                self._add_terms(doc_id, dict(Counter(tokenize(document))))
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.doc_terms = {}
+            self.postings = defaultdict(dict)
+            self.doc_lengths = {}
+            self.total_length = 0
+
+    def is_keyword_query(self, query: str, max_terms: int = 3) -> bool:
+        """
+        Short query whose terms are all known by the index: the lexical
+        ranking alone is enough.
+        """
+        terms = tokenize(query)
+        with self._lock:
+            return 0 < len(terms) <= max_terms and all(term in self.postings for term in terms)
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        BM25 ranking of the chunks for a query.
+
+        Returns:
+            List of (chunk id, score), best first
+        """
+        terms = set(tokenize(query))
+        scores = defaultdict(float)
+
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs or not terms:
+                return []
+            avg_length = self.total_length / n_docs
+
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc_terms = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read lexical index %s: %s", self.path, e)
+            return
+
+        with self._lock:
+            self.clear()
+            for doc_id, terms in doc_terms.items():
+                self._add_terms(doc_id, terms)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.doc_terms, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge several rankings of chunk ids: score = sum of 1 / (k + rank).
+
+    Returns:
+        List of (chunk id, fused score), best first
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,370 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import warnings
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.messages import HumanMessage, convert_to_messages
+from langchain_core.prompt_values import PromptValue
+
+warnings.filterwarnings("ignore", message="The function `loads` is in beta")
+
+logger = logging.getLogger(__name__)
+
+# Question des prompts du RAG et du Chef : le texte sous "QUESTION:", jusqu'à la ligne vide
+QUESTION_PATTERN = re.compile(r"QUESTION\s*:\s*\n(.*?)(?:\n\s*\n|\Z)", re.DOTALL)
+
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache placed in front of the chat model shared by the agents
+    and the RAG chain.
+
+    Entries are keyed on the model configuration (model name, temperature,
+    bound tools... as given by LangChain's llm_string) and the rendered prompt.
+    They are stored in SQLite, with LRU eviction (max_entries) and an
+    optional TTL. Expired entries stay until they are refreshed or evicted:
+    lookup_stale serves them when the models are unavailable.
+
+    In semantic mode, a miss on the exact key can still be served by a
+    previous answer to a close enough question. Only the question of the
+    prompt is embedded; the rest (instructions, retrieved context) must be
+    identical. Prompts without a QUESTION section only get exact hits.
+    """
+
+    # Secondes pendant lesquelles l'embedding d'un miss attend la réponse du modèle
+    PENDING_SECONDS = 300
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 1000,
+                 ttl_seconds: Optional[float] = None,
+                 semantic_threshold: Optional[float] = None,
+                 embed: Optional[Callable[[List[str]], Any]] = None):
+        """
+        Args:
+            path: SQLite file of the cache (":memory:" = not persisted)
+            max_entries: Entries kept before the least recently used are evicted
+            ttl_seconds: Lifetime of an entry (None = no expiry)
+            semantic_threshold: Minimum cosine similarity for a semantic hit
+                (None = exact matches only)
+            embed: Function turning a list of texts into embeddings, required
+                in semantic mode (e.g. VectorDB.embedding_model.encode)
+        """
+        if semantic_threshold is not None and embed is None:
+            raise ValueError("The semantic mode of the LLM cache needs an embedding function")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.embed = embed
+
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0}
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Agents run in several threads (parallel graph branches, batch mode)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT NOT NULL,
+                value TEXT NOT NULL,
+                embedding BLOB,
+                scope TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_access ON llm_cache (last_access)")
+        self._conn.commit()
+
+        # Semantic index: scope (llm_string + prompt without its question) -> {key: normalized embedding}
+        self._vectors: Dict[str, Dict[str, np.ndarray]] = {}
+        # Embeddings computed on a miss, reused when the answer is stored:
+        # key -> (time, scope, embedding). A failed call never stores its
+        # answer, so entries older than PENDING_SECONDS are dropped.
+        self._pending_embeddings: "OrderedDict[str, Tuple[float, str, np.ndarray]]" = OrderedDict()
+        if self.semantic_threshold is not None:
+            self._load_vectors()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _prompt_text(prompt: str) -> str:
+        """
+        Chat models pass the serialized messages: only their text is used.
+        """
+        try:
+            messages = loads(prompt)
+            return "\n".join(str(message.content) for message in messages)
+        except Exception:
+            return prompt
+
+    @classmethod
+    def _semantic_parts(cls, prompt: str, llm_string: str) -> Tuple[Optional[str], str]:
+        """
+        (question, scope) of a prompt. The scope hashes the model
+        configuration and everything around the question (instructions,
+        retrieved context): only prompts of the same scope can match. The
+        question is None when the prompt has no QUESTION section.
+        """
+        text = cls._prompt_text(prompt)
+        match = QUESTION_PATTERN.search(text)
+        if match is None or not match.group(1).strip():
+            return None, ""
+        rest = text[:match.start(1)] + text[match.end(1):]
+        scope = hashlib.sha256(f"{llm_string}\x00{rest}".encode("utf-8")).hexdigest()
+        return match.group(1).strip(), scope
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _load_vectors(self) -> None:
+        rows = self._conn.execute(
+            "SELECT key, scope, embedding FROM llm_cache WHERE embedding IS NOT NULL AND scope IS NOT NULL"
+        ).fetchall()
+        for key, scope, embedding in rows:
+            self._vectors.setdefault(scope, {})[key] = np.frombuffer(embedding, dtype=np.float32)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _delete(self, keys: List[str]) -> None:
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(key,) for key in keys])
+        for vectors in self._vectors.values():
+            for key in keys:
+                vectors.pop(key, None)
+
+    def _get(self, key: str, allow_expired: bool = False) -> Optional[RETURN_VAL_TYPE]:
+        row = self._conn.execute(
+            "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created_at = row
+        if self._is_expired(created_at) and not allow_expired:
+            return None
+
+        self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return loads(value)
+
+    @staticmethod
+    def _mark_hit(value: RETURN_VAL_TYPE) -> RETURN_VAL_TYPE:
+        """
+        Flag the cached generations so that the metrics do not count them as API calls.
+        """
+        for generation in value:
+            generation.generation_info = {**(generation.generation_info or {}), "cache_hit": True}
+        return value
+
+    def _drop_old_pending(self) -> None:
+        limit = time.time() - self.PENDING_SECONDS
+        while self._pending_embeddings and next(iter(self._pending_embeddings.values()))[0] < limit:
+            self._pending_embeddings.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                self.stats["exact_hits"] += 1
+                return self._mark_hit(value)
+
+        question, scope = (None, "")
+        if self.semantic_threshold is not None:
+            question, scope = self._semantic_parts(prompt, llm_string)
+        if question is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        # Encodé hors du verrou : les autres lookups n'attendent pas le modèle
+        query = self._embed(question)
+
+        with self._lock:
+            vectors = self._vectors.get(scope)
+            if vectors:
+                keys = list(vectors)
+                similarities = np.stack([vectors[k] for k in keys]) @ query
+                # Du plus proche au moins proche : une entrée expirée laisse la place à la suivante
+                for best in np.argsort(-similarities):
+                    if similarities[best] < self.semantic_threshold:
+                        break
+                    value = self._get(keys[best])
+                    if value is not None:
+                        self.stats["semantic_hits"] += 1
+                        return self._mark_hit(value)
+
+            self._drop_old_pending()
+            self._pending_embeddings[key] = (time.time(), scope, query)
+            self.stats["misses"] += 1
+            return None
+
+    def lookup_stale(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """
+        Last answer stored for this exact prompt, even expired: the answer of
+        last resort when the models of a node are unavailable (see llm_router.py).
+        """
+        with self._lock:
+            value = self._get(self._key(prompt, llm_string), allow_expired=True)
+            if value is not None:
+                self.stats["stale_hits"] += 1
+                return self._mark_hit(value)
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+
+        embedding, scope = None, None
+        if self.semantic_threshold is not None:
+            with self._lock:
+                pending = self._pending_embeddings.pop(key, None)
+            if pending is not None:
+                _, scope, embedding = pending
+            else:
+                question, scope = self._semantic_parts(prompt, llm_string)
+                embedding = self._embed(question) if question is not None else None
+
+        with self._lock:
+            if embedding is not None:
+                self._vectors.setdefault(scope, {})[key] = embedding
+
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, value, embedding, created_at, last_access, scope)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    llm_string,
+                    dumps(return_val),
+                    embedding.tobytes() if embedding is not None else None,
+                    now,
+                    now,
+                    scope if embedding is not None else None,
+                ),
+            )
+
+            # LRU eviction
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                oldest = self._conn.execute(
+                    "SELECT key FROM llm_cache ORDER BY last_access LIMIT ?",
+                    (count - self.max_entries,),
+                ).fetchall()
+                self._delete([row[0] for row in oldest])
+                self.stats["evictions"] += len(oldest)
+
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._vectors = {}
+            self._pending_embeddings = OrderedDict()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+def chat_cache_key(model: Any, messages: Any, **kwargs: Any) -> Optional[Tuple[str, str]]:
+    """
+    (prompt, llm_string) under which LangChain caches the answer of a chat
+    model to these messages (see BaseChatModel._generate_with_cache), to
+    read that answer back outside of a model call.
+
+    The model configuration string has no public API: this is the only
+    place that uses LangChain internals, checked against the installed
+    version by `python src/llm_cache.py`. Returns None when they are missing.
+
+    Args:
+        model: Chat model (without its RunnableBinding)
+        messages: Model input (text, messages or prompt value)
+        kwargs: Arguments bound to the model (tools, stop...)
+    """
+    get_llm_string = getattr(model, "_get_llm_string", None)
+    if get_llm_string is None:
+        logger.warning("%s has no _get_llm_string: cached answers cannot be read back", type(model).__name__)
+        return None
+
+    if isinstance(messages, PromptValue):
+        messages = messages.to_messages()
+    elif isinstance(messages, str):
+        messages = [HumanMessage(content=messages)]
+    else:
+        messages = convert_to_messages(messages)
+    return dumps(messages), get_llm_string(**kwargs)
+
+
+def cache_from_env(embed: Optional[Callable[[List[str]], Any]] = None) -> Optional[LLMResponseCache]:
+    """
+    Build the LLM cache from the environment:
+        LLM_CACHE=exact|semantic (unset or "off" = no cache)
+        LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL (seconds),
+        LLM_CACHE_SEMANTIC_THRESHOLD (cosine similarity, semantic mode only)
+    """
+    mode = os.getenv("LLM_CACHE", "off").lower()
+    if mode in ("", "off", "none", "0", "false"):
+        return None
+    if mode not in ("exact", "semantic"):
+        raise ValueError(f"Unknown LLM_CACHE mode: {mode} (expected exact or semantic)")
+
+    ttl = os.getenv("LLM_CACHE_TTL")
+    return LLMResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000")),
+        ttl_seconds=float(ttl) if ttl else None,
+        semantic_threshold=(
+            float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", "0.95")) if mode == "semantic" else None
+        ),
+        embed=embed,
+    )
+
+
+def main():
+    """
+    Check that chat_cache_key finds the answers cached by the installed
+    LangChain version (plain model, bound arguments, text input).
+    """
+    from langchain_core.language_models import FakeListChatModel
+    from langchain_core.messages import SystemMessage
+
+    cache = LLMResponseCache()
+    model = FakeListChatModel(responses=["réponse"], cache=cache)
+    cases = {
+        "messages": (model, {}, [SystemMessage(content="Tu es boulanger."), HumanMessage(content="Un flan ?")]),
+        "bound": (model, {"stop": ["FIN"]}, [HumanMessage(content="Une brioche ?")]),
+        "text": (model, {}, "Une génoise ?"),
+    }
+    failures = 0
+    for name, (chat_model, kwargs, messages) in cases.items():
+        chat_model.bind(**kwargs).invoke(messages) if kwargs else chat_model.invoke(messages)
+        key = chat_cache_key(chat_model, messages, **kwargs)
+        found = key is not None and cache.lookup_stale(*key) is not None
+        failures += not found
+        print(f"{'ok ' if found else 'KO '} {name}")
+    if failures:
+        raise SystemExit(f"{failures} clés différentes de celles de LangChain")
+
+
+if __name__ == "__main__":
+    main()
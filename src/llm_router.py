@@ -0,0 +1,252 @@
+"""
+Per-node model routing: instead of one ChatGroq shared by every agent, each
+graph node gets its own model, temperature and latency budget.
+
+    chef, rag, manager   main model (GROQ_MODEL): the answers the user reads
+    manager_tools        fast model (GROQ_FAST_MODEL): only picks the searches
+    quality              fast model: only classifies ingredients
+
+A node that misses its latency budget (or fails) is answered by the fast
+model, then by the last cached answer to the same prompt, even expired
+(when the LLM cache is enabled, see llm_cache.py).
+
+The models are created once per (model, temperature, timeout) and share
+one pool of HTTP connections; transient errors (429, 5xx, network) are
+retried with exponential backoff by the Groq client.
+
+Environment:
+    GROQ_MODEL, GROQ_FAST_MODEL     main and fast models
+    LLM_MODEL_<NODE>                model of one node (CHEF, RAG, MANAGER,
+                                    MANAGER_TOOLS, QUALITY)
+    LLM_TEMPERATURE_<NODE>          temperature of one node
+    LLM_TIMEOUT_<NODE>              latency budget of one node (seconds)
+    LLM_MAX_RETRIES                 retries of a failed request (default 2)
+    LLM_MAX_CONNECTIONS             size of the HTTP connection pool (default 20)
+"""
+import os
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableLambda
+
+from llm_cache import chat_cache_key
+from metrics import LLMMetricsHandler, record
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+# Nœud -> (modèle principal ou rapide, température, budget de latence en secondes)
+NODE_DEFAULTS = {
+    "chef": ("main", 0.7, 30.0),
+    "rag": ("main", 0.7, 30.0),
+    "manager": ("main", 0.7, 20.0),
+    "manager_tools": ("fast", 0.0, 10.0),
+    "quality": ("fast", 0.0, 15.0),
+}
+
+
+class NodeModel(NamedTuple):
+    model: str
+    temperature: float
+    timeout: float              # budget de latence, en secondes
+    fallback: Optional[str]     # modèle de repli (None : le nœud utilise déjà le modèle rapide)
+
+
+class LLMTimeout(Exception):
+    """The model did not answer within the latency budget of the node."""
+
+
+class LLMUnavailable(Exception):
+    """Neither the models of a node nor the cache could answer."""
+
+
+def node_model(node: str) -> NodeModel:
+    """
+    Model configuration of a graph node, from NODE_DEFAULTS and the environment.
+    """
+    kind, temperature, timeout = NODE_DEFAULTS[node]
+    main = os.getenv("GROQ_MODEL", DEFAULT_MODEL)
+    fast = os.getenv("GROQ_FAST_MODEL", DEFAULT_MODEL)
+    suffix = node.upper()
+
+    model = os.getenv(f"LLM_MODEL_{suffix}", main if kind == "main" else fast)
+    return NodeModel(
+        model=model,
+        temperature=float(os.getenv(f"LLM_TEMPERATURE_{suffix}", temperature)),
+        timeout=float(os.getenv(f"LLM_TIMEOUT_{suffix}", timeout)),
+        fallback=fast if fast != model else None,
+    )
+
+
+class GroqModels:
+    """
+    ChatGroq factory: every model shares the same HTTP connection pools
+    (sync and async), the rate limiter and the response cache.
+    """
+
+    def __init__(self, rate_limiter=None, cache=None, max_retries: int = None, max_connections: int = None):
+        """
+        Args:
+            rate_limiter: Optional LangChain rate limiter applied to every call
+            cache: Optional LLM response cache (see llm_cache.py)
+            max_retries: Retries of a failed request, with exponential backoff
+                (default: LLM_MAX_RETRIES, 2)
+            max_connections: Size of the connection pool (default: LLM_MAX_CONNECTIONS, 20)
+        """
+        import httpx
+
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http_client = httpx.Client(limits=limits)
+        self.http_async_client = httpx.AsyncClient(limits=limits)
+
+    def __call__(self, model: str, temperature: float, timeout: float):
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(
+            api_key=os.getenv("GROQ_API_KEY"), model=model, temperature=temperature,
+            timeout=timeout, max_retries=self.max_retries,
+            http_client=self.http_client, http_async_client=self.http_async_client,
+            rate_limiter=self.rate_limiter, cache=self.cache,
+            # Appels, tokens et hits du cache, par nœud (voir metrics.py)
+            callbacks=[LLMMetricsHandler()],
+        )
+
+    def close(self) -> None:
+        self.http_client.close()
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+
+class ModelRouter:
+    """
+    Models of the graph nodes, with their latency budget and fallbacks.
+    """
+
+    def __init__(self, factory: Callable[[str, float, float], Any], cache=None, max_workers: int = None):
+        """
+        Args:
+            factory: Function (model, temperature, timeout) -> chat model,
+                e.g. GroqModels, or a local stand-in model offline
+            cache: LLM response cache, for the stale answers of last resort
+            max_workers: Threads running the synchronous calls under a deadline
+                (default: LLM_MAX_WORKERS, 8)
+        """
+        self.factory = factory
+        self.cache = cache
+        self._models: Dict[Tuple[str, float, float], Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("LLM_MAX_WORKERS", "8")), thread_name_prefix="llm"
+        )
+
+    def model(self, name: str, temperature: float, timeout: float):
+        """
+        Chat model of a configuration, created on first use and then shared.
+        """
+        key = (name, temperature, timeout)
+        with self._lock:
+            if key not in self._models:
+                logger.info("LLM model: %s (temperature %s, timeout %ss)", name, temperature, timeout)
+                self._models[key] = self.factory(name, temperature, timeout)
+            return self._models[key]
+
+    def _with_deadline(self, runnable: Runnable, node: str, model: str, seconds: float,
+                       fallback: bool = False) -> Runnable:
+        """
+        Runnable raising LLMTimeout when the model misses the latency budget.
+        """
+        def start():
+            if fallback:
+                logger.warning("%s : repli sur le modèle %s", node, model)
+                record("llm_fallbacks", to=model)
+
+        def invoke(messages, config=None):
+            start()
+            # Le contexte suit l'appel dans le thread (nœud en cours, pour les métriques)
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, runnable.invoke, messages, config)
+            try:
+                return future.result(timeout=seconds)
+            except FutureTimeoutError:
+                raise LLMTimeout(f"{model} sans réponse après {seconds:g}s ({node})") from None
+
+        async def ainvoke(messages, config=None):
+            start()
+            try:
+                return await asyncio.wait_for(runnable.ainvoke(messages, config), timeout=seconds)
+            except asyncio.TimeoutError:
+                raise LLMTimeout(f"{model} sans réponse après {seconds:g}s ({node})") from None
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"{node}:{model}")
+
+    def _cached_answer(self, runnable: Runnable, node: str) -> Runnable:
+        """
+        Last resort: the answer cached for the same prompt and the node's
+        main model, even expired.
+        """
+        model, kwargs = (runnable.bound, runnable.kwargs) if isinstance(runnable, RunnableBinding) else (runnable, {})
+
+        def answer(messages):
+            record("llm_fallbacks", to="cache")
+            key = chat_cache_key(model, messages, **kwargs)
+            value = self.cache.lookup_stale(*key) if key else None
+            if not value:
+                raise LLMUnavailable(f"Aucun modèle ni réponse en cache pour {node}")
+            logger.warning("%s : réponse en cache servie, modèles indisponibles", node)
+            return value[0].message
+
+        return RunnableLambda(answer, name=f"{node}:cache")
+
+    def for_node(self, node: str, tools=None) -> Runnable:
+        """
+        Model of a graph node: its main model under the latency budget, then
+        the fast model, then the cached answer.
+
+        Args:
+            node: Key of NODE_DEFAULTS
+            tools: Tools bound to the models (manager_tools)
+
+        Returns:
+            Runnable with invoke / ainvoke, answering AI messages
+        """
+        config = node_model(node)
+
+        def bound(name):
+            chat_model = self.model(name, config.temperature, config.timeout)
+            return chat_model.bind_tools(tools) if tools else chat_model
+
+        primary = bound(config.model)
+        chain = [self._with_deadline(primary, node, config.model, config.timeout)]
+        if config.fallback:
+            chain.append(self._with_deadline(bound(config.fallback), node, config.fallback, config.timeout,
+                                             fallback=True))
+        if self.cache is not None:
+            chain.append(self._cached_answer(primary, node))
+
+        return chain[0].with_fallbacks(chain[1:]) if len(chain) > 1 else chain[0]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        close = getattr(self.factory, "close", None)
+        if close:
+            close()
+
+    async def aclose(self) -> None:
+        """
+        Version asynchrone de close (ferme aussi le pool de connexions asynchrone).
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        aclose = getattr(self.factory, "aclose", None)
+        if aclose:
+            await aclose()
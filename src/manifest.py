@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """
+    Stable hash of a text (document or chunk), used to detect changes.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, index: int) -> str:
+    """
+    Deterministic chunk ID: re-indexing the same source overwrites its chunks
+    instead of duplicating them.
+    """
+    return f"{source}#chunk_{index}"
+
+
+class IndexManifest:
+    """
+    Keeps track of what is already embedded in the collection:
+    one entry per source file with its content hash, the hash of each chunk
+    and the file stat used for the fast "unchanged" check at startup.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[str] = None, embedding_model: str = ""):
+        """
+        Args:
+            path: JSON file where the manifest is stored (None = in-memory only)
+            embedding_model: model used to embed the chunks; a different model
+                invalidates the whole manifest
+        """
+        self.path = path
+        self.embedding_model = embedding_model
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._version: Optional[str] = None
+        self.load()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read index manifest %s: %s", self.path, e)
+            return
+
+        if data.get("version") != self.VERSION or data.get("embedding_model") != self.embedding_model:
+            logger.warning("Index manifest is outdated, the collection will be rebuilt.")
+            return
+
+        self.files = data.get("files", {})
+        self._version = None
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        data = {
+            "version": self.VERSION,
+            "embedding_model": self.embedding_model,
+            "files": self.files,
+        }
+        # Write to a temporary file then rename, so an interrupted run never
+        # leaves a half-written manifest behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def version(self) -> str:
+        """
+        Hash of the indexed content (file hashes and embedding model): it
+        changes as soon as a document is added, modified or removed.
+        """
+        if self._version is None:
+            digest = hashlib.sha256(self.embedding_model.encode("utf-8"))
+            for source in sorted(self.files):
+                digest.update(f"\x00{source}\x00{self.files[source].get('hash', '')}".encode("utf-8"))
+            self._version = digest.hexdigest()
+        return self._version
+
+    def sources(self) -> List[str]:
+        return list(self.files)
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(source)
+
+    def chunk_ids(self, source: str) -> List[str]:
+        entry = self.files.get(source)
+        if not entry:
+            return []
+        return [chunk_id(source, i) for i in range(len(entry["chunks"]))]
+
+    def set(self, source: str, file_hash: str, chunk_hashes: List[str]) -> None:
+        entry = self.files.setdefault(source, {})
+        entry["hash"] = file_hash
+        entry["chunks"] = chunk_hashes
+        self._version = None
+
+    def set_stat(self, source: str, mtime: float, size: int) -> None:
+        entry = self.files.get(source)
+        if entry is not None:
+            entry["mtime"] = mtime
+            entry["size"] = size
+
+    def is_unchanged(self, source: str, mtime: float, size: int) -> bool:
+        """
+        Cheap check based on the file stat, avoids reading and hashing files
+        that were not touched since the last run.
+        """
+        entry = self.files.get(source)
+        return bool(entry) and entry.get("mtime") == mtime and entry.get("size") == size
+
+    def remove(self, source: str) -> None:
+        self.files.pop(source, None)
+        self._version = None
+
+    def clear(self) -> None:
+        self.files = {}
+        self._version = None
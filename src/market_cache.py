@@ -0,0 +1,266 @@
+import os
+import re
+import json
+import time
+import logging
+import sqlite3
+import threading
+import contextvars
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mots qui ne désignent pas un ingrédient dans une requête de prix
+STOPWORDS = {
+    "a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "pour", "sur", "un", "une",
+    "actuel", "actuelle", "actuelles", "actuels", "cout", "couts", "euro", "euros", "france", "gramme",
+    "grammes", "kg", "kilo", "kilogramme", "litre", "litres", "marche", "moyen", "moyenne", "prix",
+    "supermarche", "tarif", "tarifs", "vente",
+}
+
+# Séparateurs entre plusieurs ingrédients d'une même requête
+INGREDIENT_SEPARATORS = re.compile(r",|;|\n|\bet\b")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalized key of a price query: lower case, no accents, no stopwords,
+    naive singular, sorted words. "Prix du Beurre doux" and "beurres doux prix"
+    share the same key.
+    """
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in STOPWORDS or word.isdigit():
+            continue
+        if word.endswith("eaux"):
+            word = word[:-1]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+
+    return " ".join(sorted(words)) or query.strip().lower()
+
+
+def split_ingredients(query: str) -> List[Tuple[str, str]]:
+    """
+    Split a query listing several ingredients
+    ("prix du beurre, de la farine et du sucre" -> 3 parts).
+
+    Returns:
+        List of (normalized key, search query) for each ingredient
+    """
+    parts = []
+    keys = set()
+    for part in INGREDIENT_SEPARATORS.split(query):
+        part = part.strip()
+        if not part:
+            continue
+        key = normalize_query(part)
+        if key in keys:
+            continue
+        keys.add(key)
+        parts.append((key, part if "prix" in part.lower() else f"prix {part}"))
+    return parts
+
+
+class MarketDataCache:
+    """
+    Local SQLite cache of market-price searches, shared by every recipe.
+
+    Entries are stored per normalized ingredient (or per normalized query
+    when it cannot be split) with a TTL. With stale_seconds > 0, an expired
+    entry is still returned immediately during that extra window while it is
+    refreshed in the background (stale-while-revalidate).
+    """
+
+    def __init__(self, path: str = ":memory:", ttl_seconds: float = 86400,
+                 stale_seconds: float = 0, max_workers: int = 4):
+        """
+        Args:
+            path: SQLite file of the cache (":memory:" = not persisted)
+            ttl_seconds: Age after which a price must be searched again
+            stale_seconds: Extra time during which an expired price is still
+                served while being refreshed (0 = disabled)
+            max_workers: Searches run at the same time for the missing
+                ingredients of one query
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS market_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                value TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+        # Une seule recherche réseau à la fois par clé, même entre recettes concurrentes
+        self._in_flight: Dict[str, Future] = {}
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="market-refresh")
+        # Les ingrédients manquants d'une même requête sont cherchés en parallèle
+        self._fetcher = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="market-fetch")
+
+    def _read(self, key: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value, fetched_at FROM market_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _write(self, key: str, query: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO market_cache VALUES (?, ?, ?, ?)",
+                (key, query, json.dumps(value, ensure_ascii=False, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def _count(self, stat: str) -> None:
+        # Compteurs mis à jour depuis les threads de recherche et de rafraîchissement
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _fetch(self, key: str, query: str, fetch: Callable[[str], Any]) -> Any:
+        """
+        Run the search for a key, or wait for the one already running.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch(query)
+            self._write(key, query, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _refresh_in_background(self, key: str, query: str, fetch: Callable[[str], Any]) -> None:
+        def refresh():
+            try:
+                self._fetch(key, query, fetch)
+                self._count("refreshes")
+            except Exception as e:
+                logger.warning("Background refresh failed for '%s': %s", query, e)
+
+        with self._lock:
+            if key in self._in_flight:
+                return
+        self._refresher.submit(refresh)
+
+    def _cached(self, key: str, query: str, fetch: Callable[[str], Any]) -> Tuple[bool, Any]:
+        """
+        (True, value) when the key is fresh or within its stale window,
+        (False, None) when it must be fetched.
+        """
+        row = self._read(key)
+        if row is not None:
+            value, fetched_at = row
+            age = time.time() - fetched_at
+            if age <= self.ttl_seconds:
+                self._count("hits")
+                return True, json.loads(value)
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self._count("stale_hits")
+                self._refresh_in_background(key, query, fetch)
+                return True, json.loads(value)
+
+        self._count("misses")
+        return False, None
+
+    def get_or_fetch(self, key: str, query: str, fetch: Callable[[str], Any]) -> Any:
+        """
+        Cached result of `fetch(query)` for a normalized key.
+        """
+        found, value = self._cached(key, query, fetch)
+        return value if found else self._fetch(key, query, fetch)
+
+    def search(self, query: str, fetch: Callable[[str], Any], namespace: str = "") -> Any:
+        """
+        Cached search for a price query.
+
+        A query listing several ingredients is split so that each ingredient
+        gets its own entry, reusable by other recipes; the result is then the
+        list of the per-ingredient results. The ingredients missing from the
+        cache are searched in parallel (max_workers at a time), so a cold
+        query takes about the time of one search.
+
+        Args:
+            query: Search query written by the model
+            fetch: Function running the real search for a query
+            namespace: Prefix of the keys (e.g. the tool name)
+        """
+        parts = split_ingredients(query)
+        if len(parts) <= 1:
+            return self.get_or_fetch(f"{namespace}:{normalize_query(query)}", query, fetch)
+
+        results = []
+        missing = []
+        for key, part_query in parts:
+            found, value = self._cached(f"{namespace}:{key}", part_query, fetch)
+            results.append(value)
+            if not found:
+                missing.append((len(results) - 1, f"{namespace}:{key}", part_query))
+
+        if len(missing) == 1:
+            index, key, part_query = missing[0]
+            results[index] = self._fetch(key, part_query, fetch)
+        elif missing:
+            # Le contexte suit chaque recherche dans son thread (métriques du nœud en cours)
+            futures = [
+                (index, self._fetcher.submit(contextvars.copy_context().run, self._fetch, key, part_query, fetch))
+                for index, key, part_query in missing
+            ]
+            for index, future in futures:
+                results[index] = future.result()
+        return results
+
+    def close(self) -> None:
+        self._refresher.shutdown(wait=False)
+        self._fetcher.shutdown(wait=False)
+        with self._lock:
+            self._conn.close()
+
+
+def market_cache_from_env() -> Optional[MarketDataCache]:
+    """
+    Build the market-data cache from the environment:
+        MARKET_CACHE=off to disable it
+        MARKET_CACHE_PATH, MARKET_CACHE_TTL (seconds, default one day),
+        MARKET_CACHE_STALE (seconds of stale-while-revalidate, default 0)
+    """
+    if os.getenv("MARKET_CACHE", "on").lower() in ("off", "none", "0", "false"):
+        return None
+
+    return MarketDataCache(
+        path=os.getenv("MARKET_CACHE_PATH", ".cache/market_cache.sqlite"),
+        ttl_seconds=float(os.getenv("MARKET_CACHE_TTL", "86400")),
+        stale_seconds=float(os.getenv("MARKET_CACHE_STALE", "0")),
+    )
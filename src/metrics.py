@@ -0,0 +1,344 @@
+"""
+Local instrumentation of the bakery pipeline: per graph node and per
+question, wall time, LLM calls and tokens, Tavily calls and latency,
+retrieval hits and distances, embedding time.
+
+Every value goes to a process-wide registry, exported as a Prometheus text
+file (METRICS_PROMETHEUS_FILE), and to the record of the question being
+processed, appended as one JSON line per question (METRICS_JSONL).
+
+Usage:
+    with track_question(question):
+        app.invoke({"question": question})
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Question and graph node being processed, propagated to the threads and
+# tasks started by LangGraph (they copy the context)
+_current_run = contextvars.ContextVar("bakery_run", default=None)
+_current_node = contextvars.ContextVar("bakery_node", default=None)
+
+# Metric -> (Prometheus type, help). Summaries are exported as _count and _sum,
+# gauges hold the last value recorded.
+METRICS = {
+    "questions": ("counter", "Questions processed by the graph"),
+    "question_seconds": ("summary", "Wall time of a whole question"),
+    "node_seconds": ("summary", "Wall time of the graph nodes"),
+    "llm_calls": ("counter", "Calls sent to the LLM API"),
+    "llm_cache_hits": ("counter", "LLM calls answered by the response cache"),
+    "llm_fallbacks": ("counter", "LLM calls answered by a fallback model or a stale cached answer"),
+    "llm_prompt_tokens": ("counter", "Prompt tokens sent to the LLM"),
+    "llm_completion_tokens": ("counter", "Completion tokens generated by the LLM"),
+    "tavily_calls": ("counter", "Web searches sent to Tavily (market cache misses)"),
+    "tavily_seconds": ("summary", "Latency of the Tavily searches"),
+    "retrieval_queries": ("counter", "Knowledge base searches"),
+    "retrieval_hits": ("counter", "Chunks returned by the knowledge base searches"),
+    "retrieval_distance": ("summary", "Distance of the retrieved chunks"),
+    "embedding_seconds": ("summary", "Time spent computing embeddings"),
+    "embedded_texts": ("counter", "Texts embedded"),
+    "context_tokens": ("counter", "Tokens of context pasted into the prompts"),
+    "context_tokens_saved": ("counter", "Tokens removed by the context assembler"),
+    "node_cache_hits": ("counter", "Graph nodes answered by the node cache (not run)"),
+    "local_costs": ("counter", "Financial reports costed by the local cost engine"),
+    "indexed_files": ("counter", "Files re-indexed by the directory watcher, by change"),
+    "indexing_lag_seconds": ("summary", "Time from a file change to its chunks being searchable"),
+    "indexing_queue_depth": ("gauge", "Changed files waiting to be indexed"),
+}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, summaries and gauges, labelled by graph node (and stage).
+    """
+
+    def __init__(self, prefix: str = "bakery"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # (metric, labels) -> value for counters and gauges, [count, sum] for summaries
+        self._counters: Dict[tuple, float] = defaultdict(float)
+        self._summaries: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0])
+        self._gauges: Dict[tuple, float] = {}
+
+    def record(self, metric: str, value: float = 1, **labels) -> None:
+        kind = METRICS[metric][0]
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            if kind == "counter":
+                self._counters[key] += value
+            elif kind == "gauge":
+                self._gauges[key] = value
+            else:
+                summary = self._summaries[key]
+                summary[0] += 1
+                summary[1] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {key: list(value) for key, value in self._summaries.items()},
+                "gauges": dict(self._gauges),
+            }
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        series = defaultdict(list)
+        for (metric, labels), value in snapshot["counters"].items():
+            series[metric].append(f"{self.prefix}_{metric}_total{self._labels(labels)} {value:g}")
+        for (metric, labels), (count, total) in snapshot["summaries"].items():
+            series[metric].append(f"{self.prefix}_{metric}_count{self._labels(labels)} {count:g}")
+            series[metric].append(f"{self.prefix}_{metric}_sum{self._labels(labels)} {total:.6f}")
+        for (metric, labels), value in snapshot["gauges"].items():
+            series[metric].append(f"{self.prefix}_{metric}{self._labels(labels)} {value:g}")
+
+        lines = []
+        for metric in sorted(series):
+            kind, help_text = METRICS[metric]
+            lines.append(f"# HELP {self.prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{metric} {kind}")
+            lines.extend(sorted(series[metric]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write the text file atomically (node_exporter textfile collector).
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+            self._gauges.clear()
+
+
+registry = MetricsRegistry()
+
+
+class QuestionRun:
+    """
+    Metrics of one question, per graph node.
+    """
+
+    def __init__(self, question: str, question_id: Optional[str] = None):
+        self.question = question
+        self.question_id = question_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self._lock = threading.Lock()
+        # node -> metric -> total (counters), list of values (summaries) or last value (gauges)
+        self.nodes: Dict[str, Dict[str, Any]] = defaultdict(dict)
+
+    def add(self, node: str, metric: str, value: float) -> None:
+        with self._lock:
+            values = self.nodes[node]
+            kind = METRICS[metric][0]
+            if kind == "counter":
+                values[metric] = values.get(metric, 0) + value
+            elif kind == "gauge":
+                values[metric] = value
+            else:
+                values.setdefault(metric, []).append(round(value, 4))
+
+    def finish(self) -> None:
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.question_id,
+                "question": self.question,
+                "started_at": self.started_at,
+                "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+                "nodes": {node: dict(values) for node, values in self.nodes.items()},
+            }
+
+
+def record(metric: str, value: float = 1, node: Optional[str] = None, **labels) -> None:
+    """
+    Record a value for the current graph node, or for `node` (and question, if any).
+    """
+    node = node or _current_node.get() or "none"
+    registry.record(metric, value, node=node, **labels)
+    run = _current_run.get()
+    if run is not None:
+        run.add(node, metric, value)
+
+
+def current_run() -> Optional[QuestionRun]:
+    return _current_run.get()
+
+
+_export_lock = threading.Lock()
+
+
+def export(run: QuestionRun) -> None:
+    """
+    Append the question record to METRICS_JSONL and rewrite
+    METRICS_PROMETHEUS_FILE, when they are set.
+    """
+    jsonl_path = os.getenv("METRICS_JSONL")
+    prometheus_path = os.getenv("METRICS_PROMETHEUS_FILE")
+
+    with _export_lock:
+        try:
+            if jsonl_path:
+                if os.path.dirname(jsonl_path):
+                    os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+                with open(jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+            if prometheus_path:
+                registry.write_prometheus(prometheus_path)
+        except OSError as e:
+            logger.warning("Could not export metrics: %s", e)
+
+
+@contextmanager
+def track_question(question: str, question_id: Optional[str] = None) -> Iterator[QuestionRun]:
+    """
+    Collect the metrics recorded while a question goes through the graph,
+    then export them.
+    """
+    run = QuestionRun(question, question_id)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        run.finish()
+        registry.record("questions")
+        registry.record("question_seconds", run.seconds)
+        logger.info("question done seconds=%.3f nodes=%s", run.seconds, sorted(run.nodes))
+        export(run)
+
+
+def timed_node(name: str, func: Callable) -> Callable:
+    """
+    Wrap a graph node (sync or async) so that everything it records is
+    attributed to it, and record its wall time.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            token = _current_node.set(name)
+            start = time.perf_counter()
+            try:
+                return await func(state)
+            finally:
+                record("node_seconds", time.perf_counter() - start)
+                _current_node.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        try:
+            return func(state)
+        finally:
+            record("node_seconds", time.perf_counter() - start)
+            _current_node.reset(token)
+
+    return wrapper
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    LangChain callback counting the LLM calls and their tokens.
+    """
+
+    # Called in the caller's thread / task, so the current node is known
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        generations = [generation for batch in response.generations for generation in batch]
+        if any((generation.generation_info or {}).get("cache_hit") for generation in generations):
+            record("llm_cache_hits")
+            return
+
+        record("llm_calls")
+        prompt_tokens = completion_tokens = 0
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and response.llm_output:
+            token_usage = response.llm_output.get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+
+        record("llm_prompt_tokens", prompt_tokens)
+        record("llm_completion_tokens", completion_tokens)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per log line (LOG_FORMAT=json).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        node = _current_node.get()
+        if node:
+            entry["node"] = node
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level: Optional[str] = None) -> None:
+    """
+    Configure the logs of the pipeline from the environment:
+        LOG_LEVEL (DEBUG, INFO, WARNING... default INFO)
+        LOG_FORMAT=text|json
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    handler = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    # Bibliothèques bavardes
+    for name in ("httpx", "httpcore", "chromadb", "sentence_transformers", "urllib3"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
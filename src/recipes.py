@@ -0,0 +1,173 @@
+"""
+Structured reading of recipes: the (ingredient, quantity, unit) rows of the
+ingredients list of a Chef proposal or of a recipe file of data/.
+
+    - 200g de chocolat noir (60% minimum)    -> ("chocolat noir", 200.0, "g")
+    - 1 litre de lait entier                  -> ("lait entier", 1.0, "l")
+    - 2 cuillères à café d'extrait de vanille -> ("extrait de vanille", 2.0, "cc")
+    - 3 œufs                                  -> ("œufs", 3.0, "piece")
+"""
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+_BULLET = re.compile(r"^\s*(?:[-*•–]|\d+[.)]|\[[ x]\])\s+(.*)$")
+_INGREDIENTS_HEADING = re.compile(r"ingr[ée]dients?", re.IGNORECASE)
+_OTHER_HEADING = re.compile(
+    r"^\s*[#*_\s]*(pr[ée]paration|[ée]tapes?|instructions?|m[ée]thode|r[ée]alisation|cuisson|temps"
+    r"|d[ée]roul[ée]|conseils?|astuces?|allerg[èe]nes?|ustensiles?|notes?)\b",
+    re.IGNORECASE,
+)
+
+# Unité écrite -> unité normalisée. Les unités de masse et de volume sont
+# converties en g / ml par UNIT_FACTORS ; les autres sont des pièces.
+UNIT_ALIASES = [
+    (r"kg|kilos?|kilogrammes?", "kg"),
+    (r"mg|milligrammes?", "mg"),
+    (r"g|gr|grammes?", "g"),
+    (r"ml|millilitres?", "ml"),
+    (r"cl|centilitres?", "cl"),
+    (r"dl|décilitres?", "dl"),
+    (r"l|litres?", "l"),
+    (r"c\.?\s*à\.?\s*s\.?|c\.?\s*à\.?\s*soupe|cuill[eè]res?\s+à\s+soupe|cs", "cs"),
+    (r"c\.?\s*à\.?\s*c\.?|c\.?\s*à\.?\s*café|cuill[eè]res?\s+à\s+café|cc", "cc"),
+    (r"pinc[ée]es?", "pincee"),
+    (r"sachets?", "sachet"),
+    (r"gousses?", "gousse"),
+    (r"tasses?|verres?|bols?", "tasse"),
+    (r"tranches?|morceaux?|feuilles?|brins?|bo[iî]tes?|pots?", "piece"),
+]
+_UNIT_NAMES = {canonical: re.compile(rf"^(?:{pattern})$", re.IGNORECASE) for pattern, canonical in UNIT_ALIASES}
+
+# Unité normalisée -> (dimension, facteur vers g, ml ou pièce)
+UNIT_FACTORS: Dict[str, Tuple[str, float]] = {
+    "mg": ("mass", 0.001), "g": ("mass", 1.0), "kg": ("mass", 1000.0), "pincee": ("mass", 0.5),
+    "ml": ("volume", 1.0), "cl": ("volume", 10.0), "dl": ("volume", 100.0), "l": ("volume", 1000.0),
+    "cs": ("volume", 15.0), "cc": ("volume", 5.0), "tasse": ("volume", 250.0),
+    "piece": ("piece", 1.0), "sachet": ("piece", 1.0), "gousse": ("piece", 1.0),
+}
+
+_FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3}
+_ROW = re.compile(
+    r"^(?P<quantity>\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?|[½¼¾⅓⅔])"
+    r"(?:\s*(?:-|à)\s*\d+(?:[.,]\d+)?)?"            # fourchette "2 à 3" : on garde la première valeur
+    r"\s*(?P<rest>.*)$"
+)
+_UNIT_WORD = re.compile(
+    r"^(?P<unit>c\.?\s*à\.?\s*(?:soupe|café|s|c)\.?|cuill[eè]res?\s+à\s+(?:soupe|café)|[^\W\d_]+\.?)\s*(?P<rest>.*)$"
+)
+_OF = re.compile(r"^(?:de\s+|d['’]\s*)", re.IGNORECASE)
+_QUANTITY = re.compile(
+    r"^[\d\s.,/½¼¾⅓⅔-]*(?:x\s+)?"
+    r"(?:(?:g|kg|mg|ml|cl|dl|l|litres?|c\.?\s*à\.?\s*(?:soupe|café|s|c)\.?|cuill[eè]res?\s+à\s+(?:soupe|café)"
+    r"|pinc[ée]es?|sachets?|tasses?|verres?|gousses?|feuilles?|brins?|tranches?|morceaux?|bo[iî]tes?)\b\.?\s*)?"
+    r"(?:de\s+|d['’]\s*)?",
+    re.IGNORECASE,
+)
+
+
+class IngredientRow(NamedTuple):
+    name: str
+    quantity: Optional[float]   # None : quantité non précisée ("sel", "vanille")
+    unit: str                   # unité normalisée (voir UNIT_FACTORS)
+    line: str
+
+
+def ingredient_indices(lines: List[str]) -> List[int]:
+    """
+    Indices of the bullet lines of the ingredients section, or of every
+    bullet line with a quantity when the text has no such section.
+    """
+    for i, line in enumerate(lines):
+        if _INGREDIENTS_HEADING.search(line) and not _BULLET.match(line):
+            section = []
+            for j in range(i + 1, len(lines)):
+                if _OTHER_HEADING.match(lines[j]):
+                    break
+                if _BULLET.match(lines[j]):
+                    section.append(j)
+            if section:
+                return section
+
+    return [
+        i for i, line in enumerate(lines)
+        if _BULLET.match(line) and re.search(r"\d", _BULLET.match(line).group(1))
+    ]
+
+
+def ingredient_name(line: str) -> str:
+    """
+    Ingredient of a list line, without the bullet and the quantity:
+    "- 1 sachet de xanthane" -> "xanthane".
+    """
+    bullet = _BULLET.match(line)
+    text = bullet.group(1) if bullet else line
+    return _QUANTITY.sub("", text.strip(" *_")).strip(" *_") or text.strip()
+
+
+def _parse_quantity(text: str) -> float:
+    text = text.replace(" ", "").replace(",", ".")
+    if text in _FRACTIONS:
+        return _FRACTIONS[text]
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text)
+
+
+def _normalize_unit(word: str) -> Optional[str]:
+    word = word.strip().rstrip(".")
+    for canonical, pattern in _UNIT_NAMES.items():
+        if pattern.match(word):
+            return canonical
+    return None
+
+
+def parse_ingredient(line: str) -> IngredientRow:
+    """
+    (ingredient, quantity, unit) of an ingredients list line. Comments in
+    parentheses are dropped; without a unit, the quantity is a count.
+    """
+    bullet = _BULLET.match(line)
+    text = (bullet.group(1) if bullet else line).strip(" *_")
+    text = re.sub(r"\([^)]*\)", "", text).strip(" ,*_")
+
+    match = _ROW.match(text)
+    if not match:
+        return IngredientRow(text, None, "piece", line)
+
+    quantity = _parse_quantity(match["quantity"])
+    rest = match["rest"].strip()
+    unit = "piece"
+    word = _UNIT_WORD.match(rest)
+    if word:
+        normalized = _normalize_unit(word["unit"])
+        if normalized:
+            unit, rest = normalized, word["rest"]
+    name = _OF.sub("", rest).strip(" ,*_") or rest
+    return IngredientRow(name, quantity, unit, line)
+
+
+def parse_recipe(text: str) -> List[IngredientRow]:
+    """
+    Structured rows of the ingredients list of a recipe (empty if none).
+    """
+    lines = text.splitlines()
+    return [parse_ingredient(lines[i]) for i in ingredient_indices(lines)]
+
+
+def recipe_name(text: str, default: str = "") -> str:
+    match = re.search(r"^\s*NOM\s*:\s*(.+)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else default
+
+
+def load_recipe_files(documents_path: str = "data") -> Dict[str, str]:
+    """
+    Text of the recipe files (.txt) of a folder, by file name.
+    """
+    recipes = {}
+    for filename in sorted(os.listdir(documents_path)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(documents_path, filename), encoding="utf-8") as f:
+                recipes[filename] = f.read()
+    return recipes
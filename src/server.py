@@ -0,0 +1,175 @@
+"""
+Long-running HTTP service: the embedding model, the vector index, the LLM
+clients and the compiled graph are loaded once at startup and shared by
+every request, so a request only pays for the agents' work.
+
+Usage:
+    python src/server.py --host 0.0.0.0 --port 8000
+    curl -N "http://localhost:8000/ask/stream?question=Une+tarte+au+citron+sans+gluten"
+
+Endpoints:
+    GET  /health                   -> {"status": "ok"}
+    GET  /metrics                  -> Prometheus metrics (see metrics.py)
+    POST /ask {"question": "..."}  -> final report (JSON)
+    GET  /ask/stream?question=...  -> server-sent events, as the agents work:
+        event: token  {"node": "chef", "content": "..."}        LLM token chunks
+        event: node   {"node": "chef", "update": {...}, "seconds": 3.2}
+        event: done   {"report": {...}}
+        event: error  {"error": "..."}
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from app import create_bakery_app
+from batch import rate_limiter_from_rpm
+from graph_cache import node_updates
+from indexer import indexer_from_env
+from metrics import registry, setup_logging, track_question
+
+
+logger = logging.getLogger(__name__)
+
+
+class Question(BaseModel):
+    question: str
+
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    setup_logging()
+    # Chargé une seule fois : modèle d'embedding, index, clients LLM et graphe compilé
+    assistant, graph = create_bakery_app(
+        llm_rate_limiter=rate_limiter_from_rpm(float(os.getenv("GROQ_RPM", "30"))),
+        search_rate_limiter=rate_limiter_from_rpm(float(os.getenv("TAVILY_RPM", "60"))),
+    )
+    api.state.assistant = assistant
+    api.state.graph = graph
+    # Modèle d'embedding et index chargés avant la première requête, pas pendant
+    await asyncio.to_thread(lambda: (assistant.vector_db.embedding_model, assistant.vector_db.collection))
+    # Les fichiers déposés dans data/ pendant le service sont indexés au fil de l'eau
+    indexer = indexer_from_env(assistant.vector_db)
+    if indexer:
+        indexer.start()
+    logger.info("Bakery service ready")
+    yield
+    if indexer:
+        indexer.stop()
+    await assistant.models.aclose()
+
+
+api = FastAPI(title="Bakery Intelligence System", lifespan=lifespan)
+
+
+def sse(event: str, data: Dict) -> str:
+    """
+    One server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def build_report(question: str, full_state: Dict, timings: Dict) -> Dict:
+    return {
+        "question": question,
+        "recipe": full_state.get("recipe_proposal"),
+        "financials": full_state.get("financials"),
+        "safety_report": full_state.get("safety_report"),
+        "route": full_state.get("route"),
+        "timings": timings,
+    }
+
+
+async def stream_events(graph, question: str) -> AsyncIterator[str]:
+    """
+    Run the graph for one question and yield its events: the LLM tokens as
+    they are generated and each agent's output as soon as it finishes.
+    """
+    start = time.perf_counter()
+    full_state = {"question": question}
+    timings = {}
+
+    with track_question(question):
+        try:
+            async for mode, payload in graph.astream(
+                {"question": question}, stream_mode=["messages", "updates"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    # Les appels d'outils du Gestionnaire n'ont pas de texte
+                    if chunk.content:
+                        yield sse("token", {"node": metadata.get("langgraph_node"), "content": chunk.content})
+                    continue
+
+                for node_name, node_values, cached in node_updates(payload):
+                    full_state.update(node_values)
+                    timings[node_name] = round(time.perf_counter() - start, 3)
+                    yield sse("node", {"node": node_name, "update": node_values, "seconds": timings[node_name],
+                                       "cached": cached})
+
+            timings["total"] = round(time.perf_counter() - start, 3)
+            yield sse("done", {"report": build_report(question, full_state, timings)})
+        except Exception as e:
+            logger.error("Error on question '%s': %s", question, e)
+            yield sse("error", {"error": str(e)})
+
+
+@api.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@api.get("/metrics")
+async def prometheus_metrics():
+    # Format texte Prometheus, pour un scrape direct du service
+    return PlainTextResponse(registry.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@api.post("/ask")
+async def ask(item: Question):
+    start = time.perf_counter()
+    full_state = {"question": item.question}
+    timings = {}
+
+    with track_question(item.question):
+        async for output in api.state.graph.astream({"question": item.question}):
+            for node_name, node_values, _ in node_updates(output):
+                full_state.update(node_values)
+                timings[node_name] = round(time.perf_counter() - start, 3)
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    return build_report(item.question, full_state, timings)
+
+
+@api.get("/ask/stream")
+async def ask_stream(question: str):
+    return StreamingResponse(
+        stream_events(api.state.graph, question),
+        media_type="text/event-stream",
+        # Pas de mise en tampon par un éventuel reverse proxy
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    args = parser.parse_args()
+
+    # Un seul worker : les modèles sont chargés une fois et partagés par les requêtes
+    uvicorn.run(api, host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
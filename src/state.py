@@ -5,4 +5,5 @@ class BakeryState(TypedDict):
     context: str        # Le texte extrait du RAG
     recipe_proposal: str # La réponse du Chef
     financials: str      # L'analyse du Gestionnaire
-    safety_report: str    # Le rapport d'allergènes
\ No newline at end of file
+    safety_report: str    # Le rapport d'allergènes
+    route: str            # Chemin choisi par le routeur (voir router.py)
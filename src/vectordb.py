@@ -1,11 +1,75 @@
 import os
-import torch
-from typing import List, Dict, Any
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 
-import chromadb
-from sentence_transformers import SentenceTransformer
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from manifest import IndexManifest, content_hash, chunk_id
+from embedding_pool import EmbeddingPool
+from lexical import LexicalIndex, reciprocal_rank_fusion
+from backends import create_backend
+from metrics import record
+
+logger = logging.getLogger(__name__)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Group an iterable into lists of at most `size` items, lazily.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ReadWriteLock:
+    """
+    Many readers at once or a single writer. A waiting writer goes before
+    the readers that arrive after it, so a steady flow of searches cannot
+    starve the indexing.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 
 class VectorDB:
@@ -13,13 +77,23 @@ class VectorDB:
     A simple vector database wrapper using ChromaDB with HuggingFace embeddings.
     """
 
-    def __init__(self, collection_name: str = None, embedding_model: str = None):
+    def __init__(self, collection_name: str = None, embedding_model: str = None,
+                 persist_directory: str = None, embedding_workers: int = None,
+                 backend: str = None, quantization: str = None):
         """
         Initialize the vector database.
 
         Args:
             collection_name: Name of the ChromaDB collection
             embedding_model: HuggingFace model name for embeddings
+            persist_directory: Folder of the persistent index (None = in-memory)
+            embedding_workers: Worker processes used to embed chunks during
+                ingestion (1 = embed in the current process)
+            backend: Vector index, "chroma" (HNSW) or "numpy" (exact, for
+                small corpora). Default: VECTOR_BACKEND, "chroma"
+            quantization: Storage of the numpy backend, "none", "int8" or
+                "binary" (quantized first pass + float re-rank).
+                Default: VECTOR_QUANTIZATION, "none"
         """
         self.collection_name = collection_name or os.getenv(
             "CHROMA_COLLECTION_NAME", "rag_documents"
@@ -28,21 +102,171 @@ class VectorDB:
             "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
         )
 
-        # Initialise ChromaDB client
-        # self.client = chromadb.PersistentClient(path="./chroma_db")
-        self.client = chromadb.Client()
+        self.persist_directory = persist_directory or os.getenv("CHROMA_PERSIST_DIR")
+
+        self.backend_name = backend or os.getenv("VECTOR_BACKEND", "chroma")
+        self.quantization = quantization or os.getenv("VECTOR_QUANTIZATION", "none")
+        backend_options = {}
+        if self.quantization != "none":
+            if self.backend_name != "numpy":
+                raise ValueError("Quantized vector storage needs VECTOR_BACKEND=numpy")
+            backend_options = {
+                "quantization": self.quantization,
+                "rerank_factor": int(os.getenv("VECTOR_RERANK_FACTOR", "10")),
+            }
+
+        # Batch sizes of the ingestion pipeline
+        self.embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        self.upsert_batch_size = int(os.getenv("UPSERT_BATCH_SIZE", "1024"))
+
+        # Multi-process embedding for large re-indexing jobs (started on first use)
+        self.embedding_workers = embedding_workers or int(os.getenv("EMBEDDING_WORKERS", "1"))
+        self.embedding_pool = None
+
+        # The embedding model and the index are loaded on first use (see the
+        # properties below): startup stays fast for the paths that never search
+        self._embedding_model = None
+        self._collection = None
+        self._manifest = None
+        self._lexical_index = None
+        self._backend_options = backend_options
+        self._index_ready = False
+        self._init_lock = threading.RLock()
+        # Searches (read) and live updates of a document (write, see index_files)
+        self._publish_lock = ReadWriteLock()
+        # Seconds spent loading each lazy component (see app.py --profile-startup)
+        self.load_times = {}
+        self._text_splitters = {}
+
+        # Search settings: distance cutoff and LRU cache of query embeddings
+        self.max_distance = float(os.getenv("SEARCH_MAX_DISTANCE", "0.4"))
+        self.query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_stats = {"hits": 0, "misses": 0}
+
+        # vector | hybrid | lexical | auto (lexical for short keyword queries, hybrid otherwise)
+        self.search_mode = os.getenv("SEARCH_MODE", "vector")
+        self.rrf_k = int(os.getenv("SEARCH_RRF_K", "60"))
+
+        storage = self.backend_name if self.quantization == "none" else f"{self.backend_name}, {self.quantization}"
+        logger.info("Vector database initialized with collection: %s (%s)", self.collection_name, storage)
+
+    @property
+    def embedding_model(self):
+        """
+        SentenceTransformer model, loaded on first use and shared by
+        ingestion and search.
+        """
+        if self._embedding_model is None:
+            with self._init_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    start = time.perf_counter()
+                    self._embedding_model = SentenceTransformer(
+                        self.embedding_model_name, device=self._select_device()
+                    )
+                    self.load_times["embedding_model"] = time.perf_counter() - start
+                    logger.info("Embedding model loaded in %.2fs", self.load_times["embedding_model"])
+        return self._embedding_model
+
+    @property
+    def collection(self):
+        """
+        Vector index (ChromaDB collection or embedded NumPy index).
+        """
+        self._open_index()
+        return self._collection
 
-        # Load embedding model
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+    @property
+    def manifest(self) -> IndexManifest:
+        self._open_index()
+        return self._manifest
 
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            # embedding_function=None,
-            metadata={"description": "RAG document collection"},
-        )
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        self._open_index()
+        return self._lexical_index
+
+    def _open_index(self) -> None:
+        """
+        Open the vector index, the manifest and the BM25 index together on
+        first use, and check that they describe the same content.
+        """
+        if self._index_ready:
+            return
+
+        with self._init_lock:
+            if self._index_ready:
+                return
+
+            start = time.perf_counter()
+            collection = create_backend(
+                self.backend_name, self.collection_name, self.persist_directory, **self._backend_options
+            )
 
-        print(f"Vector database initialized with collection: {self.collection_name}")
+            # Manifest of what is already embedded (file hash + chunk hashes)
+            manifest_path = None
+            if self.persist_directory:
+                manifest_path = os.path.join(
+                    self.persist_directory, f"{self.collection_name}_manifest.json"
+                )
+            manifest = IndexManifest(manifest_path, self.embedding_model_name)
+
+            # Manifest and collection must describe the same content, otherwise start over
+            if not manifest.files and collection.count() > 0:
+                logger.warning("No valid manifest for the existing collection, rebuilding it.")
+                collection.reset()
+            elif manifest.files and collection.count() == 0:
+                manifest.clear()
+
+            # BM25 index over the same chunks, for exact-term and hybrid search
+            lexical_path = None
+            if self.persist_directory:
+                lexical_path = os.path.join(
+                    self.persist_directory, f"{self.collection_name}_lexical.json"
+                )
+            lexical_index = LexicalIndex(lexical_path)
+            if len(lexical_index) != collection.count():
+                self._rebuild_lexical_index(collection, lexical_index)
+
+            self._collection = collection
+            self._manifest = manifest
+            self._lexical_index = lexical_index
+            self._index_ready = True
+            self.load_times["index"] = time.perf_counter() - start
+
+    @staticmethod
+    def _rebuild_lexical_index(collection, lexical_index: LexicalIndex, page_size: int = 1000) -> None:
+        """
+        Rebuild the BM25 index from the documents stored in the collection.
+        """
+        logger.info("Rebuilding lexical index from the collection...")
+        lexical_index.clear()
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            lexical_index.add(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        lexical_index.save()
+
+    def _save_indexes(self) -> None:
+        self.collection.persist()
+        self.manifest.save()
+        self.lexical_index.save()
+
+    @staticmethod
+    def _select_device() -> str:
+        import torch
+
+        if torch.cuda.is_available():
+            return "cuda"
+        if torch.backends.mps.is_available():
+            return "mps"
+        return "cpu"
 
     def chunk_text(self, text: str, title: str = '', chunk_size: int = 1000):
         """
@@ -57,17 +281,23 @@ class VectorDB:
         """
         # For this, we will use LangChain's RecursiveCharacterTextSplitter
         # because it automatically handles sentence boundaries and preserves context better
+        chunk_data = []
         try:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,  # ~200 words per chunk
-                chunk_overlap=200,  # Overlap to preserve context
-                separators=["\n\n", "\n", " ", "", ". "],
-            )
+            # The splitter is built once per chunk size, not once per document
+            text_splitter = self._text_splitters.get(chunk_size)
+            if text_splitter is None:
+                from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+                text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=chunk_size,  # ~200 words per chunk
+                    chunk_overlap=200,  # Overlap to preserve context
+                    separators=["\n\n", "\n", " ", "", ". "],
+                )
+                self._text_splitters[chunk_size] = text_splitter
 
             chunks = text_splitter.split_text(text)
 
             # Add metadata to each chunk
-            chunk_data = []
             for i, chunk in enumerate(chunks):
                 chunk_data.append(
                     {
@@ -77,117 +307,630 @@ class VectorDB:
                     }
                 )
         except Exception as e:
-            print("Error during text chunking:", e)
+            logger.error("Error during text chunking: %s", e)
 
         return chunk_data
 
-    def add_documents(self, documents: List) -> None:
+    def close(self) -> None:
         """
-        Add documents to the vector database.
-
-        Args:
-            documents: List of dicts with keys {"content": str, "metadata": dict}
+        Stop the embedding worker processes, if any.
         """
+        if self.embedding_pool is not None:
+            self.embedding_pool.close()
+            self.embedding_pool = None
 
-        print(f"Processing {len(documents)} documents...")
+    def _embed_batches(self, batches: Iterable[list]) -> Iterator[Tuple[list, Any]]:
+        """
+        Embedding stage of the ingestion pipeline. Yields (batch, embeddings)
+        in input order; embeddings is None when the batch failed.
 
-        # Load embedding model once
-        try:
-            device = (
-                "cuda"
-                if torch.cuda.is_available()
-                else "mps" if torch.backends.mps.is_available() else "cpu"
+        With several workers, up to two batches per worker are in flight while
+        the previous results are being upserted.
+        """
+        if self.embedding_workers <= 1:
+            for batch in batches:
+                texts = [text for _, _, text, _ in batch]
+                try:
+                    start = time.perf_counter()
+                    embeddings = self.embedding_model.encode(
+                        texts, batch_size=self.embed_batch_size, convert_to_numpy=True
+                    ).astype(np.float32, copy=False)
+                    record("embedding_seconds", time.perf_counter() - start, stage="ingest")
+                    record("embedded_texts", len(texts), stage="ingest")
+                except Exception as e:
+                    logger.error("Error generating embeddings: %s", e)
+                    embeddings = None
+                yield batch, embeddings
+            return
+
+        if self.embedding_pool is None:
+            self.embedding_pool = EmbeddingPool(
+                self.embedding_model_name,
+                workers=self.embedding_workers,
+                batch_size=self.embed_batch_size,
             )
-            # print(device)
 
-            embedding_model = SentenceTransformer(self.embedding_model_name, device=device)
-            # print(embedding_model)
+        in_flight = deque()
 
-        except Exception as e:
-            print("Error loading embedding model:", e)
+        def next_result():
+            batch, future = in_flight.popleft()
+            try:
+                embeddings = future.result().astype(np.float32, copy=False)
+                # The encoding time is spent in the workers, only the volume is known here
+                record("embedded_texts", len(batch), stage="ingest")
+                return batch, embeddings
+            except Exception as e:
+                logger.error("Error generating embeddings: %s", e)
+                return batch, None
 
-        # Start ID
-        next_id = self.collection.count()
+        for batch in batches:
+            texts = [text for _, _, text, _ in batch]
+            in_flight.append((batch, self.embedding_pool.submit(texts)))
+            if len(in_flight) >= 2 * self.embedding_pool.workers:
+                yield next_result()
 
-        # Process each document
-        for doc_index, doc in enumerate(documents):
+        while in_flight:
+            yield next_result()
+
+    def _iter_changed_chunks(self, documents: Iterable, pending: list,
+                             stats: Dict[str, Any]) -> Iterator[Tuple[int, str, str, dict]]:
+        """
+        Chunker stage of the ingestion pipeline: consumes documents one at a
+        time and yields only the chunks that are new or whose content changed.
+
+        Each yielded chunk is (sequence number, id, text, metadata). For every
+        document, (last sequence number, source, hash, chunk hashes, stale ids)
+        is appended to `pending`: its trailing chunks are deleted and the
+        manifest updated only once all of its new chunks are stored.
+        """
+        seq = 0
+        for doc in documents:
+            stats["documents"] += 1
             content = doc.page_content
 
             title = doc.metadata.get("source", "")
+            source = title if title else "Inconnu"
 
-            chunked_document = self.chunk_text(content)
-            # On s'assure que les métadonnées sont une liste de dictionnaires simples
-            # On nettoie au passage pour éviter les objets bizarres
-            clean_metadatas = []
-            for chunk in chunked_document:
-                clean_metadatas.append({
-                    "source": title if title else "Inconnu",
-                    "chunk_index": str(chunk.get("chunk_index", "0")),
-                    "title": str(chunk.get("title", ""))
-                })
+            # Document déjà indexé avec le même contenu : rien à refaire
+            doc_hash = content_hash(content)
+            previous = self.manifest.get(source)
+            if previous and previous.get("hash") == doc_hash:
+                stats["skipped"] += 1
+                continue
 
-            text_chunks = [chunk["content"] for chunk in chunked_document]
+            chunk_hashes, changed, stale_ids = self._diff_chunks(source, content, previous)
+            pending.append((seq + len(changed) - 1, source, doc_hash, chunk_hashes, stale_ids))
 
-            # Create IDs
-            ids = [f"doc_{next_id}_chunk_{i}" for i in range(len(text_chunks))]
+            for chunk_id_, text, metadata in changed:
+                yield seq, chunk_id_, text, metadata
+                seq += 1
 
-            # Create embeddings for all chunks
-            try:
-                embeddings = embedding_model.encode(text_chunks).tolist()
-                # print(embeddings)
+    def _diff_chunks(self, source: str, content: str, previous) -> Tuple[list, list, list]:
+        """
+        Chunk a new version of a document and compare it with its manifest entry.
 
-            except Exception as e:
-                print(f"Error generating embeddings:", e)
+        Returns:
+            (chunk hashes, [(id, text, metadata)] of the chunks that are new or
+            whose content changed, ids of the trailing chunks that no longer exist)
+        """
+        chunked_document = self.chunk_text(content)
+        chunk_hashes = [content_hash(chunk["content"]) for chunk in chunked_document]
+        old_hashes = previous["chunks"] if previous else []
+
+        # Only chunks that are new or whose content changed need an embedding
+        changed = []
+        for i, chunk_hash in enumerate(chunk_hashes):
+            if i < len(old_hashes) and old_hashes[i] == chunk_hash:
+                continue
+            chunk = chunked_document[i]
+            # On s'assure que les métadonnées sont des dictionnaires simples
+            metadata = {
+                "source": source,
+                "chunk_index": str(chunk.get("chunk_index", "0")),
+                "title": str(chunk.get("title", "")),
+                "chunk_hash": chunk_hash,
+            }
+            changed.append((chunk_id(source, i), chunk["content"], metadata))
+
+        # The document got shorter: its trailing chunks must go
+        stale_ids = [chunk_id(source, i) for i in range(len(chunk_hashes), len(old_hashes))]
+        return chunk_hashes, changed, stale_ids
+
+    def add_documents(self, documents: Iterable) -> Dict[str, Any]:
+        """
+        Add documents to the vector database through a streaming pipeline:
+        documents -> chunker -> fixed-size embedding batches (across documents)
+        -> batched upserts. Only one embedding batch and one upsert buffer are
+        held in memory, whatever the size of the corpus.
 
-            # Push to Chroma
-            try:
-                print(f"Adding document to vector DB...")
+        Args:
+            documents: Iterable (list or generator) of LangChain Documents
 
-                self.collection.add(
-                    ids=ids,
-                    documents=text_chunks,
-                    embeddings=embeddings,
-                    metadatas=clean_metadatas,
-                )
+        Returns:
+            Ingestion statistics (documents, skipped, chunks, seconds, chunks_per_sec),
+            and "committed": the sources whose new chunks are all stored
+        """
+        logger.debug("Processing documents...")
+        start = time.perf_counter()
+
+        stats = {"documents": 0, "skipped": 0, "chunks": 0}
+        committed = []
+        pending = []
+        failed_sources = set()
+        buffer = {"ids": [], "documents": [], "embeddings": [], "metadatas": []}
+        # Highest sequence number that is safely stored in the collection
+        flushed = {"seq": -1}
+
+        def commit_pending():
+            # A document goes into the manifest once all its chunks are stored;
+            # a failed one keeps its previous chunks and manifest entry
+            while pending and pending[0][0] <= flushed["seq"]:
+                _, source, doc_hash, chunk_hashes, stale_ids = pending.pop(0)
+                if source in failed_sources:
+                    continue
+                if stale_ids:
+                    try:
+                        # The document got shorter: its trailing chunks must go
+                        self.collection.delete(ids=stale_ids)
+                        self.lexical_index.remove(stale_ids)
+                    except Exception as e:
+                        logger.error("Error removing stale chunks of %s: %s", source, e)
+                        continue
+                self.manifest.set(source, doc_hash, chunk_hashes)
+                committed.append(source)
+
+        def flush(last_seq):
+            if buffer["ids"]:
+                try:
+                    self.collection.upsert(**buffer)
+                    self.lexical_index.add(buffer["ids"], buffer["documents"])
+                except Exception as e:
+                    logger.error("Error adding chunks to vector DB: %s", e)
+                    failed_sources.update(m["source"] for m in buffer["metadatas"])
+                for values in buffer.values():
+                    values.clear()
+            flushed["seq"] = last_seq
+            commit_pending()
+
+        chunks = self._iter_changed_chunks(documents, pending, stats)
+        last_seq = -1
+        for batch, embeddings in self._embed_batches(batched(chunks, self.embed_batch_size)):
+            last_seq = batch[-1][0]
+            if embeddings is None:
+                failed_sources.update(metadata["source"] for _, _, _, metadata in batch)
+                continue
+
+            for (seq, chunk_id_, text, metadata), embedding in zip(batch, embeddings):
+                buffer["ids"].append(chunk_id_)
+                buffer["documents"].append(text)
+                buffer["embeddings"].append(embedding)
+                buffer["metadatas"].append(metadata)
+            stats["chunks"] += len(batch)
+
+            if len(buffer["ids"]) >= self.upsert_batch_size:
+                flush(last_seq)
+
+        # Documents without any changed chunk are committed here as well
+        flush(max(last_seq, pending[-1][0] if pending else -1))
+        self._save_indexes()
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        stats["committed"] = committed
+        logger.info(
+            "Documents added to vector database: %d chunks from %d documents (%d unchanged skipped) "
+            "in %.2fs (%.1f chunks/sec)",
+            stats["chunks"], stats["documents"] - stats["skipped"], stats["skipped"],
+            stats["seconds"], stats["chunks_per_sec"],
+        )
+        return stats
+
+    def remove_source(self, source: str) -> None:
+        """
+        Delete every chunk of a source from the collection and the manifest.
+        """
+        ids = self.manifest.chunk_ids(source)
+        if ids:
+            self.collection.delete(ids=ids)
+            self.lexical_index.remove(ids)
+        self.manifest.remove(source)
+
+    def sync_directory(self, documents_path: str = "data") -> Dict[str, Any]:
+        """
+        Bring the collection in line with the .txt files of a folder:
+        only new or modified files are chunked and embedded, and the chunks
+        of deleted files are removed.
+
+        Args:
+            documents_path: Folder containing the documents
+
+        Returns:
+            Counters of added / changed / unchanged / removed files,
+            plus the ingestion statistics of add_documents
+        """
+        from langchain_core.documents import Document
+
+        stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+        filenames = sorted(f for f in os.listdir(documents_path) if f.endswith(".txt"))
+        # Same folder given as "data", "data/", "./data" or an absolute path: same sources
+        known = self._sources_by_path()
+        files = {}
+        for filename in filenames:
+            path = os.path.abspath(os.path.join(documents_path, filename))
+            files[path] = self._source_key(os.path.join(documents_path, filename), known)
+
+        # Chunks of files that disappeared from the folder
+        root = os.path.abspath(documents_path)
+        for path, source in known.items():
+            if os.path.dirname(path) == root and path not in files:
+                logger.info("Removing deleted document: %s", source)
+                self.remove_source(source)
+                stats["removed"] += 1
+
+        indexed_stats = []
+
+        def iter_modified_documents():
+            # Files are read one at a time while the pipeline consumes them
+            for file_path in files.values():
+                file_stat = os.stat(file_path)
+
+                if self.manifest.is_unchanged(file_path, file_stat.st_mtime, file_stat.st_size):
+                    stats["unchanged"] += 1
+                    continue
+
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+
+                previous = self.manifest.get(file_path)
+                if previous is None:
+                    stats["added"] += 1
+                elif previous.get("hash") == content_hash(content):
+                    # Only touched (mtime changed), the content is the same
+                    stats["unchanged"] += 1
+                else:
+                    stats["changed"] += 1
+
+                indexed_stats.append((file_path, file_stat.st_mtime, file_stat.st_size))
+                yield Document(page_content=content, metadata={"source": file_path})
+
+        ingest_stats = self.add_documents(iter_modified_documents())
+        # Only the files actually stored get their stat: a failed one is retried next time
+        committed = set(ingest_stats.pop("committed"))
+        stats.update(ingest_stats)
+        for file_path, mtime, size in indexed_stats:
+            if file_path in committed:
+                self.manifest.set_stat(file_path, mtime, size)
+
+        self._save_indexes()
+        logger.info(
+            "Index synced: %d added, %d changed, %d unchanged, %d removed",
+            stats["added"], stats["changed"], stats["unchanged"], stats["removed"],
+        )
+        return stats
+
+    def _sources_by_path(self) -> Dict[str, str]:
+        """
+        Indexed sources by absolute path.
+        """
+        return {os.path.abspath(source): source for source in self.manifest.sources()}
+
+    @staticmethod
+    def _source_key(file_path: str, known: Dict[str, str]) -> str:
+        """
+        Source under which a file is indexed: the existing entry of the same
+        file whatever the form of its path, else the normalized path.
+        """
+        return known.get(os.path.abspath(file_path), os.path.normpath(file_path))
+
+    def index_files(self, file_paths: Iterable[str]) -> Dict[str, str]:
+        """
+        Re-index some files while searches are running (see indexer.py).
+        Each file is read, chunked and embedded outside of any lock, then
+        published in one step: stale chunks deleted, new chunks upserted and
+        manifest updated while searches wait. A search never sees half of a
+        new version of a document.
+
+        Args:
+            file_paths: Files to bring up to date (a missing file is removed)
+
+        Returns:
+            File -> "added", "changed", "unchanged", "removed" or "error"
+        """
+        changes = {}
+        known = self._sources_by_path()
+        for file_path in file_paths:
+            try:
+                changes[file_path] = self._index_file(self._source_key(file_path, known))
             except Exception as e:
-                print(f"Error adding document {doc_index} to vector DB:", e)
-            next_id += len(text_chunks)
-        print("Documents added to vector database")
+                logger.error("Error indexing %s: %s", file_path, e)
+                changes[file_path] = "error"
+
+        # Written once for the whole batch, outside the lock
+        if any(change in ("added", "changed", "removed") for change in changes.values()):
+            self._save_indexes()
+        elif changes:
+            self.manifest.save()
+        return changes
+
+    def _index_file(self, file_path: str) -> str:
+        if not os.path.exists(file_path):
+            if self.manifest.get(file_path) is None:
+                return "unchanged"
+            with self._publish_lock.write():
+                self.remove_source(file_path)
+            return "removed"
+
+        file_stat = os.stat(file_path)
+        if self.manifest.is_unchanged(file_path, file_stat.st_mtime, file_stat.st_size):
+            return "unchanged"
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        doc_hash = content_hash(content)
+        previous = self.manifest.get(file_path)
+        if previous and previous.get("hash") == doc_hash:
+            # Only touched (mtime changed), the content is the same
+            self.manifest.set_stat(file_path, file_stat.st_mtime, file_stat.st_size)
+            return "unchanged"
+
+        chunk_hashes, changed, stale_ids = self._diff_chunks(file_path, content, previous)
+        ids = [chunk_id_ for chunk_id_, _, _ in changed]
+        texts = [text for _, text, _ in changed]
+        embeddings = []
+        if texts:
+            start = time.perf_counter()
+            embeddings = self.embedding_model.encode(
+                texts, batch_size=self.embed_batch_size, convert_to_numpy=True
+            ).astype(np.float32, copy=False)
+            record("embedding_seconds", time.perf_counter() - start, stage="ingest")
+            record("embedded_texts", len(texts), stage="ingest")
+
+        with self._publish_lock.write():
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+                self.lexical_index.remove(stale_ids)
+            if ids:
+                self.collection.upsert(
+                    ids=ids, documents=texts, embeddings=list(embeddings),
+                    metadatas=[metadata for _, _, metadata in changed],
+                )
+                self.lexical_index.add(ids, texts)
+            self.manifest.set(file_path, doc_hash, chunk_hashes)
+            self.manifest.set_stat(file_path, file_stat.st_mtime, file_stat.st_size)
+        return "changed" if previous else "added"
 
-    def search(self, query: str, n_results: int = 5) -> Dict[str, Any]:
+    def index_version(self) -> str:
         """
-        Search for similar documents in the vector database.
+        Hash of the indexed content, for the caches of answers built on
+        search results (see graph_cache.node_version).
         """
+        with self._publish_lock.read():
+            return self.manifest.version()
 
-        print(f"Retrieving relevant documents for query: {query}")
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed search queries in one batch, reusing the embeddings of queries
+        seen recently (LRU cache of QUERY_CACHE_SIZE entries).
 
-        relevant_results = {
-            "ids": [],
-            "documents": [],
-            "distances": [],
-            "metadatas": [],
-        }
+        Args:
+            queries: Query texts
+
+        Returns:
+            One embedding per query, in the same order
+        """
+        embeddings = {}
+        missing = []
+        with self._query_cache_lock:
+            for query in queries:
+                if query in self._query_cache:
+                    self._query_cache.move_to_end(query)
+                    embeddings[query] = self._query_cache[query]
+                    self.query_cache_stats["hits"] += 1
+                elif query not in missing:
+                    missing.append(query)
+                    self.query_cache_stats["misses"] += 1
+
+        if missing:
+            logger.debug("Embedding %d queries...", len(missing))
+            start = time.perf_counter()
+            new_embeddings = self.embedding_model.encode(
+                missing, batch_size=self.embed_batch_size
+            ).tolist()
+            record("embedding_seconds", time.perf_counter() - start, stage="query")
+            record("embedded_texts", len(missing), stage="query")
+
+            with self._query_cache_lock:
+                for query, embedding in zip(missing, new_embeddings):
+                    embeddings[query] = embedding
+                    self._query_cache[query] = embedding
+                    self._query_cache.move_to_end(query)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+
+        return [embeddings[query] for query in queries]
+
+    @staticmethod
+    def _empty_results() -> Dict[str, Any]:
+        return {"ids": [], "documents": [], "distances": [], "metadatas": []}
+
+    def _vector_search(self, queries: List[str], n_results: int,
+                       max_distance: float) -> List[Dict[str, Any]]:
+        """
+        Dense search: one embedding batch and a single Chroma query with all
+        the query embeddings, then the distance cutoff.
+        """
+        all_results = [self._empty_results() for _ in queries]
+        if not queries:
+            return all_results
 
-        print("Embedding query...")
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+        query_embeddings = self.embed_queries(queries)
 
-        print("Querying collection...")
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=["documents", "distances", "metadatas"],
-        )
+        logger.debug("Querying collection...")
+        results = self.collection.query(query_embeddings, n_results)
 
         if not results or not results.get("ids"):
-            print("No results found.")
-            return relevant_results
-
-        print("Filtering results...")
-        for i, distance in enumerate(results["distances"][0]):
-            if distance < 0.4:
-                relevant_results["ids"].append(results["ids"][0][i])
-                relevant_results["documents"].append(results["documents"][0][i])
-                relevant_results["distances"].append(distance)
-                relevant_results["metadatas"].append(results["metadatas"][0][i])
-
-        return relevant_results
+            logger.debug("No results found.")
+            return all_results
+
+        for q, relevant_results in enumerate(all_results):
+            for i, distance in enumerate(results["distances"][q]):
+                if distance < max_distance:
+                    relevant_results["ids"].append(results["ids"][q][i])
+                    relevant_results["documents"].append(results["documents"][q][i])
+                    relevant_results["distances"].append(distance)
+                    relevant_results["metadatas"].append(results["metadatas"][q][i])
+
+        return all_results
+
+    def _fill_documents(self, all_results: List[Dict[str, Any]]) -> None:
+        """
+        Fetch from the collection the text and metadata of lexical hits
+        (the BM25 index only stores terms). No model inference involved.
+        """
+        missing = list({
+            doc_id
+            for results in all_results
+            for doc_id, document in zip(results["ids"], results["documents"])
+            if document is None
+        })
+        if not missing:
+            return
+
+        stored = self.collection.get(ids=missing)
+        by_id = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        for results in all_results:
+            for i, doc_id in enumerate(results["ids"]):
+                if results["documents"][i] is None and doc_id in by_id:
+                    results["documents"][i], results["metadatas"][i] = by_id[doc_id]
+
+            # Chunk deleted in the meantime: drop it rather than return no text
+            keep = [i for i, document in enumerate(results["documents"]) if document is not None]
+            if len(keep) < len(results["ids"]):
+                for key, values in results.items():
+                    results[key] = [values[i] for i in keep]
+
+    def _fuse(self, vector_results: Dict[str, Any], lexical_hits: List[tuple],
+              n_results: int) -> Dict[str, Any]:
+        """
+        Reciprocal rank fusion of the dense and BM25 rankings of one query.
+        """
+        known = {
+            doc_id: (document, distance, metadata)
+            for doc_id, document, distance, metadata in zip(
+                vector_results["ids"], vector_results["documents"],
+                vector_results["distances"], vector_results["metadatas"],
+            )
+        }
+        fused = reciprocal_rank_fusion(
+            [vector_results["ids"], [doc_id for doc_id, _ in lexical_hits]], k=self.rrf_k
+        )
+
+        results = self._empty_results()
+        results["scores"] = []
+        for doc_id, score in fused[:n_results]:
+            # Lexical-only hits have no distance; their text is fetched afterwards
+            document, distance, metadata = known.get(doc_id, (None, None, None))
+            results["ids"].append(doc_id)
+            results["documents"].append(document)
+            results["distances"].append(distance)
+            results["metadatas"].append(metadata)
+            results["scores"].append(score)
+        return results
+
+    def _lexical_results(self, lexical_hits: List[tuple]) -> Dict[str, Any]:
+        results = self._empty_results()
+        results["scores"] = []
+        for doc_id, score in lexical_hits:
+            results["ids"].append(doc_id)
+            results["documents"].append(None)
+            results["distances"].append(None)
+            results["metadatas"].append(None)
+            results["scores"].append(score)
+        return results
+
+    def search_many(self, queries: List[str], n_results: int = 5,
+                    max_distance: float = None, mode: str = None) -> List[Dict[str, Any]]:
+        """
+        Search several queries at once: one embedding batch and a single
+        Chroma query with all the query embeddings.
+
+        Args:
+            queries: Query texts
+            n_results: Number of chunks retrieved per query
+            max_distance: Only keep dense hits closer than this distance
+                (default: SEARCH_MAX_DISTANCE, 0.4)
+            mode: "vector", "lexical" (BM25 only, no model inference),
+                "hybrid" (reciprocal rank fusion of both) or "auto" (lexical
+                for short keyword queries, hybrid otherwise).
+                Default: SEARCH_MODE, "vector".
+
+        Returns:
+            One result dict (ids, documents, distances, metadatas) per query.
+            Lexical and hybrid results also have "scores"; chunks found only
+            by BM25 have a None distance.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        mode = mode or self.search_mode
+        if mode not in ("vector", "lexical", "hybrid", "auto"):
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        # A document re-indexed meanwhile is seen either before or after its update
+        with self._publish_lock.read():
+            if mode == "vector":
+                all_results = self._vector_search(queries, n_results, max_distance)
+            else:
+                all_results = self._hybrid_search(queries, n_results, max_distance, mode)
+
+        record("retrieval_queries", len(queries))
+        for results in all_results:
+            record("retrieval_hits", len(results["ids"]))
+            for distance in results["distances"]:
+                if distance is not None:
+                    record("retrieval_distance", distance)
+        return all_results
+
+    def _hybrid_search(self, queries: List[str], n_results: int, max_distance: float,
+                       mode: str) -> List[Dict[str, Any]]:
+        """
+        Lexical, hybrid or auto search (see search_many).
+        """
+        all_results = [None] * len(queries)
+        dense_queries = []
+        for q, query in enumerate(queries):
+            # Fast path: keyword queries skip the embedding model entirely
+            if mode == "lexical" or (mode == "auto" and self.lexical_index.is_keyword_query(query)):
+                lexical_hits = self.lexical_index.search(query, n_results)
+                if lexical_hits or mode == "lexical":
+                    all_results[q] = self._lexical_results(lexical_hits)
+                    continue
+            dense_queries.append(q)
+
+        if dense_queries:
+            # More candidates on each side than requested, the fusion picks the best
+            n_candidates = 2 * n_results
+            vector_results = self._vector_search(
+                [queries[q] for q in dense_queries], n_candidates, max_distance
+            )
+            for q, dense in zip(dense_queries, vector_results):
+                lexical_hits = self.lexical_index.search(queries[q], n_candidates)
+                all_results[q] = self._fuse(dense, lexical_hits, n_results)
+
+        self._fill_documents(all_results)
+        return all_results
+
+    def search(self, query: str, n_results: int = 5, max_distance: float = None,
+               mode: str = None) -> Dict[str, Any]:
+        """
+        Search for similar documents in the vector database.
+        """
+        logger.debug("Retrieving relevant documents for query: %s", query)
+
+        return self.search_many(
+            [query], n_results=n_results, max_distance=max_distance, mode=mode
+        )[0]